@@ -0,0 +1,208 @@
+#-----------------------------------------------------------------------------
+# Name:        NetworkAlgebra.py
+# Purpose:     To cascade, de-embed and convert network parameters
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" NetworkAlgebra is a module for the algebra of two port networks. All functions work on complex arrays of
+shape (N,2,2), one matrix per frequency, and use batched numpy linear algebra across all frequencies at once.
+The parameter types are the ones declared in TouchstoneModels.PARAMETERS (S,Y,Z,G,H) and the transfer
+parameters T. T is defined by [b1,a1]=T[a2,b2] so that cascading networks is a product of T matrices."""
+
+#-----------------------------------------------------------------------------
+# Standard Imports
+#-----------------------------------------------------------------------------
+# Third Party Imports
+try:
+    import numpy as np
+except:
+    print("The module numpy was not found,"
+          "please put it on the python path")
+    raise ImportError
+#-----------------------------------------------------------------------------
+# Module Constants
+NETWORK_PARAMETERS=["S","T","Y","Z","G","H"]
+DEFAULT_REFERENCE_IMPEDANCE=50.
+#-----------------------------------------------------------------------------
+# Module Functions
+def to_network_array(matrix):
+    """Returns matrix as a complex array of shape (N,2,2), a single (2,2) matrix becomes shape (1,2,2)"""
+    network_array=np.array(matrix,dtype=complex)
+    if network_array.ndim==2:
+        network_array=network_array.reshape((1,)+network_array.shape)
+    if network_array.ndim!=3 or network_array.shape[1]!=network_array.shape[2]:
+        print("The network array must have a shape (N,P,P) or (P,P), it has a shape {0}".format(network_array.shape))
+        raise
+    return network_array
+
+def reference_impedance_matrix(reference_impedance,number_ports=2):
+    """Returns a diagonal (P,P) array of reference impedances, reference_impedance is a single value for every port
+    or a list with one value per port"""
+    if reference_impedance is None:
+        reference_impedance=DEFAULT_REFERENCE_IMPEDANCE
+    impedance_vector=np.array(reference_impedance,dtype=complex).reshape(-1)
+    if impedance_vector.size==1:
+        impedance_vector=np.repeat(impedance_vector,number_ports)
+    return np.diag(impedance_vector)
+
+def determinant(matrix):
+    """Returns the determinant of each (2,2) matrix in a (N,2,2) array"""
+    return matrix[:,0,0]*matrix[:,1,1]-matrix[:,0,1]*matrix[:,1,0]
+
+def two_port_transform(matrix,numerator_11,numerator_12,numerator_21,numerator_22,denominator):
+    """Builds a (N,2,2) array from the element arrays and a common denominator"""
+    out_matrix=np.empty(matrix.shape,dtype=complex)
+    out_matrix[:,0,0]=numerator_11/denominator
+    out_matrix[:,0,1]=numerator_12/denominator
+    out_matrix[:,1,0]=numerator_21/denominator
+    out_matrix[:,1,1]=numerator_22/denominator
+    return out_matrix
+
+def s_to_t(s_matrix):
+    """Converts a (N,2,2) array of S-parameters to T-parameters"""
+    s=to_network_array(s_matrix)
+    return two_port_transform(s,-determinant(s),s[:,0,0],-s[:,1,1],np.ones(len(s)),s[:,1,0])
+
+def t_to_s(t_matrix):
+    """Converts a (N,2,2) array of T-parameters to S-parameters"""
+    t=to_network_array(t_matrix)
+    return two_port_transform(t,t[:,0,1],determinant(t),np.ones(len(t)),-t[:,1,0],t[:,1,1])
+
+def s_to_z(s_matrix,reference_impedance=None):
+    """Converts a (N,P,P) array of S-parameters to Z-parameters, Z=F(I+S)(I-S)^-1 F with F=sqrt(Z0)"""
+    s=to_network_array(s_matrix)
+    identity=np.eye(s.shape[1])
+    root_impedance=np.sqrt(reference_impedance_matrix(reference_impedance,s.shape[1]))
+    return np.matmul(np.matmul(root_impedance,np.matmul(identity+s,np.linalg.inv(identity-s))),root_impedance)
+
+def z_to_s(z_matrix,reference_impedance=None):
+    """Converts a (N,P,P) array of Z-parameters to S-parameters, S=F^-1(Z-Z0)(Z+Z0)^-1 F with F=sqrt(Z0)"""
+    z=to_network_array(z_matrix)
+    impedance=reference_impedance_matrix(reference_impedance,z.shape[1])
+    root_impedance=np.sqrt(impedance)
+    inverse_root_impedance=np.linalg.inv(root_impedance)
+    return np.matmul(np.matmul(inverse_root_impedance,np.matmul(z-impedance,np.linalg.inv(z+impedance))),
+                     root_impedance)
+
+def z_to_y(z_matrix):
+    """Converts a (N,P,P) array of Z-parameters to Y-parameters"""
+    return np.linalg.inv(to_network_array(z_matrix))
+
+def y_to_z(y_matrix):
+    """Converts a (N,P,P) array of Y-parameters to Z-parameters"""
+    return np.linalg.inv(to_network_array(y_matrix))
+
+def z_to_h(z_matrix):
+    """Converts a (N,2,2) array of Z-parameters to H (hybrid) parameters"""
+    z=to_network_array(z_matrix)
+    return two_port_transform(z,determinant(z),z[:,0,1],-z[:,1,0],np.ones(len(z)),z[:,1,1])
+
+def h_to_z(h_matrix):
+    """Converts a (N,2,2) array of H (hybrid) parameters to Z-parameters"""
+    # The transform is its own inverse
+    return z_to_h(h_matrix)
+
+def h_to_g(h_matrix):
+    """Converts a (N,2,2) array of H (hybrid) parameters to G (inverse hybrid) parameters"""
+    return np.linalg.inv(to_network_array(h_matrix))
+
+def g_to_h(g_matrix):
+    """Converts a (N,2,2) array of G (inverse hybrid) parameters to H (hybrid) parameters"""
+    return np.linalg.inv(to_network_array(g_matrix))
+
+def convert_parameters(matrix,from_parameter="S",to_parameter="S",reference_impedance=None):
+    """Converts a (N,2,2) array of from_parameter to to_parameter. Parameters must be one of NETWORK_PARAMETERS,
+    (S,T,Y,Z,G,H). The conversion goes through S or Z, the reference_impedance is used for any S<->Z step"""
+    from_parameter=from_parameter.upper()
+    to_parameter=to_parameter.upper()
+    for parameter in [from_parameter,to_parameter]:
+        if parameter not in NETWORK_PARAMETERS:
+            print("Could not convert parameters, {0} is not one of {1}".format(parameter,NETWORK_PARAMETERS))
+            raise
+    network=to_network_array(matrix)
+    if from_parameter==to_parameter:
+        return network
+    to_z={"Z":lambda x:x,
+          "Y":y_to_z,
+          "H":h_to_z,
+          "G":lambda x:h_to_z(g_to_h(x)),
+          "S":lambda x:s_to_z(x,reference_impedance),
+          "T":lambda x:s_to_z(t_to_s(x),reference_impedance)}
+    from_z={"Z":lambda x:x,
+            "Y":z_to_y,
+            "H":z_to_h,
+            "G":lambda x:h_to_g(z_to_h(x)),
+            "S":lambda x:z_to_s(x,reference_impedance),
+            "T":lambda x:s_to_t(z_to_s(x,reference_impedance))}
+    # S<->T does not need an impedance so it is done directly
+    if from_parameter=="S" and to_parameter=="T":
+        return s_to_t(network)
+    elif from_parameter=="T" and to_parameter=="S":
+        return t_to_s(network)
+    return from_z[to_parameter](to_z[from_parameter](network))
+
+def cascade(*networks):
+    """Cascades any number of (N,2,2) S-parameter arrays in order (port 2 of each to port 1 of the next) and
+    returns the (N,2,2) S-parameters of the combination"""
+    if len(networks)==0:
+        print("Could not cascade, at least one network is required")
+        raise
+    total=s_to_t(networks[0])
+    for network in networks[1:]:
+        total=np.matmul(total,s_to_t(network))
+    return t_to_s(total)
+
+def deembed(network,left_fixture=None,right_fixture=None):
+    """Removes the (N,2,2) S-parameter fixtures on the left (port 1) and right (port 2) of a (N,2,2)
+    S-parameter network, either fixture may be None. Returns the (N,2,2) S-parameters of the device"""
+    device=s_to_t(network)
+    if left_fixture is not None:
+        device=np.matmul(np.linalg.inv(s_to_t(left_fixture)),device)
+    if right_fixture is not None:
+        device=np.matmul(device,np.linalg.inv(s_to_t(right_fixture)))
+    return t_to_s(device)
+
+def renormalize(s_matrix,old_reference_impedance=None,new_reference_impedance=None):
+    """Changes the reference impedance of a (N,P,P) array of S-parameters from old_reference_impedance to
+    new_reference_impedance, each one is a single value or a list with one value per port"""
+    return z_to_s(s_to_z(s_matrix,old_reference_impedance),new_reference_impedance)
+
+def touchstone_reference_impedance(touchstone_model):
+    """Returns the reference impedance declared in the option line of a touchstone model (S1PV1, S2PV1)"""
+    try:
+        return float(touchstone_model.reference_resistance)
+    except:
+        return DEFAULT_REFERENCE_IMPEDANCE
+#-----------------------------------------------------------------------------
+# Module Classes
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_conversions(number_frequencies=1000):
+    """Tests that converting random S-parameters to every parameter type and back returns the original"""
+    s=np.random.rand(number_frequencies,2,2)*.5+1j*np.random.rand(number_frequencies,2,2)*.5
+    for parameter in NETWORK_PARAMETERS:
+        converted=convert_parameters(s,"S",parameter,reference_impedance=75.)
+        round_trip=convert_parameters(converted,parameter,"S",reference_impedance=75.)
+        print("S->{0}->S returns the original: {1}".format(parameter,np.allclose(s,round_trip)))
+    print("Renormalizing 50->75->50 returns the original: {0}".format(
+        np.allclose(s,renormalize(renormalize(s,50.,75.),75.,50.))))
+
+def test_cascade(file_path="thru.s2p"):
+    """Tests cascade and deembed with the S-parameters of a touchstone file"""
+    from pyMeasure.Code.DataHandlers.TouchstoneModels import S2PV1,TESTS_DIRECTORY
+    import os
+    os.chdir(TESTS_DIRECTORY)
+    table=S2PV1(file_path)
+    frequency,s=table.get_sparameter_matrix()
+    total=cascade(s,s,s)
+    print("The cascade of 3 networks at {0} frequencies has shape {1}".format(len(frequency),total.shape))
+    print("De-embedding both fixtures returns the device: {0}".format(np.allclose(deembed(total,s,s),s)))
+    ideal_thru=np.tile(np.array([[0,1],[1,0]],dtype=complex),(len(frequency),1,1))
+    print("Cascading an ideal thru returns the network: {0}".format(np.allclose(cascade(s,ideal_thru),s)))
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_conversions()
+    test_cascade()
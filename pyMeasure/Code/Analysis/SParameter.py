@@ -11,8 +11,6 @@
 import os
 import re
 import datetime
-import sys
-print sys.path
 #-----------------------------------------------------------------------------
 # Third Party Imports
 try:
@@ -22,30 +20,46 @@ except:
     print("Numpy was not imported")
     pass
 try:
-    import pandas
+    from pyMeasure.Code.Utils.LazyImport import lazy_import,is_loaded
 except:
-    print("Pandas was not imported")
-    pass
-try:
-    #import pyMeasure.Code.DataHandlers.NISTModels
-    #from pyMeasure.Code.DataHandlers.NISTModels import *
-    from pyMeasure import *
-except:
-    print("The module pyMeasure.Code.DataHandlers.NISTModels was not found,"
+    print("The module pyMeasure.Code.Utils.LazyImport was not found,"
           "please put it on the python path")
     raise ImportError
 try:
-    import matplotlib.pyplot as plt
+    from pyMeasure.Code.Utils.Names import auto_name
 except:
-    print("The module matplotlib was not found,"
-          "please put it on the python path")
+    print("The function auto_name in pyMeasure.Code.Utils.Names was not found")
+    pass
+# pandas, matplotlib and the data models are only imported when they are first used, so that processes that
+# only need the numeric functions do not pay for them. See set_headless for servers without a display
+pandas=lazy_import('pandas')
+plt=lazy_import('matplotlib.pyplot',before_import=lambda:select_matplotlib_backend())
+NISTModels=lazy_import('pyMeasure.Code.DataHandlers.NISTModels')
 #-----------------------------------------------------------------------------
 # Module Constants
 
 # Does this belong in tests or a Data folder
 ONE_PORT_DUT=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests')
+# In headless mode matplotlib uses the non-interactive Agg backend, set the environment variable
+# PYMEASURE_HEADLESS=1 or call set_headless() before the first plot
+HEADLESS=os.environ.get("PYMEASURE_HEADLESS","").lower() not in ["","0","false","no"]
+HEADLESS_BACKEND='Agg'
 #-----------------------------------------------------------------------------
 # Module Functions
+def set_headless(headless=True):
+    """Turns headless mode on or off. In headless mode matplotlib is loaded with the Agg backend, so plots can only
+    be saved. This has to be called before the first plot, once matplotlib.pyplot is loaded the backend is fixed"""
+    global HEADLESS
+    if is_loaded(plt) and headless!=HEADLESS:
+        print("matplotlib.pyplot is already loaded, the backend will not change")
+    HEADLESS=headless
+
+def select_matplotlib_backend():
+    """Selects the matplotlib backend before matplotlib.pyplot is imported, called by the lazy import of plt"""
+    if HEADLESS:
+        import matplotlib
+        matplotlib.use(HEADLESS_BACKEND)
+
 def one_port_robin_comparision_plot(input_asc_file,input_res_file,**options):
     """one_port_robin_comparision_plot plots a one port.asc file against a given .res file,
     use device_history=True in options to show device history"""
@@ -58,8 +72,8 @@ def one_port_robin_comparision_plot(input_asc_file,input_res_file,**options):
     history=np.loadtxt(input_res_file,skiprows=1)
     column_names=["Frequency",'mag','arg','magS11N','argS11N','UmagS11N','UargS11N']
     options={"data":history.tolist(),"column_names":column_names,"column_types":['float' for column in column_names]}
-    history_table=AsciiDataTable(None,**options)
-    table=OnePortCalrepModel(input_asc_file)
+    history_table=NISTModels.AsciiDataTable(None,**options)
+    table=NISTModels.OnePortCalrepModel(input_asc_file)
     if plot_options["device_history"]:
         history_frame=pandas.read_csv(ONE_PORT_DUT)
         device_history=history_frame[history_frame["Device_Id"]==table.header[0].rstrip().lstrip()]
@@ -91,7 +105,8 @@ def one_port_robin_comparision_plot(input_asc_file,input_res_file,**options):
 def average_one_port_sparameters(table_list,**options):
     """Returns a table that is the average of the Sparameters in table list. The new table will have all the unique
     frequency values contained in all of the tables. Tables must be in Real-Imaginary format or magnitude-angle format
-    do not try to average db-angle format. """
+    do not try to average db-angle format. The tables are consumed one at a time by a StreamingAverage, so
+    table_list can also be a generator that opens each table when it is needed."""
     #This will work on any table that the data is stored in data, need to add a sparameter version
     defaults={"frequency_selector":0,"frequency_column_name":"Frequency"}
     average_options={}
@@ -99,20 +114,9 @@ def average_one_port_sparameters(table_list,**options):
         average_options[key]=value
     for key,value in options.iteritems():
         average_options[key]=value
-    frequency_list=[]
-    average_data=[]
-    for table in table_list:
-        frequency_list=frequency_list+table.get_column("Frequency")
-    unique_frequency_list=sorted(list(set(frequency_list)))
-    for frequency in unique_frequency_list:
-        new_row=[]
-        for table in table_list:
-            data_list=filter(lambda x: x[average_options["frequency_selector"]]==frequency,table.data)
-            table_average=np.mean(np.array(data_list),axis=0)
-            new_row.append(table_average)
-            #print new_row
-        average_data.append(np.mean(new_row,axis=0).tolist())
-    return average_data
+    average=StreamingAverage(frequency_selector=average_options["frequency_selector"])
+    average.add_tables(table_list)
+    return average.get_mean_data()
 
 def two_port_comparision_plot_with_residuals(two_port_raw,mean_frame,difference_frame):
     """Creates a comparision plot given a TwoPortRawModel object and a pandas.DataFrame mean frame"""
@@ -307,14 +311,125 @@ def raw_comparision_plot_with_residuals(raw_nist,mean_frame,difference_frame,**o
         plt.show()
 #-----------------------------------------------------------------------------
 # Module Classes
+class StreamingAverage():
+    """StreamingAverage accumulates the mean, standard deviation and number of values per frequency of rows of
+    data that are added in batches (tables, lists of rows or row iterators). Only a count, a running mean and a
+    running sum of squared deviations are kept for each unique frequency, so the memory is O(number of
+    frequencies) and the time is O(total number of rows). Batches are combined with the parallel form of
+    Welford's algorithm, which avoids the cancellation of a plain sum of squares."""
+    def __init__(self,**options):
+        """Initializes the StreamingAverage. frequency_selector is the column index of the frequency in each row.
+        If table_weighting is True (default) every table added with add_table is first averaged per frequency
+        and counts once, as average_one_port_sparameters has always done, otherwise every row counts once"""
+        defaults={"frequency_selector":0,"table_weighting":True,"chunk_size":10000}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        self.frequency_index={}
+        self.count=None
+        self.mean=None
+        self.squared_deviation=None
+
+    def __grow__(self,number_frequencies,number_columns):
+        """Makes sure the accumulators have room for number_frequencies rows, growing them by doubling"""
+        if self.count is None:
+            capacity=max(number_frequencies,16)
+            self.count=np.zeros(capacity)
+            self.mean=np.zeros((capacity,number_columns))
+            self.squared_deviation=np.zeros((capacity,number_columns))
+        elif number_frequencies>len(self.count):
+            capacity=max(number_frequencies,2*len(self.count))
+            extra=capacity-len(self.count)
+            self.count=np.concatenate([self.count,np.zeros(extra)])
+            self.mean=np.concatenate([self.mean,np.zeros((extra,self.mean.shape[1]))])
+            self.squared_deviation=np.concatenate([self.squared_deviation,
+                                                   np.zeros((extra,self.squared_deviation.shape[1]))])
+
+    def add_rows(self,rows,weight_as_one=False):
+        """Adds a list (or array) of numeric rows, if weight_as_one is True the rows at each frequency are first
+        averaged and count as a single value"""
+        data=np.array(rows,dtype=float)
+        if data.size==0:
+            return
+        unique_frequency,inverse=np.unique(data[:,self.options["frequency_selector"]],return_inverse=True)
+        batch_count=np.bincount(inverse).astype(float)
+        batch_sum=np.zeros((len(unique_frequency),data.shape[1]))
+        np.add.at(batch_sum,inverse,data)
+        batch_mean=batch_sum/batch_count[:,np.newaxis]
+        batch_squared_deviation=np.zeros(batch_mean.shape)
+        if weight_as_one:
+            batch_count=np.ones(len(unique_frequency))
+        else:
+            np.add.at(batch_squared_deviation,inverse,(data-batch_mean[inverse])**2)
+        # map the batch frequencies to accumulator rows, new frequencies are appended
+        indices=np.empty(len(unique_frequency),dtype=int)
+        for batch_index,frequency in enumerate(unique_frequency.tolist()):
+            if frequency not in self.frequency_index:
+                self.frequency_index[frequency]=len(self.frequency_index)
+            indices[batch_index]=self.frequency_index[frequency]
+        self.__grow__(len(self.frequency_index),data.shape[1])
+        old_count=self.count[indices]
+        total_count=old_count+batch_count
+        delta=batch_mean-self.mean[indices]
+        self.mean[indices]+=delta*(batch_count/total_count)[:,np.newaxis]
+        self.squared_deviation[indices]+=batch_squared_deviation+\
+                                         delta**2*(old_count*batch_count/total_count)[:,np.newaxis]
+        self.count[indices]=total_count
+
+    def add_row_iterator(self,row_iterator):
+        """Adds rows from any iterator (for instance a generator reading a file line by line) in chunks of
+        options["chunk_size"] rows, so the whole file is never in memory"""
+        chunk=[]
+        for row in row_iterator:
+            chunk.append(row)
+            if len(chunk)>=self.options["chunk_size"]:
+                self.add_rows(chunk)
+                chunk=[]
+        self.add_rows(chunk)
+
+    def add_table(self,table):
+        """Adds the data of a table (any model that stores its rows in table.data)"""
+        self.add_rows(table.data,weight_as_one=self.options["table_weighting"])
+
+    def add_tables(self,table_iterator):
+        """Adds each table of a list or an iterator of tables, one table at a time"""
+        for table in table_iterator:
+            self.add_table(table)
+
+    def get_statistics(self,ddof=1):
+        """Returns a tuple (frequency,mean,standard_deviation,number) of numpy arrays sorted by frequency. mean and
+        standard_deviation have one column per data column, the standard deviation uses N-ddof and is NaN if
+        N<=ddof"""
+        if self.count is None:
+            return np.zeros(0),np.zeros((0,0)),np.zeros((0,0)),np.zeros(0,dtype=int)
+        number_frequencies=len(self.frequency_index)
+        frequency=np.empty(number_frequencies)
+        for frequency_value,index in self.frequency_index.iteritems():
+            frequency[index]=frequency_value
+        order=np.argsort(frequency)
+        count=self.count[:number_frequencies][order]
+        mean=self.mean[:number_frequencies][order]
+        mean[:,self.options["frequency_selector"]]=frequency[order]
+        squared_deviation=self.squared_deviation[:number_frequencies][order]
+        degrees_of_freedom=count-ddof
+        with np.errstate(divide='ignore',invalid='ignore'):
+            variance=np.where(degrees_of_freedom[:,np.newaxis]>0,
+                              squared_deviation/degrees_of_freedom[:,np.newaxis],np.nan)
+        return frequency[order],mean,np.sqrt(variance),count.astype(int)
+
+    def get_mean_data(self):
+        """Returns the mean as a list of rows sorted by frequency"""
+        return self.get_statistics()[1].tolist()
 
 #-----------------------------------------------------------------------------
 # Module Scripts
 def test_average_one_port_sparameters():
-    os.chdir(TESTS_DIRECTORY)
-    table_list=[OnePortRawModel('OnePortRawTestFileAsConverted.txt') for i in range(3)]
+    os.chdir(NISTModels.TESTS_DIRECTORY)
+    table_list=[NISTModels.OnePortRawModel('OnePortRawTestFileAsConverted.txt') for i in range(3)]
     out_data=average_one_port_sparameters(table_list)
-    out_table=OnePortRawModel(None,**{"data":out_data})
+    out_table=NISTModels.OnePortRawModel(None,**{"data":out_data})
     #table_list[0].show()
     #out_table.show()
     fig, (ax0, ax1) = plt.subplots(nrows=2, sharex=True)
@@ -326,6 +441,20 @@ def test_average_one_port_sparameters():
     ax1.set_title('Phase S11')
     plt.show()
     print out_table
+
+def test_StreamingAverage(file_path='OnePortRawTestFile.txt',number_tables=10):
+    """Tests the StreamingAverage against numpy for tables opened one at a time by a generator"""
+    os.chdir(NISTModels.TESTS_DIRECTORY)
+    average=StreamingAverage(table_weighting=False)
+    average.add_tables(NISTModels.OnePortRawModel(file_path) for i in range(number_tables))
+    frequency,mean,standard_deviation,number=average.get_statistics()
+    data=np.array(NISTModels.OnePortRawModel(file_path).data)
+    first_frequency=data[data[:,0]==frequency[0]]
+    print("The mean at {0} is the same as numpy: {1}".format(frequency[0],
+                                                             np.allclose(mean[0],first_frequency.mean(axis=0))))
+    print("The number of values at {0} is {1}".format(frequency[0],number[0]))
+    print("The standard deviation of the magnitude at {0} is {1}".format(frequency[0],standard_deviation[0][3]))
+
 def test_comparison(input_file=None):
     """test_comparision tests the raw_mean,difference and comparison plot functionality"""
     # Data sources, to be replaced as project_files in Django
@@ -351,8 +480,8 @@ def test_comparison(input_file=None):
         #input_file=r"C:\Share\Ck_Std_raw_ascii\C24N07.L1_070998"
         #input_file=r"C:\Share\Ck_Std_raw_ascii\CTN208.A1_011613"
     start_time=datetime.datetime.now()
-    file_model=sparameter_power_type(input_file)
-    model=globals()[file_model]
+    file_model=NISTModels.sparameter_power_type(input_file)
+    model=getattr(NISTModels,file_model)
     table=model(input_file)
     #print table
     #table.metadata["System_Id"]
@@ -367,7 +496,7 @@ def test_comparison(input_file=None):
         options["column_names"]=['Frequency','magS11','argS11','magS12','argS12','magS21','argS21','magS22','argS22']
     elif re.search('1-port',table.metadata["Measurement_Type"],re.IGNORECASE):
         history_key='1-port'
-        if COMBINE_S11_S22:
+        if NISTModels.COMBINE_S11_S22:
              options["column_names"]=['Frequency','mag','arg']
         else:
             options["column_names"]=['Frequency','magS11','argS11','magS22','argS22']
@@ -391,4 +520,5 @@ def test_comparison(input_file=None):
 # Module Runner
 if __name__ == '__main__':
     #test_average_one_port_sparameters()
+    #test_StreamingAverage()
     test_comparison()
\ No newline at end of file
@@ -0,0 +1,266 @@
+#-----------------------------------------------------------------------------
+# Name:        InstrumentRegistry.py
+# Purpose:     To index the xml instrument sheets in pyMeasure/Instruments
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" InstrumentRegistry parses every instrument sheet in an instrument folder once into an index of
+{Id, Aliases, Instrument_Type, Address, Path} entries. The index is pickled to a cache file that is rebuilt when
+the modification time of the folder changes, and identifiers are looked up in a dictionary instead of reading
+every sheet. find_description and determine_instrument_type_from_string in Instruments and XMLModels use it.
+A sheet edited in place does not change the folder modification time, call refresh(force=True) after editing."""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import os
+import re
+import fnmatch
+import pickle
+import xml.dom.minidom
+from types import *
+#-----------------------------------------------------------------------------
+# Third Party Imports
+
+#-----------------------------------------------------------------------------
+# Module Constants
+INSTRUMENT_TYPES=['GPIB','COMM','OCEAN_OPTICS','MIGHTEX','LABJACK']
+INSTRUMENT_SHEET_EXTENSION='xml'
+INDEX_CACHE_NAME='.instrument_index.pickle'
+# Tags in Specific_Information whose text identifies an instrument
+ALIAS_TAG_NAMES=['Id','Name','Alias','Model','Serial','Instrument_Address','Address','GPIB_Address']
+ADDRESS_TAG_NAMES=['Instrument_Address','Address','GPIB_Address']
+# {instrument folder:InstrumentSheetIndex} so every caller shares one index per folder
+INSTRUMENT_SHEET_INDICES={}
+#-----------------------------------------------------------------------------
+# Module Functions
+def get_instrument_folder():
+    """Returns the default instrument folder, the Instruments folder under XMLModels.PYMEASURE_ROOT"""
+    # imported here because XMLModels imports this module
+    from pyMeasure.Code.DataHandlers.XMLModels import PYMEASURE_ROOT
+    return os.path.join(PYMEASURE_ROOT,'Instruments')
+
+def list_instrument_sheets(instrument_folder=None):
+    """Returns a sorted list of the instrument sheet file names in instrument_folder, or [] if the folder
+    does not exist"""
+    if instrument_folder is None:
+        instrument_folder=get_instrument_folder()
+    if not os.path.isdir(instrument_folder):
+        return []
+    return sorted(fnmatch.filter(os.listdir(instrument_folder),'*.'+INSTRUMENT_SHEET_EXTENSION))
+
+def get_node_text(node):
+    """Returns the stripped text of an element node"""
+    return "".join([child.data for child in node.childNodes if child.nodeType==child.TEXT_NODE]).strip()
+
+def parse_instrument_sheet(path):
+    """Parses the instrument sheet at path and returns an index entry, a dictionary with keys Id, Aliases,
+    Instrument_Type, Address, Path and Text"""
+    in_file=open(path,'r')
+    text=in_file.read()
+    in_file.close()
+    entry={"Id":os.path.splitext(os.path.basename(path))[0],"Aliases":[],"Instrument_Type":None,
+           "Address":None,"Path":path,"Text":text}
+    try:
+        document=xml.dom.minidom.parseString(text)
+    except:
+        # a sheet that is not well formed can still be found by searching its text
+        return entry
+    for information_node in document.getElementsByTagName('Specific_Information'):
+        for node in information_node.childNodes:
+            if node.nodeType!=node.ELEMENT_NODE:
+                continue
+            value=get_node_text(node)
+            if not value:
+                continue
+            if node.tagName=='Id':
+                entry["Id"]=value
+            if node.tagName in ALIAS_TAG_NAMES and value not in entry["Aliases"]:
+                entry["Aliases"].append(value)
+            if node.tagName in ADDRESS_TAG_NAMES and entry["Address"] is None:
+                entry["Address"]=value
+    for node in document.getElementsByTagName('Alias'):
+        value=get_node_text(node)
+        if value and value not in entry["Aliases"]:
+            entry["Aliases"].append(value)
+    type_nodes=document.getElementsByTagName('Instrument_Type')
+    if type_nodes:
+        entry["Instrument_Type"]=get_node_text(type_nodes[0]) or None
+    return entry
+
+def get_instrument_sheet_index(instrument_folder=None):
+    """Returns the shared InstrumentSheetIndex for instrument_folder, defaults to get_instrument_folder()"""
+    if instrument_folder is None:
+        instrument_folder=get_instrument_folder()
+    if not INSTRUMENT_SHEET_INDICES.has_key(instrument_folder):
+        INSTRUMENT_SHEET_INDICES[instrument_folder]=InstrumentSheetIndex(instrument_folder)
+    return INSTRUMENT_SHEET_INDICES[instrument_folder]
+
+def determine_instrument_type_from_string(string,instrument_folder=None):
+    """ Given a string returns the instrument type, first from INSTRUMENT_TYPES and then from the
+    Instrument_Type tag of the instrument sheet that matches string"""
+    if type(string) in StringTypes:
+        # Start with the easy ones
+        for instrument_type in INSTRUMENT_TYPES:
+            if re.search(instrument_type,string,re.IGNORECASE):
+                return instrument_type
+        return get_instrument_sheet_index(instrument_folder).find_instrument_type(string)
+    else:
+        return None
+#-----------------------------------------------------------------------------
+# Module Classes
+class InstrumentSheetIndex():
+    """An in memory index of the instrument sheets in instrument_folder, cached in a pickle file in the folder.
+    Options are cache_path (defaults to instrument_folder/INDEX_CACHE_NAME) and use_cache (True)"""
+    def __init__(self,instrument_folder=None,**options):
+        """Intializes the InstrumentSheetIndex, the sheets are indexed on the first lookup"""
+        defaults={"cache_path":None,"use_cache":True}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        if instrument_folder is None:
+            instrument_folder=get_instrument_folder()
+        self.instrument_folder=instrument_folder
+        if self.options["cache_path"] is None:
+            self.options["cache_path"]=os.path.join(instrument_folder,INDEX_CACHE_NAME)
+        self.entries=[]
+        self.lookup={}
+        self.modification_time=None
+
+    def get_folder_modification_time(self):
+        """Returns the modification time of the instrument folder or None if it does not exist"""
+        try:
+            return os.stat(self.instrument_folder).st_mtime
+        except OSError:
+            return None
+
+    def refresh(self,force=False):
+        """Rebuilds the index if the folder has changed since it was built, from the cache file if it is
+        current or else by parsing every sheet. force=True always parses the sheets"""
+        modification_time=self.get_folder_modification_time()
+        if not force and self.entries and modification_time==self.modification_time:
+            return
+        entries=None
+        if not force and self.options["use_cache"]:
+            entries=self.load_cache(modification_time)
+        if entries is None:
+            entries=[parse_instrument_sheet(os.path.join(self.instrument_folder,file_name))
+                     for file_name in list_instrument_sheets(self.instrument_folder)]
+            if self.options["use_cache"] and modification_time is not None:
+                self.save_cache(entries,modification_time)
+        self.entries=entries
+        self.modification_time=modification_time
+        self.build_lookup()
+
+    def build_lookup(self):
+        """Builds the {lower case identifier:entry} dictionary, the first sheet to use an identifier keeps it"""
+        self.lookup={}
+        for entry in self.entries:
+            keys=[entry["Id"],os.path.basename(entry["Path"])]+entry["Aliases"]
+            for key in keys:
+                key=key.lower()
+                if not self.lookup.has_key(key):
+                    self.lookup[key]=entry
+
+    def load_cache(self,modification_time):
+        """Returns the entries in the cache file if it was written for modification_time, otherwise None"""
+        try:
+            in_file=open(self.options["cache_path"],'rb')
+            cache=pickle.load(in_file)
+            in_file.close()
+        except:
+            return None
+        if cache.get("modification_time")!=modification_time:
+            return None
+        return cache.get("entries")
+
+    def save_cache(self,entries,modification_time):
+        """Pickles the entries to the cache file, a folder that is not writable just means no cache"""
+        try:
+            out_file=open(self.options["cache_path"],'wb')
+            pickle.dump({"modification_time":modification_time,"entries":entries},out_file,
+                        pickle.HIGHEST_PROTOCOL)
+            out_file.close()
+            # writing the cache changes the folder, record the new time so the cache stays current
+            new_modification_time=self.get_folder_modification_time()
+            if new_modification_time!=modification_time:
+                out_file=open(self.options["cache_path"],'wb')
+                pickle.dump({"modification_time":new_modification_time,"entries":entries},out_file,
+                            pickle.HIGHEST_PROTOCOL)
+                out_file.close()
+                self.modification_time=new_modification_time
+        except (IOError,OSError):
+            pass
+
+    def find(self,identifier):
+        """Returns the index entry for identifier, an Id, alias, address or file name. If there is no exact
+        match the first sheet whose text matches identifier as a regular expression is returned, as
+        find_description always has. Returns None if nothing matches"""
+        if type(identifier) not in StringTypes:
+            return None
+        self.refresh()
+        entry=self.lookup.get(identifier.lower())
+        if entry is not None:
+            return entry
+        for entry in self.entries:
+            if re.search(identifier,entry["Text"]):
+                return entry
+        return None
+
+    def find_path(self,identifier):
+        """Returns the path of the instrument sheet for identifier or None"""
+        entry=self.find(identifier)
+        if entry is None:
+            return None
+        return entry["Path"]
+
+    def find_instrument_type(self,identifier):
+        """Returns the Instrument_Type of the instrument sheet for identifier or None"""
+        entry=self.find(identifier)
+        if entry is None:
+            return None
+        return entry["Instrument_Type"]
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_InstrumentSheetIndex(instrument_folder=None):
+    """Tests the InstrumentSheetIndex on a folder with two instrument sheets, the second index is read from
+    the cache written by the first"""
+    import tempfile
+    import shutil
+    import time
+    sheet_template="""<?xml version="1.0"?>
+<Instrument_Sheet>
+<Specific_Information><Id>{0}</Id><Alias>{1}</Alias><Instrument_Type>{2}</Instrument_Type>
+<Instrument_Address>{3}</Instrument_Address></Specific_Information>
+<Commands/>
+</Instrument_Sheet>"""
+    remove_folder=instrument_folder is None
+    if instrument_folder is None:
+        instrument_folder=tempfile.mkdtemp()
+        for sheet in [("Lockin2","SRS830","GPIB","GPIB::8"),("VNA1","N5242A","GPIB","GPIB::16")]:
+            out_file=open(os.path.join(instrument_folder,sheet[0]+'.xml'),'w')
+            out_file.write(sheet_template.format(*sheet))
+            out_file.close()
+    try:
+        start=time.time()
+        index=InstrumentSheetIndex(instrument_folder)
+        print("The path of Lockin2 is {0}".format(index.find_path('Lockin2')))
+        print("Indexing took {0} seconds".format(time.time()-start))
+        start=time.time()
+        cached_index=InstrumentSheetIndex(instrument_folder)
+        print("The type of GPIB::16 is {0}".format(cached_index.find_instrument_type('GPIB::16')))
+        print("Loading the cache took {0} seconds".format(time.time()-start))
+        if remove_folder:
+            assert index.find_path('lockin2')==os.path.join(instrument_folder,'Lockin2.xml')
+            assert cached_index.find('SRS830')["Id"]=="Lockin2"
+            assert cached_index.find('N5242')["Id"]=="VNA1"
+            assert cached_index.find('not an instrument') is None
+    finally:
+        if remove_folder:
+            shutil.rmtree(instrument_folder)
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_InstrumentSheetIndex()
@@ -41,9 +41,11 @@ except:
           "please put it on the python path")
     raise ImportError
 try:
-    import matplotlib.pyplot as plt
+    from pyMeasure.Code.Utils.LazyImport import lazy_import
+    # matplotlib is only imported when a plot is made
+    plt=lazy_import('matplotlib.pyplot')
 except:
-    print("The module matplotlib was not found,"
+    print("The module pyMeasure.Code.Utils.LazyImport was not found,"
           "please put it on the python path")
 #-----------------------------------------------------------------------------
 # Module Constants
@@ -212,6 +214,53 @@ def build_csv_from_raw(input_file_names_list,output_file_name,model_name):
     except:
             raise
 
+def resample_sparameter_table(table,new_frequency,**options):
+    """Resamples the data of a S-parameter table with numeric columns (OnePortRawModel, TwoPortRawModel,
+    OnePortCalrepModel,...) onto new_frequency in place and returns the table. All mag/arg, db/arg or re/im
+    column pairs are interpolated at once using method ('linear' or 'magnitude_phase'), the columns in
+    group_column_names (Direction and Connect by default) are resampled separately for each group"""
+    defaults={"method":"linear","frequency_column_name":"Frequency",
+              "group_column_names":["Direction","Connect"]}
+    resample_options={}
+    for key,value in defaults.iteritems():
+        resample_options[key]=value
+    for key,value in options.iteritems():
+        resample_options[key]=value
+    table.data=resample_sparameter_rows(table.column_names,table.data,new_frequency,**resample_options)
+    table.update_model()
+    return table
+
+def common_frequency_grid(table_list,frequency_column_name="Frequency",group_column_names=None):
+    """Returns a sorted numpy array of the unique frequencies of all the tables in table_list that lie inside the
+    range of every table and of every group of rows with the same group_column_names values (Direction and
+    Connect by default), the groups that resample_sparameter_table interpolates separately, so that resampling
+    onto it does not need extrapolation"""
+    if group_column_names is None:
+        group_column_names=["Direction","Connect"]
+    frequency_arrays=[]
+    for table in table_list:
+        frequency_index=table.column_names.index(frequency_column_name)
+        group_indices=[table.column_names.index(name) for name in group_column_names if name in table.column_names]
+        groups={}
+        for row in table.data:
+            groups.setdefault(tuple([row[index] for index in group_indices]),[]).append(row[frequency_index])
+        frequency_arrays.extend([np.array(frequency_list,dtype=float) for frequency_list in groups.values()])
+    lowest=max([frequency_array.min() for frequency_array in frequency_arrays])
+    highest=min([frequency_array.max() for frequency_array in frequency_arrays])
+    unique_frequency=np.unique(np.concatenate(frequency_arrays))
+    return unique_frequency[(unique_frequency>=lowest)&(unique_frequency<=highest)]
+
+def resample_sparameter_tables(table_list,new_frequency=None,**options):
+    """Resamples every table in table_list onto new_frequency in place so that tables measured on different
+    frequency grids can be averaged or differenced row by row. If new_frequency is None the grid from
+    common_frequency_grid is used. Options are passed to resample_sparameter_table. Returns the table_list"""
+    if new_frequency is None:
+        frequency_column_name=options.get("frequency_column_name","Frequency")
+        new_frequency=common_frequency_grid(table_list,frequency_column_name,options.get("group_column_names"))
+    for table in table_list:
+        resample_sparameter_table(table,new_frequency,**options)
+    return table_list
+
 #-----------------------------------------------------------------------------
 # Module Classes
 class OnePortCalrepModel(AsciiDataTable):
@@ -1385,6 +1434,22 @@ def test_sparameter_power_type(file_list=None):
             print("There was an error opening {0}".format(file_name))
 
 
+def test_resample_sparameter_tables(file_path='OnePortRawTestFile.txt'):
+    """Tests resampling a one port raw file onto an offset grid and merging it with the original"""
+    os.chdir(TESTS_DIRECTORY)
+    table_list=[OnePortRawModel(file_path),OnePortRawModel(file_path)]
+    # every Connect is measured at these frequencies
+    frequency=common_frequency_grid(table_list[:1])
+    offset_frequency=[(frequency[i]+frequency[i+1])/2. for i in range(len(frequency)-1)]
+    resample_sparameter_table(table_list[1],offset_frequency,method='magnitude_phase')
+    print table_list[1]
+    resample_sparameter_tables(table_list)
+    print("After resampling onto the common grid the frequencies are the same: {0}".format(
+        table_list[0].get_column("Frequency")==table_list[1].get_column("Frequency")))
+    print table_list[0]
+    # the Connects of the file cover different frequencies, the grid is inside the range of every one of them
+    for table in table_list:
+        assert not np.isnan(np.array(table.data,dtype=float)).any()
 
 #-----------------------------------------------------------------------------
 # Module Runner
@@ -1403,4 +1468,5 @@ if __name__ == '__main__':
     #test_PowerCalrepModel()
     #test_PowerCalrepModel('700083b.txt')
     #convert_all_two_ports_script()
-    #test_sparameter_power_type()
\ No newline at end of file
+    #test_sparameter_power_type()
+    #test_resample_sparameter_tables()
\ No newline at end of file
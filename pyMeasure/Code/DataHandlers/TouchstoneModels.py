@@ -13,6 +13,8 @@
 import os
 import cmath
 import math
+import datetime
+import pkgutil
 #-----------------------------------------------------------------------------
 # Third Party Imports
 try:
@@ -34,12 +36,12 @@ except:
     print("The module numpy was not found,"
           "please put it on the python path")
     raise ImportError
-import matplotlib.pyplot as plt
-try:
-    import smithplot
+from pyMeasure.Code.Utils.LazyImport import lazy_import
+# matplotlib and smithplot are only imported when a plot is shown
+plt=lazy_import('matplotlib.pyplot')
+if pkgutil.find_loader('smithplot') is not None:
     SMITHPLOT=1
-
-except:
+else:
     print("The module smithplot was not found,"
           "please put it on the python path")
     SMITHPLOT=0
@@ -65,6 +67,13 @@ S2P_DB_COLUMN_DESCRIPTION=["Frequency","dbS11","argS11","dbS21","argS21","dbS12"
 S2P_RI_COLUMN_DESCRIPTION=["Frequency","reS11","imS11","reS21","imS21","reS12","imS12","reS22","imS22"]
 S2P_COMPLEX_COLUMN_NAMES=["Frequency","S11","S21","S12","S22"]
 S2P_NOISE_PARAMETER_COLUMN_NAMES=["Frequency","NFMin","mag","arg","Rn"]
+# Extension appended to a touchstone file path to name its binary companion (cache) file
+BINARY_EXTENSION="npz"
+# Order of the line number options stored in the binary file
+BINARY_LAYOUT_OPTIONS=["option_line_line","sparameter_begin_line","sparameter_end_line",
+                       "noiseparameter_begin_line","noiseparameter_end_line"]
+# Methods for resampling S-parameters onto a new frequency grid
+RESAMPLE_METHODS=["linear","magnitude_phase"]
 
 #-----------------------------------------------------------------------------
 # Module Functions
@@ -133,6 +142,219 @@ def build_row_formatter(precision=None,number_columns=None):
         else:
             row_formatter=row_formatter+"{"+str(i)+":.%sg}{delimiter}"%precision
     return row_formatter
+
+def sparameter_complex_to_matrix(sparameter_complex,number_ports=2):
+    """Converts a sparameter_complex list with rows [Frequency,S11,S21,S12,S22] (touchstone order) to a
+    frequency array of shape (N,) and a complex matrix array of shape (N,number_ports,number_ports)"""
+    number_frequencies=len(sparameter_complex)
+    if number_frequencies==0:
+        return np.zeros(0),np.zeros((0,number_ports,number_ports),dtype=complex)
+    complex_array=np.array(sparameter_complex,dtype=complex)
+    frequency=complex_array[:,0].real.copy()
+    # touchstone files list the matrix column by column (S11,S21,S12,S22) so the transpose restores the rows
+    matrix=complex_array[:,1:].reshape(number_frequencies,number_ports,number_ports).transpose(0,2,1)
+    return frequency,np.ascontiguousarray(matrix)
+
+def matrix_to_sparameter_complex(frequency,matrix):
+    """Converts a frequency array of shape (N,) and a complex matrix array of shape (N,P,P) to a
+    sparameter_complex list with rows [Frequency,S11,S21,S12,S22] (touchstone order)"""
+    number_frequencies=len(frequency)
+    columns=np.asarray(matrix).transpose(0,2,1).reshape(number_frequencies,-1)
+    return [[frequency_value]+row for frequency_value,row in zip(np.asarray(frequency).tolist(),columns.tolist())]
+
+def matrix_to_data(frequency,matrix,data_format='RI'):
+    """Converts a frequency array of shape (N,) and a complex matrix array of shape (N,P,P) to a real array with
+    the touchstone columns for data_format, one of 'RI','MA' or 'DB'. Angles are in degrees"""
+    number_frequencies=len(frequency)
+    columns=np.asarray(matrix).transpose(0,2,1).reshape(number_frequencies,-1)
+    data=np.empty((number_frequencies,1+2*columns.shape[1]))
+    data[:,0]=frequency
+    if re.match('db',data_format,re.IGNORECASE):
+        data[:,1::2]=20.*np.log10(np.abs(columns))
+        data[:,2::2]=np.angle(columns,deg=True)
+    elif re.match('ma',data_format,re.IGNORECASE):
+        data[:,1::2]=np.abs(columns)
+        data[:,2::2]=np.angle(columns,deg=True)
+    elif re.match('ri',data_format,re.IGNORECASE):
+        data[:,1::2]=columns.real
+        data[:,2::2]=columns.imag
+    else:
+        print("Could not convert the matrix, the specified format was not DB, MA, or RI")
+        raise
+    return data
+
+def binary_cache_path(file_path):
+    """Returns the path of the binary companion file for the touchstone file at file_path"""
+    return file_path+"."+BINARY_EXTENSION
+
+def binary_cache_is_current(file_path,binary_path=None):
+    """Returns True if the binary companion file exists and is at least as new as the touchstone file"""
+    if binary_path is None:
+        binary_path=binary_cache_path(file_path)
+    try:
+        return os.path.getmtime(binary_path)>=os.path.getmtime(file_path)
+    except OSError:
+        return False
+
+def write_touchstone_binary(path,touchstone_model,number_ports):
+    """Writes the frequency array, complex matrix array, comments, option line and line layout of a
+    touchstone model (S1PV1 or S2PV1) to path as an uncompressed numpy .npz archive"""
+    frequency,matrix=sparameter_complex_to_matrix(touchstone_model.sparameter_complex,number_ports)
+    if touchstone_model.comments is None:
+        comments=[]
+    else:
+        comments=touchstone_model.comments
+    noiseparameter_data=getattr(touchstone_model,'noiseparameter_data',None)
+    if noiseparameter_data is None:
+        noiseparameter_data=[]
+    layout=[touchstone_model.options.get(option,0) for option in BINARY_LAYOUT_OPTIONS]
+    # A file object is used so numpy does not append .npz to the path
+    file_out=open(path,'wb')
+    try:
+        np.savez(file_out,
+                 frequency=frequency,
+                 sparameter=matrix,
+                 noiseparameter=np.array(noiseparameter_data,dtype=float).reshape(-1,5),
+                 comment_text=np.array([comment[0] for comment in comments],dtype=str),
+                 comment_position=np.array([comment[1:3] for comment in comments],dtype=int).reshape(-1,2),
+                 option_line=np.array(touchstone_model.option_line,dtype=str),
+                 layout=np.array(layout,dtype=int))
+    finally:
+        file_out.close()
+
+def read_touchstone_binary(path):
+    """Reads a file written by write_touchstone_binary and returns a dictionary of python objects with keys
+    frequency, sparameter, noiseparameter_data, comments, option_line and layout"""
+    archive=np.load(path)
+    try:
+        comments=[[text,position[0],position[1]] for text,position in
+                  zip(archive["comment_text"].tolist(),archive["comment_position"].tolist())]
+        if comments==[]:
+            comments=None
+        out_dictionary={"frequency":archive["frequency"],
+                        "sparameter":archive["sparameter"],
+                        "noiseparameter_data":archive["noiseparameter"].tolist(),
+                        "comments":comments,
+                        "option_line":str(archive["option_line"]),
+                        "layout":dict(zip(BINARY_LAYOUT_OPTIONS,archive["layout"].tolist()))}
+    finally:
+        archive.close()
+    return out_dictionary
+
+def interpolate_columns(frequency,columns,new_frequency):
+    """Linearly interpolates every column of a real or complex array of shape (N,...) from frequency onto
+    new_frequency. The interpolation weights are found once and applied to all columns, points of new_frequency
+    outside of the range of frequency are set to NaN. Returns an array of shape (len(new_frequency),...)"""
+    frequency=np.asarray(frequency,dtype=float)
+    columns=np.asarray(columns)
+    new_frequency=np.asarray(new_frequency,dtype=float)
+    order=np.argsort(frequency,kind='mergesort')
+    frequency=frequency[order]
+    columns=columns[order]
+    if len(frequency)<2:
+        lower=upper=np.zeros(len(new_frequency),dtype=int)
+        weight=np.zeros(len(new_frequency))
+    else:
+        upper=np.clip(np.searchsorted(frequency,new_frequency),1,len(frequency)-1)
+        lower=upper-1
+        span=frequency[upper]-frequency[lower]
+        weight=(new_frequency-frequency[lower])/np.where(span==0,1.,span)
+    weight=weight.reshape((-1,)+(1,)*(columns.ndim-1))
+    out_columns=columns[lower]*(1.-weight)+columns[upper]*weight
+    if len(frequency)>0:
+        outside=(new_frequency<frequency[0])|(new_frequency>frequency[-1])
+        if np.iscomplexobj(out_columns):
+            out_columns[outside]=complex(np.nan,np.nan)
+        else:
+            out_columns[outside]=np.nan
+    return out_columns
+
+def interpolate_complex(frequency,values,new_frequency,method='linear'):
+    """Interpolates a complex array of shape (N,...) from frequency onto new_frequency. The method is 'linear'
+    for the real and imaginary parts or 'magnitude_phase' for the magnitude and unwrapped phase."""
+    values=np.asarray(values,dtype=complex)
+    if re.match('lin',method,re.IGNORECASE):
+        return interpolate_columns(frequency,values,new_frequency)
+    elif re.match('mag',method,re.IGNORECASE):
+        order=np.argsort(frequency,kind='mergesort')
+        sorted_frequency=np.asarray(frequency,dtype=float)[order]
+        sorted_values=values[order]
+        magnitude=interpolate_columns(sorted_frequency,np.abs(sorted_values),new_frequency)
+        phase=interpolate_columns(sorted_frequency,np.unwrap(np.angle(sorted_values),axis=0),new_frequency)
+        return magnitude*np.exp(1j*phase)
+    else:
+        print("Could not interpolate, the method must be one of {0}".format(RESAMPLE_METHODS))
+        raise
+
+def find_sparameter_column_pairs(column_names):
+    """Returns a list of [first_index,second_index,format] for every pair of S-parameter columns in column_names,
+    the pairs are named mag*/arg* (MA), db*/arg* (DB) or re*/im* (RI)"""
+    pairs=[]
+    partner_prefix={"mag":"arg","db":"arg","re":"im"}
+    formats={"mag":"MA","db":"DB","re":"RI"}
+    lower_case_names=[column_name.lower() for column_name in column_names]
+    for index,column_name in enumerate(lower_case_names):
+        match=re.match("(?P<prefix>mag|db|re)(?P<suffix>.*)$",column_name)
+        if match:
+            partner=partner_prefix[match.group("prefix")]+match.group("suffix")
+            if partner in lower_case_names:
+                pairs.append([index,lower_case_names.index(partner),formats[match.group("prefix")]])
+    return pairs
+
+def resample_sparameter_rows(column_names,data,new_frequency,method='linear',
+                             frequency_column_name="Frequency",group_column_names=None):
+    """Resamples a list of S-parameter rows with column_names onto new_frequency and returns a list of rows.
+    Column pairs found by find_sparameter_column_pairs are interpolated as complex values using method
+    ('linear' or 'magnitude_phase', angles in degrees), any other column is interpolated linearly. If
+    group_column_names (for instance Connect) is given every group is resampled separately and the output
+    rows are ordered by frequency then group. Rows outside the range of the data have NaN values."""
+    data_array=np.array(data,dtype=float)
+    new_frequency=np.asarray(new_frequency,dtype=float)
+    frequency_index=column_names.index(frequency_column_name)
+    if group_column_names is None:
+        group_column_names=[]
+    group_indices=[column_names.index(name) for name in group_column_names if name in column_names]
+    pairs=find_sparameter_column_pairs(column_names)
+    pair_indices=[index for pair in pairs for index in pair[:2]]
+    real_indices=[index for index in range(len(column_names))
+                  if index not in pair_indices+group_indices+[frequency_index]]
+    if group_indices:
+        group_keys=[tuple(row) for row in data_array[:,group_indices].tolist()]
+        unique_groups=sorted(set(group_keys),key=group_keys.index)
+    else:
+        group_keys=[()]*len(data_array)
+        unique_groups=[()]
+    out_data=np.empty((len(new_frequency),len(unique_groups),len(column_names)))
+    for group_number,group in enumerate(unique_groups):
+        group_rows=data_array[np.array([key==group for key in group_keys],dtype=bool)]
+        frequency=group_rows[:,frequency_index]
+        complex_columns=np.empty((len(group_rows),len(pairs)),dtype=complex)
+        for pair_number,(first_index,second_index,pair_format) in enumerate(pairs):
+            if pair_format=="RI":
+                complex_columns[:,pair_number]=group_rows[:,first_index]+1j*group_rows[:,second_index]
+            else:
+                magnitude=group_rows[:,first_index]
+                if pair_format=="DB":
+                    magnitude=10.**(magnitude/20.)
+                complex_columns[:,pair_number]=magnitude*np.exp(1j*np.radians(group_rows[:,second_index]))
+        new_complex=interpolate_complex(frequency,complex_columns,new_frequency,method)
+        out_rows=out_data[:,group_number,:]
+        out_rows[:,frequency_index]=new_frequency
+        for group_column_number,group_index in enumerate(group_indices):
+            out_rows[:,group_index]=group[group_column_number]
+        if real_indices:
+            out_rows[:,real_indices]=interpolate_columns(frequency,group_rows[:,real_indices],new_frequency)
+        for pair_number,(first_index,second_index,pair_format) in enumerate(pairs):
+            if pair_format=="RI":
+                out_rows[:,first_index]=new_complex[:,pair_number].real
+                out_rows[:,second_index]=new_complex[:,pair_number].imag
+            else:
+                magnitude=np.abs(new_complex[:,pair_number])
+                if pair_format=="DB":
+                    magnitude=20.*np.log10(magnitude)
+                out_rows[:,first_index]=magnitude
+                out_rows[:,second_index]=np.angle(new_complex[:,pair_number],deg=True)
+    return out_data.reshape(-1,len(column_names)).tolist()
 #-----------------------------------------------------------------------------
 # Module Classes
 class S1PV1():
@@ -161,18 +383,27 @@ class S1PV1():
                   "sparameter_complex":[],
                   "comments":[],
                   "path":None,
-                  "column_units":None
+                  "column_units":None,
+                  "use_binary_cache":False
                   }
         self.options={}
         for key,value in defaults.iteritems():
             self.options[key]=value
         for key,value in options.iteritems():
             self.options[key]=value
-        self.elements=['sparameter_data','comments','option_line']
+        self.elements=['sparameter_data','sparameter_complex','comments','option_line']
         self.metadata=self.options["metadata"]
         if file_path is not None:
             self.path=file_path
-            self.__read_and_fix__()
+            if self.options["use_binary_cache"] and binary_cache_is_current(self.path):
+                self.load_binary()
+            else:
+                self.__read_and_fix__()
+                if self.options["use_binary_cache"]:
+                    try:
+                        self.save_binary()
+                    except:
+                        print("Could not write the binary cache for {0}".format(self.path))
         else:
             for element in self.elements:
                 self.__dict__[element]=self.options[element]
@@ -307,6 +538,36 @@ class S1PV1():
         self.string=self.build_string()
         return self.string
 
+    def save_binary(self,path=None):
+        """Saves the frequency array, complex matrix array, comments and option line to a binary (.npz) file.
+        If path is None the file is saved next to self.path with the extension BINARY_EXTENSION appended"""
+        if path is None:
+            path=binary_cache_path(self.path)
+        write_touchstone_binary(path,self,1)
+
+    def load_binary(self,path=None):
+        """Loads a binary file written by save_binary, if path is None it loads the companion of self.path.
+        The columns in sparameter_data are regenerated from the complex values in the current format"""
+        if path is None:
+            path=binary_cache_path(self.path)
+        binary_data=read_touchstone_binary(path)
+        self.option_line=binary_data["option_line"]
+        match=re.search(OPTION_LINE_PATTERN,self.option_line,re.IGNORECASE)
+        for key,value in match.groupdict().iteritems():
+            self.__dict__[key.lower()]=value
+        if re.match('db',self.format,re.IGNORECASE):
+            self.column_names=S1P_DB_COLUMN_NAMES
+        elif re.match('ma',self.format,re.IGNORECASE):
+            self.column_names=S1P_MA_COLUMN_NAMES
+        elif re.match('ri',self.format,re.IGNORECASE):
+            self.column_names=S1P_RI_COLUMN_NAMES
+        self.row_pattern=make_row_match_string(self.column_names)
+        self.comments=binary_data["comments"]
+        for key,value in binary_data["layout"].iteritems():
+            self.options[key]=value
+        self.sparameter_complex=matrix_to_sparameter_complex(binary_data["frequency"],binary_data["sparameter"])
+        self.sparameter_data=matrix_to_data(binary_data["frequency"],binary_data["sparameter"],self.format).tolist()
+
     def add_sparameter_row(self,row_data):
         """Adds data to the sparameter attribute, which is a list of s-parameters. The
         data can be a list of 9 real numbers
@@ -476,6 +737,28 @@ class S1PV1():
             return out_list
         except:raise
 
+    def get_sparameter_matrix(self):
+        """Returns a frequency array of shape (N,) and a complex S-parameter array of shape (N,1,1)"""
+        return sparameter_complex_to_matrix(self.sparameter_complex,1)
+
+    def set_sparameter_matrix(self,frequency,matrix):
+        """Replaces the S-parameters with a frequency array of shape (N,) and a complex array of shape (N,1,1),
+        sparameter_data is rebuilt in the current format"""
+        old_number_rows=len(self.sparameter_data)
+        self.sparameter_complex=matrix_to_sparameter_complex(frequency,matrix)
+        self.sparameter_data=matrix_to_data(frequency,matrix,self.format).tolist()
+        if old_number_rows==0 or "sparameter_begin_line" not in self.options:
+            self.options["sparameter_begin_line"]=self.options["option_line_line"]+1
+        self.options["sparameter_end_line"]=self.options["sparameter_begin_line"]+len(self.sparameter_data)-1
+
+    def resample(self,new_frequency,method='linear'):
+        """Resamples the S-parameters onto new_frequency (in the current frequency units) using method, one of
+        RESAMPLE_METHODS. 'linear' interpolates the real and imaginary parts and 'magnitude_phase' interpolates the
+        magnitude and unwrapped phase. Points outside the measured range are NaN"""
+        frequency,matrix=self.get_sparameter_matrix()
+        new_frequency=np.asarray(new_frequency,dtype=float)
+        self.set_sparameter_matrix(new_frequency,interpolate_complex(frequency,matrix,new_frequency,method))
+
     def get_column(self,column_name=None,column_index=None):
         """Returns a column as a list given a column name or column index"""
         if column_name is None:
@@ -492,6 +775,8 @@ class S1PV1():
         """Shows the touchstone file"""
         # plot data
         if re.search('smith',type,re.IGNORECASE):
+            # importing smithplot registers the smith projection with matplotlib
+            import smithplot
             plt.figure(figsize=(8, 8))
             val1=[row[1] for row in self.sparameter_complex]
             ax = plt.subplot(1, 1, 1, projection='smith', axes_norm=50)
@@ -540,20 +825,29 @@ class S2PV1():
                   "path":None,
                   "column_units":None,
                   "inline_comment_begin":"!",
-                  "inline_comment_end":""
+                  "inline_comment_end":"",
+                  "use_binary_cache":False
                   }
         self.options={}
         for key,value in defaults.iteritems():
             self.options[key]=value
         for key,value in options.iteritems():
             self.options[key]=value
-        self.elements=['sparameter_data','noiseparameter_data','comments','option_line']
+        self.elements=['sparameter_data','sparameter_complex','noiseparameter_data','comments','option_line']
         self.metadata=self.options["metadata"]
         self.noiseparameter_row_pattern=make_row_match_string(S2P_NOISE_PARAMETER_COLUMN_NAMES)+"\n"
         self.noiseparameter_column_names=S2P_NOISE_PARAMETER_COLUMN_NAMES
         if file_path is not None:
             self.path=file_path
-            self.__read_and_fix__()
+            if self.options["use_binary_cache"] and binary_cache_is_current(self.path):
+                self.load_binary()
+            else:
+                self.__read_and_fix__()
+                if self.options["use_binary_cache"]:
+                    try:
+                        self.save_binary()
+                    except:
+                        print("Could not write the binary cache for {0}".format(self.path))
         else:
             for element in self.elements:
                 self.__dict__[element]=self.options[element]
@@ -711,6 +1005,37 @@ class S2PV1():
         self.string=self.build_string()
         return self.string
 
+    def save_binary(self,path=None):
+        """Saves the frequency array, complex matrix array, comments and option line to a binary (.npz) file.
+        If path is None the file is saved next to self.path with the extension BINARY_EXTENSION appended"""
+        if path is None:
+            path=binary_cache_path(self.path)
+        write_touchstone_binary(path,self,2)
+
+    def load_binary(self,path=None):
+        """Loads a binary file written by save_binary, if path is None it loads the companion of self.path.
+        The columns in sparameter_data are regenerated from the complex values in the current format"""
+        if path is None:
+            path=binary_cache_path(self.path)
+        binary_data=read_touchstone_binary(path)
+        self.option_line=binary_data["option_line"]
+        match=re.search(OPTION_LINE_PATTERN,self.option_line,re.IGNORECASE)
+        for key,value in match.groupdict().iteritems():
+            self.__dict__[key.lower()]=value
+        if re.match('db',self.format,re.IGNORECASE):
+            self.column_names=S2P_DB_COLUMN_NAMES
+        elif re.match('ma',self.format,re.IGNORECASE):
+            self.column_names=S2P_MA_COLUMN_NAMES
+        elif re.match('ri',self.format,re.IGNORECASE):
+            self.column_names=S2P_RI_COLUMN_NAMES
+        self.row_pattern=make_row_match_string(self.column_names)
+        self.comments=binary_data["comments"]
+        self.noiseparameter_data=binary_data["noiseparameter_data"]
+        for key,value in binary_data["layout"].iteritems():
+            self.options[key]=value
+        self.sparameter_complex=matrix_to_sparameter_complex(binary_data["frequency"],binary_data["sparameter"])
+        self.sparameter_data=matrix_to_data(binary_data["frequency"],binary_data["sparameter"],self.format).tolist()
+
     def add_sparameter_row(self,row_data):
         """Adds data to the sparameter attribute, which is a list of s-parameters. The
         data can be a list of 9 real numbers
@@ -952,6 +1277,32 @@ class S2PV1():
             S12_corrected=(S12-S11*S12*SWR)/D
             S22_corrected=(S22-S12*S21*SWR)/D
             self.corrected_sparameter_data.append([row[0],S11_corrected,S21_corrected,S12_corrected,S22_corrected])
+    def get_sparameter_matrix(self):
+        """Returns a frequency array of shape (N,) and a complex S-parameter array of shape (N,2,2)"""
+        return sparameter_complex_to_matrix(self.sparameter_complex,2)
+
+    def set_sparameter_matrix(self,frequency,matrix):
+        """Replaces the S-parameters with a frequency array of shape (N,) and a complex array of shape (N,2,2),
+        sparameter_data is rebuilt in the current format"""
+        old_number_rows=len(self.sparameter_data)
+        self.sparameter_complex=matrix_to_sparameter_complex(frequency,matrix)
+        self.sparameter_data=matrix_to_data(frequency,matrix,self.format).tolist()
+        row_change=len(self.sparameter_data)-old_number_rows
+        if old_number_rows==0 or "sparameter_begin_line" not in self.options:
+            self.options["sparameter_begin_line"]=self.options["option_line_line"]+1
+        self.options["sparameter_end_line"]=self.options["sparameter_begin_line"]+len(self.sparameter_data)-1
+        if self.noiseparameter_data not in [[],None]:
+            self.options["noiseparameter_begin_line"]+=row_change
+            self.options["noiseparameter_end_line"]+=row_change
+
+    def resample(self,new_frequency,method='linear'):
+        """Resamples the S-parameters onto new_frequency (in the current frequency units) using method, one of
+        RESAMPLE_METHODS. 'linear' interpolates the real and imaginary parts and 'magnitude_phase' interpolates the
+        magnitude and unwrapped phase. Points outside the measured range are NaN"""
+        frequency,matrix=self.get_sparameter_matrix()
+        new_frequency=np.asarray(new_frequency,dtype=float)
+        self.set_sparameter_matrix(new_frequency,interpolate_complex(frequency,matrix,new_frequency,method))
+
     def get_column(self,column_name=None,column_index=None):
         """Returns a column as a list given a column name or column index"""
         if column_name is None:
@@ -968,6 +1319,8 @@ class S2PV1():
         """Shows the touchstone file"""
         # plot data
         if re.search('smith',type,re.IGNORECASE):
+            # importing smithplot registers the smith projection with matplotlib
+            import smithplot
             plt.figure(figsize=(8, 8))
             val1=[row[1] for row in self.sparameter_complex]
             val2=[row[4] for row in self.sparameter_complex]
@@ -1065,6 +1418,29 @@ def test_change_format(file_path="thru.s2p"):
     print_s2p_attributes(new_table=new_table)
     print new_table
     new_table.show()
+
+def test_binary_cache(file_path="thru.s2p"):
+    """Tests the save_binary, load_binary and the automatic binary cache of S2PV1"""
+    os.chdir(TESTS_DIRECTORY)
+    start_time=datetime.datetime.now()
+    text_table=S2PV1(file_path)
+    stop_time=datetime.datetime.now()
+    print("Parsing {0} as text took {1} seconds".format(file_path,(stop_time-start_time).total_seconds()))
+    text_table.save_binary("Binary_Test.npz")
+    binary_table=S2PV1(None)
+    start_time=datetime.datetime.now()
+    binary_table.load_binary("Binary_Test.npz")
+    stop_time=datetime.datetime.now()
+    print("Loading the binary file took {0} seconds".format((stop_time-start_time).total_seconds()))
+    print("The complex data is the same: {0}".format(binary_table.sparameter_complex==text_table.sparameter_complex))
+    print("The string is the same: {0}".format(str(binary_table)==str(text_table)))
+    os.remove("Binary_Test.npz")
+    cached_table=S2PV1(file_path,use_binary_cache=True)
+    print("The cache file {0} exists: {1}".format(binary_cache_path(file_path),
+                                                   binary_cache_is_current(file_path)))
+    cached_table=S2PV1(file_path,use_binary_cache=True)
+    print("The cached string is the same: {0}".format(str(cached_table)==str(text_table)))
+    os.remove(binary_cache_path(file_path))
 #-----------------------------------------------------------------------------
 # Module Runner
 if __name__ == '__main__':
@@ -1074,4 +1450,5 @@ if __name__ == '__main__':
     #test_s2pv1('TwoPortTouchstoneTestFile.s2p')
     #test_change_format()
     #test_change_format('TwoPortTouchstoneTestFile.s2p')
+    #test_binary_cache()
     #test_change_format('20160301_30ft_cable_0.s2p')
\ No newline at end of file
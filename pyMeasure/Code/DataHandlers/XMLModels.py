@@ -13,14 +13,25 @@ requires lxml to be installed. """
 import os
 import xml.dom                                     # Xml document handling
 import xml.dom.minidom                             # For xml parsing
+import xml.parsers.expat                           # For streaming byte offsets of elements
 from xml.dom.minidom import getDOMImplementation   # Making blank XML documents
 import datetime
 import urlparse                                    # To form proper URLs
 import socket                                      # To determine IPs and Hosts
 from types import *                                # For Data Type testing
 import fnmatch
+from multiprocessing.pool import ThreadPool        # For harvesting metadata in parallel
+import bisect                                      # For prefix and range searches of the metadata index
+import base64                                      # For packing DataTable columns
+import collections                                 # For the compiled XSLT cache
+import threading
+try:
+    import cPickle as pickle                       # To save the metadata index
+except ImportError:
+    import pickle
 #-----------------------------------------------------------------------------
 # Third Party Imports
+import pyMeasure.Code.DataHandlers.InstrumentRegistry as InstrumentRegistry
 # For XLST transformations of the data
 try:
     from lxml import etree
@@ -29,6 +40,14 @@ except:
     print("Transformations using XSLT are not available please check the lxml module")
     XSLT_CAPABLE=0
     pass
+# For the columnar DataTable encoding
+try:
+    import numpy as np
+    NUMPY_AVAILABLE=1
+except:
+    print("Numpy was not imported, the columnar DataTable encoding is not available")
+    NUMPY_AVAILABLE=0
+    pass
 # For auto generation of common method aliases
 try:
     from pyMeasure.Code.Utils.Alias import *
@@ -64,11 +83,32 @@ except:
 #-----------------------------------------------------------------------------
 # Module Constants
 PYMEASURE_ROOT=r'C:\Users\sandersa\PyCharm Projects\pyMeasure'
-INSTRUMENT_SHEETS=fnmatch.filter(os.listdir(os.path.join(
-PYMEASURE_ROOT,'Instruments')),'*.xml')
+INSTRUMENT_SHEETS=InstrumentRegistry.list_instrument_sheets(os.path.join(PYMEASURE_ROOT,'Instruments'))
 XSLT_REPOSITORY='../XSL'
 TESTS_DIRECTORY=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests')
 DRIVER_FILE_EXTENSIONS=['sys','SYS','drv','DRV']
+# {host name:socket.gethostbyaddr(host name)} so each host is only resolved once, '' is the local host
+HOST_ADDRESSES={}
+# The number of threads metadata_robot uses to read metadata, most of the time is spent waiting on the disk
+METADATA_ROBOT_WORKERS=8
+# The metadata index of name_Metadata.xml is saved as name_Metadata.index.pickle
+METADATA_INDEX_EXTENSION='index.pickle'
+# DataTable data encodings, 'tuple' is a Tuple element per row with an attribute per column and 'columnar' is a
+# Column element per column holding all of its values
+DATA_TABLE_ENCODINGS=['tuple','columnar']
+# Delimiters tried in order for a delimited column of strings, if every one is in a value it is base64 packed
+COLUMN_DELIMITERS=[',',';','|','\t']
+# Compiled style sheets {absolute path:(modification time,etree.XSLT)}, least recently used first
+XSLT_CACHE=collections.OrderedDict()
+XSLT_CACHE_SIZE=32
+XSLT_CACHE_LOCK=threading.Lock()
+# The XML backends of XMLBase, with lxml a file is parsed into an lxml tree or a minidom document when one of
+# them is first needed and XSLT, save and str work on the lxml tree directly
+XML_BACKENDS=['lxml','minidom']
+if XSLT_CAPABLE:
+    DEFAULT_XML_BACKEND='lxml'
+else:
+    DEFAULT_XML_BACKEND='minidom'
 
 NODE_TYPE_DICTIONARY={'ELEMENT_NODE':1, 'ATTRIBUTE_NODE':2, 'TEXT_NODE':3, \
 'CDATA_SECTION_NODE':4,'ENTITY_NODE':6, 'PROCESSING_INSTRUCTION_NODE':7, \
@@ -119,6 +159,258 @@ def get_XML_text(tag_name,path=None,text=None):
      text)
     return tag_match.group('XML_text')
 
+def iterparse_attributes(file_path,tag,attribute_names):
+    """Streams the xml file at file_path and returns a list with a tuple of the attribute_names values of each
+    tag element. Elements are cleared as soon as they are read so a large file is never held in memory"""
+    rows=[]
+    if XSLT_CAPABLE:
+        for event,element in etree.iterparse(file_path,events=('end',),tag=tag):
+            rows.append(tuple([element.get(attribute_name,'') for attribute_name in attribute_names]))
+            element.clear()
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    else:
+        for attributes,start,end,childless in stream_element_offsets(file_path,tag):
+            rows.append(tuple([attributes.get(attribute_name,'') for attribute_name in attribute_names]))
+    return rows
+
+def stream_element_offsets(file_path,tag):
+    """Streams the xml file at file_path and returns a list of (attribute dictionary,start,end,childless) for each
+    tag element, where start is the byte offset of its start tag and end the offset of its end tag, or of the
+    end of the element if it is an empty element like <Entry/>. childless is True if the element has no child
+    elements or text, only then can it be an empty element"""
+    elements=[]
+    open_elements=[]
+    # the number of elements and runs of text seen so far, an element is childless if it is unchanged at its end
+    content_count=[0]
+    parser=xml.parsers.expat.ParserCreate()
+    def start_element(name,attributes):
+        content_count[0]+=1
+        if name==tag:
+            open_elements.append((attributes,parser.CurrentByteIndex,content_count[0]))
+    def end_element(name):
+        if name==tag:
+            attributes,start,count=open_elements.pop()
+            elements.append((attributes,start,parser.CurrentByteIndex,count==content_count[0]))
+    def character_data(data):
+        content_count[0]+=1
+    parser.StartElementHandler=start_element
+    parser.EndElementHandler=end_element
+    parser.CharacterDataHandler=character_data
+    in_file=open(file_path,'rb')
+    try:
+        parser.ParseFile(in_file)
+    finally:
+        in_file.close()
+    return elements
+
+def read_element(file_path,start,end,childless=False):
+    """Reads the element from stream_element_offsets that starts at byte start and whose end tag starts at byte
+    end (or that ends at byte end for an empty element) and returns it as a minidom element"""
+    in_file=open(file_path,'rb')
+    try:
+        in_file.seek(start)
+        text=in_file.read(end-start)
+        # only a childless element can be empty, then text is just its start tag
+        if not (childless and text.endswith('/>')):
+            # read on through the > that closes the end tag
+            tail=''
+            while not tail.endswith('>'):
+                character=in_file.read(1)
+                if not character:
+                    break
+                tail=tail+character
+            text=text+tail
+    finally:
+        in_file.close()
+    return xml.dom.minidom.parseString(text).documentElement
+
+def get_host_address(host=''):
+    """Returns socket.gethostbyaddr for host, or for the local host if host is empty. The result is kept for
+    the life of the process"""
+    if not HOST_ADDRESSES.has_key(host):
+        if host in ['',u'']:
+            HOST_ADDRESSES[host]=socket.gethostbyaddr(socket.gethostname())
+        else:
+            HOST_ADDRESSES[host]=socket.gethostbyaddr(host)
+    return HOST_ADDRESSES[host]
+
+def get_metadata_path(file_register_path):
+    """Returns the default path of the Metadata file of a FileRegister, name.xml gives name_Metadata.xml"""
+    file_register_path=file_register_path.replace('\\','/')
+    file_register_name=file_register_path.split('/')[-1]
+    file_register_extension=file_register_name.split('.')[-1]
+    metadata_name=file_register_name.replace('.'+file_register_extension,'_Metadata.'+file_register_extension)
+    return file_register_path.replace(file_register_name,metadata_name)
+
+def harvest_metadata(path,system_metadata=None):
+    """Returns {tag:metadata} for the file at path from the GetMetadata extractors, for instance the tags
+    System_Metadata, Image_Metadata and Python_Docstring. If the size and mod_time of the file are the same as in
+    system_metadata, the System_Metadata of the last harvest, the file has not changed and None is returned"""
+    try:
+        stat_result=os.stat(path)
+    except OSError:
+        print 'No system metadata for %s'%path
+        return {}
+    if system_metadata is not None:
+        new_system_metadata=get_system_metadata(path,stat_result)
+        if str(new_system_metadata['size'])==system_metadata.get('size') and \
+                str(new_system_metadata['mod_time'])==system_metadata.get('mod_time'):
+            return None
+    metadata=extract_metadata(path,stat_result)
+    if metadata.has_key('Python_Docstring'):
+        metadata['Python_Docstring']=str(metadata['Python_Docstring']['Python_Docstring'])
+    return metadata
+
+def tokenize(text):
+    """Returns the list of lower case words and numbers in text, the tokens of the metadata index"""
+    return re.findall('[a-z0-9]+',unicode(text).lower())
+
+def get_file_node_fields(file_node):
+    """Returns {field:value} for a File node of a Metadata document. The attributes of the File node are fields
+    File.attribute, the attributes and child elements of a metadata element Tag are Tag.attribute and Tag.child
+    and the text of a metadata element is Tag"""
+    fields={}
+    for name,value in file_node.attributes.items():
+        fields['File.'+str(name)]=value
+    for element in file_node.childNodes:
+        if element.nodeType!=element.ELEMENT_NODE:
+            continue
+        tag=str(element.tagName)
+        for name,value in element.attributes.items():
+            fields[tag+'.'+str(name)]=value
+        text=[]
+        for child in element.childNodes:
+            if child.nodeType==child.ELEMENT_NODE:
+                fields[tag+'.'+str(child.tagName)]="".join([grandchild.data for grandchild in child.childNodes
+                                                           if grandchild.nodeType==grandchild.TEXT_NODE]).strip()
+            elif child.nodeType==child.TEXT_NODE:
+                text.append(child.data)
+        if "".join(text).strip():
+            fields[tag]="".join(text).strip()
+    return fields
+
+def index_value(value):
+    """Returns value as a float if it is a number, otherwise as a string, so range searches compare numbers as
+    numbers and dates as iso strings"""
+    try:
+        return float(value)
+    except (TypeError,ValueError):
+        return unicode(value)
+
+def encode_column(values,column_encoding='base64'):
+    """Returns (attributes,text) of a DataTable Column element for a list of values. Numbers are stored as a
+    typed array, packed little endian in base64 or written out delimited (column_encoding='delimited'), other
+    values as delimited strings"""
+    array=np.array(values)
+    if array.dtype.kind in 'biuf':
+        array=array.astype(array.dtype.newbyteorder('<'))
+        attributes={"type":array.dtype.str,"rows":str(len(array))}
+        if column_encoding=='delimited':
+            attributes["encoding"]='delimited'
+            attributes["delimiter"]=','
+            if array.dtype.kind=='b':
+                # booleans are written 0 and 1, numpy reads any non empty string as True
+                array=array.astype('<u1')
+            return attributes,",".join([repr(value) for value in array.tolist()])
+        attributes["encoding"]='base64'
+        return attributes,base64.b64encode(array.tostring())
+    strings=[unicode(value) for value in values]
+    attributes={"type":'string',"rows":str(len(strings))}
+    for delimiter in COLUMN_DELIMITERS:
+        if not [string for string in strings if delimiter in string]:
+            attributes["encoding"]='delimited'
+            attributes["delimiter"]=delimiter
+            return attributes,delimiter.join(strings)
+    attributes["encoding"]='base64'
+    return attributes,base64.b64encode(u'\x00'.join(strings).encode('utf-8'))
+
+def decode_column(column_node):
+    """Returns the values of a DataTable Column element as a numpy array"""
+    text="".join([child.data for child in column_node.childNodes if child.nodeType==child.TEXT_NODE])
+    number_rows=int(column_node.getAttribute('rows'))
+    column_type=str(column_node.getAttribute('type'))
+    if number_rows==0:
+        if column_type=='string':
+            return np.array([],dtype=unicode)
+        return np.array([],dtype=np.dtype(column_type))
+    if column_node.getAttribute('encoding')=='base64':
+        data=base64.b64decode(text.strip())
+        if column_type=='string':
+            return np.array(data.decode('utf-8').split(u'\x00'))
+        return np.frombuffer(data,dtype=np.dtype(column_type)).copy()
+    values=text.split(column_node.getAttribute('delimiter'))
+    if column_type=='string':
+        return np.array(values)
+    if np.dtype(column_type).kind=='b':
+        return np.array([int(value) for value in values]).astype(np.dtype(column_type))
+    return np.array([value.strip() for value in values]).astype(np.dtype(column_type))
+
+def get_XSLT_transform(XSLT):
+    """Returns the compiled etree.XSLT for the style sheet XSLT. A style sheet path is compiled once and kept in
+    XSLT_CACHE until the file changes or it is the least recently used of more than XSLT_CACHE_SIZE style
+    sheets, anything else etree.parse accepts is compiled every time"""
+    try:
+        path=os.path.abspath(XSLT)
+        modification_time=os.path.getmtime(path)
+    except (TypeError,AttributeError,OSError):
+        return etree.XSLT(etree.parse(XSLT))
+    with XSLT_CACHE_LOCK:
+        cached=XSLT_CACHE.pop(path,None)
+        if cached is not None and cached[0]==modification_time:
+            XSLT_CACHE[path]=cached
+            return cached[1]
+    XSL_transform=etree.XSLT(etree.parse(XSLT))
+    with XSLT_CACHE_LOCK:
+        XSLT_CACHE[path]=(modification_time,XSL_transform)
+        while len(XSLT_CACHE)>XSLT_CACHE_SIZE:
+            XSLT_CACHE.popitem(last=False)
+    return XSL_transform
+
+def clear_XSLT_cache():
+    """Forgets every compiled style sheet"""
+    with XSLT_CACHE_LOCK:
+        XSLT_CACHE.clear()
+
+def get_max_Index(Indices):
+    """Returns the largest integer Index in Indices or None if there are none"""
+    max_Index=None
+    for Index in Indices:
+        try:
+            Index=int(Index)
+        except (TypeError,ValueError):
+            continue
+        if max_Index is None or Index>max_Index:
+            max_Index=Index
+    return max_Index
+
+def append_to_root(file_path,text):
+    """Inserts text before the closing tag of the root element of the xml file at file_path, without reading
+    the rest of the file"""
+    in_file=open(file_path,'rb+')
+    try:
+        in_file.seek(0,os.SEEK_END)
+        size=in_file.tell()
+        # the closing tag is at the end of the file, read back until it is found
+        tail_size=256
+        while True:
+            position=max(size-tail_size,0)
+            in_file.seek(position)
+            tail=in_file.read()
+            closing_position=tail.rfind('</')
+            if closing_position>=0 or position==0:
+                break
+            tail_size=tail_size*2
+        if closing_position<0:
+            raise IOError("{0} has no closing root tag".format(file_path))
+        in_file.seek(position+closing_position)
+        closing_tag=tail[closing_position:]
+        in_file.write(text)
+        in_file.write(closing_tag)
+        in_file.truncate()
+    finally:
+        in_file.close()
+
 def URL_to_path(URL,form='string'):
     """Takes an URL and returns a path as form.
     Argument form may be 'string' or 'list'"""
@@ -138,30 +430,8 @@ def condition_URL(URL):
     return str(urlparse.urlunparse(parsed_URL).replace('///',''))
 def determine_instrument_type_from_string(string):
     """ Given a string returns the instrument type"""
-
-    if type(string) in StringTypes:
-         # Start with the easy ones
-         for instrument_type in INSTRUMENT_TYPES:
-            match= re.compile(instrument_type,re.IGNORECASE)
-            if re.search(match,string):
-                return instrument_type
-         # Now read in all the Instrument sheets and look for a match
-         # Returning the Name in the Instrument_Type Tag
-         instrument_folder=os.path.join(PYMEASURE_ROOT,'Instruments')
-         for instrument_sheet in os.listdir(instrument_folder):
-             path=os.path.join(PYMEASURE_ROOT,'Instruments',instrument_sheet)
-             if os.path.isfile(path):
-                f=open(path,'r')
-                text=f.read()
-                if re.search(string,text):
-                    tag_match=re.search(
-                    '<Instrument_Type>(?P<instrument_type>\w+)</Instrument_Type>',
-                    text)
-                    try:
-                        return tag_match.group('instrument_type')
-                    except:pass
-    else:
-        return None
+    return InstrumentRegistry.determine_instrument_type_from_string(string,
+                                                                    os.path.join(PYMEASURE_ROOT,'Instruments'))
 
 def determine_instrument_type(object):
     """Tries to return an instrument type given an address, name, serial #
@@ -189,8 +459,14 @@ def determine_instrument_type(object):
                 except: pass
 #-----------------------------------------------------------------------------
 # Module Classes
-class XMLBase():
-    """ The XMLBase Class is designed to be a container for xml data
+class XMLBase(object):
+    """ The XMLBase Class is designed to be a container for xml data. The xml_backend option chooses how the
+    document is held. With 'minidom' self.document is always a minidom document. With 'lxml' (the default when
+    lxml is available) the document is held as an lxml tree (self.get_etree()) until self.document is used,
+    so documents that are only read, transformed or saved never build a minidom document. Once self.document
+    has been used the minidom document is the one that is kept and get_etree returns a copy of it. Subclasses
+    read what they need when they are opened with get_attribute_rows or get_etree and use self.document only
+    for what they return or change
     """
     def __init__(self,file_path=None,**options):
         "Initializes the XML Base Class "
@@ -201,25 +477,42 @@ class XMLBase():
                   "specific_descriptor":'XML',
                   "general_descriptor":'Document',
                   "directory":None,
-                  "extension":'xml'
+                  "extension":'xml',
+                  "xml_backend":DEFAULT_XML_BACKEND
                   }
         self.options={}
         for key,value in defaults.iteritems():
             self.options[key]=value
         for key,value in options.iteritems():
             self.options[key]=value
+        if self.options["xml_backend"] not in XML_BACKENDS:
+            raise ValueError("The xml_backend {0} is not one of {1}".format(self.options["xml_backend"],
+                                                                           XML_BACKENDS))
+        if self.options["xml_backend"]=='lxml' and not XSLT_CAPABLE:
+            self.options["xml_backend"]='minidom'
+        # The document is the minidom document, the lxml tree or the unparsed file, whichever is current
+        self._dom_document=None
+        self._etree_document=None
+        self._unparsed_path=None
         # Define Method Aliases if they are available
         if METHOD_ALIASES:
             for command in alias(self):
                 exec(command)
         #if the file path is not supplied create a new xml sheet
         if file_path is None:
-            impl=getDOMImplementation()
-            self.document=impl.createDocument(None,self.options['root'],None)
-            # Should be a relative path for
-            new_node=self.document.createProcessingInstruction('xml-stylesheet',
-            u'type="text/xsl" href="%s"'%self.options['style_sheet'])
-            self.document.insertBefore(new_node,self.document.documentElement)
+            if self.options["xml_backend"]=='lxml':
+                root=etree.Element(self.options['root'])
+                self._etree_document=etree.ElementTree(root)
+                root.addprevious(etree.ProcessingInstruction('xml-stylesheet',
+                                 'type="text/xsl" href="%s"'%self.options['style_sheet']))
+            else:
+                impl=getDOMImplementation()
+                document=impl.createDocument(None,self.options['root'],None)
+                # Should be a relative path for
+                new_node=document.createProcessingInstruction('xml-stylesheet',
+                u'type="text/xsl" href="%s"'%self.options['style_sheet'])
+                document.insertBefore(new_node,document.documentElement)
+                self._dom_document=document
             if DEFAULT_FILE_NAME is None:
                 self.path=auto_name(self.options["specific_descriptor"],
                                     self.options["general_descriptor"],
@@ -229,17 +522,85 @@ class XMLBase():
                 # Just a backup plan if the python path is messed up
                 self.path=DEFAULT_FILE_NAME
         else:
-            file_in=open(file_path,'r')
-            self.document=xml.dom.minidom.parse(file_in)
-            file_in.close()
+            if self.options["xml_backend"]=='lxml':
+                # parsed when it is first used, into the form that is used
+                if not os.path.isfile(file_path):
+                    raise IOError("No such file: '{0}'".format(file_path))
+                self._unparsed_path=file_path
+            else:
+                file_in=open(file_path,'r')
+                self._dom_document=xml.dom.minidom.parse(file_in)
+                file_in.close()
             self.path=file_path
 
+    def get_document(self):
+        """Returns the minidom document, converting the lxml tree if that is how the document is held"""
+        if self._dom_document is None:
+            if self._etree_document is not None:
+                self._dom_document=xml.dom.minidom.parseString(etree.tostring(self._etree_document,
+                                                                              encoding='utf-8',
+                                                                              xml_declaration=True))
+            elif self._unparsed_path is not None:
+                file_in=open(self._unparsed_path,'r')
+                self._dom_document=xml.dom.minidom.parse(file_in)
+                file_in.close()
+            # from now on the minidom document is the one that is changed
+            self._etree_document=None
+            self._unparsed_path=None
+        return self._dom_document
+
+    def set_document(self,document):
+        """Sets the document to a minidom document"""
+        self._dom_document=document
+        self._etree_document=None
+        self._unparsed_path=None
+
+    # the lambdas let subclasses override get_document and set_document
+    document=property(lambda self:self.get_document(),lambda self,document:self.set_document(document))
+
+    def get_unparsed_path(self):
+        """Returns the path of the file if it has not been parsed yet, otherwise None"""
+        return self._unparsed_path
+
+    def get_attribute_rows(self,tag,attribute_names):
+        """Returns a list with a tuple of the attribute_names values of each tag element, read from the form the
+        document is held in so that reading the attributes never builds a minidom document"""
+        if self._dom_document is not None:
+            return [tuple([node.getAttribute(attribute_name) for attribute_name in attribute_names])
+                    for node in self._dom_document.getElementsByTagName(tag)]
+        if self._unparsed_path is not None:
+            return iterparse_attributes(self._unparsed_path,tag,attribute_names)
+        if self._etree_document is None:
+            return []
+        return [tuple([element.get(attribute_name,'') for attribute_name in attribute_names])
+                for element in self._etree_document.iter(tag)]
+
+    def get_etree(self):
+        """Returns the document as an lxml tree, the tree itself with the lxml backend or a copy of the minidom
+        document once self.document has been used"""
+        if self._dom_document is not None:
+            return etree.ElementTree(etree.fromstring(self._dom_document.toxml().encode('utf-8')))
+        if self._etree_document is None and self._unparsed_path is not None:
+            parser=etree.XMLParser(remove_blank_text=True)
+            self._etree_document=etree.parse(self._unparsed_path,parser)
+            self._unparsed_path=None
+        return self._etree_document
+
+    def to_string(self):
+        """Returns the document as a pretty printed xml string"""
+        if self._dom_document is None:
+            return etree.tostring(self.get_etree(),pretty_print=True,encoding='utf-8',xml_declaration=True)
+        return self._dom_document.toprettyxml()
+
     def save(self,path=None):
         """" Saves as an XML file"""
         if path is None:
             path=self.path
+        text=self.to_string()
+        if isinstance(text,unicode):
+            text=text.encode('utf-8')
         file_out=open(path,'w')
-        file_out.write(self.document.toprettyxml())
+        file_out.write(text)
         file_out.close()
 
     if XSLT_CAPABLE:
@@ -248,9 +609,8 @@ class XMLBase():
             if XSLT is None:
                 # For some reason an absolute path tends to break here, maybe a spaces in file names problem
                 XSLT=self.options['style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
-            HTML=XSL_transform(etree.XML(self.document.toxml()))
+            XSL_transform=get_XSLT_transform(XSLT)
+            HTML=XSL_transform(self.get_etree())
             return str(HTML)
 
         def save_HTML(self,XSLT=None,file_path=None):
@@ -295,28 +655,99 @@ class XMLBase():
 
     def __str__(self):
         "Controls how XMLBAse is returned when a string function is called"
-        return self.document.toprettyxml()
+        return self.to_string()
+
+class EntryOffsetDictionary(dict):
+    """A read only {Index:entry} dictionary for a log that has not been loaded, it holds the byte offsets of
+    the entries in the file and parses an entry when it is looked up"""
+    def __init__(self,file_path,offsets):
+        dict.__init__(self,offsets)
+        self.path=file_path
+
+    def __getitem__(self,Index):
+        start,end,childless=dict.__getitem__(self,Index)
+        return read_element(self.path,start,end,childless)
+
+    def get(self,Index,default=None):
+        if Index in self:
+            return self[Index]
+        return default
+
+    def values(self):
+        return [self[Index] for Index in self.keys()]
+
+    def items(self):
+        return [(Index,self[Index]) for Index in self.keys()]
+
+    def itervalues(self):
+        for Index in self.keys():
+            yield self[Index]
+
+    def iteritems(self):
+        for Index in self.keys():
+            yield Index,self[Index]
 
 class XMLLog(XMLBase):
-    """ Data container for a general XMLLog"""
+    """ Data container for a general XMLLog. With the option load_entries=False and the lxml backend only the
+    Index and byte offset of each entry are streamed from the file, entries are parsed when they are looked up
+    and the whole log is loaded the first time self.document is used, for instance by add_entry. With the option
+    save_mode='journal' save appends the entries added since the last save to the end of the file instead of
+    writing the whole log. Only add_entry and add_description are journaled, after an entry that is already in
+    the file is changed (edit_entry, remove_entry or mark_entry_changed) the next save writes the whole log"""
     def __init__(self,file_path=None,**options):
         """ Intializes the XMLLog"""
         # We add the defaults for the log pass and the options along
         defaults={"root":'Log',
                   'style_sheet':os.path.join(XSLT_REPOSITORY,'DEFAULT_LOG_STYLE.xsl').replace('\\','/'),
                   'entry_style_sheet':os.path.join(XSLT_REPOSITORY,'DEFAULT_LOG_STYLE.xsl').replace('\\','/'),
-                  'specific_descriptor':'XML','general_descriptor':'Log'}
+                  'specific_descriptor':'XML','general_descriptor':'Log',"load_entries":True,
+                  "save_mode":'full'}
         self.options={}
         for key,value in defaults.iteritems():
             self.options[key]=value
         for key,value in options.iteritems():
             self.options[key]=value
+        # {Index:entry}, built from the minidom document the first time Index_node_dictionary is used
+        self._Index_node_dictionary=None
+        self.max_Index=None
         XMLBase.__init__(self,file_path,**self.options)
-        # TODO: Check how scalable a dictionary of nodes is
-        self.Index_node_dictionary=dict([(str(node.getAttribute('Index')),
-        node) for node in \
-        self.document.getElementsByTagName('Entry')])   
+        if not self.options["load_entries"] and self.get_unparsed_path() is not None:
+            offsets=dict([(str(attributes.get('Index','')),(start,end,childless))
+                          for attributes,start,end,childless in
+                          stream_element_offsets(self.get_unparsed_path(),'Entry')])
+            self.Index_node_dictionary=EntryOffsetDictionary(self.path,offsets)
+            self.max_Index=get_max_Index(offsets.keys())
+        else:
+            self.max_Index=get_max_Index([str(Index) for (Index,) in self.get_attribute_rows('Entry',['Index'])])
         self.current_entry={}
+        # the entries added since the file at journal_path was last the same as the log
+        self.unsaved_entries=[]
+        if file_path is not None and os.path.isfile(self.path):
+            self.journal_path=self.path
+        else:
+            self.journal_path=None
+
+    def get_document(self):
+        """Returns the minidom document, loading the whole log if only its index was streamed"""
+        document=XMLBase.get_document(self)
+        if isinstance(self._Index_node_dictionary,EntryOffsetDictionary):
+            self._Index_node_dictionary=None
+        return document
+
+    def get_Index_node_dictionary(self):
+        """Returns the {Index:entry} dictionary of the log, the first time it is used the entries are looked up
+        in the minidom document"""
+        if self._Index_node_dictionary is None:
+            self.update_Index_node_dictionary()
+        return self._Index_node_dictionary
+
+    def set_Index_node_dictionary(self,Index_node_dictionary):
+        """Sets the {Index:entry} dictionary of the log"""
+        self._Index_node_dictionary=Index_node_dictionary
+
+    Index_node_dictionary=property(lambda self:self.get_Index_node_dictionary(),
+                                   lambda self,Index_node_dictionary:
+                                   self.set_Index_node_dictionary(Index_node_dictionary))
                    
     def add_entry(self,entry=None):
         """ Adds an entry element to the current log"""
@@ -334,12 +765,11 @@ class XMLLog(XMLBase):
                 new_entry=new_document.documentElement
         else:
             new_entry=entry
-        # Find the max of Index's and add 1 to make a new Index
-        if len(self.Index_node_dictionary)==0:
+        # Add 1 to the max of Index's to make a new Index
+        if self.max_Index is None:
             new_Index='1'
         else:
-            max_Index=max([int(Index) for Index in self.Index_node_dictionary.keys()])
-            new_Index=str(max_Index+1)
+            new_Index=str(self.max_Index+1)
         # Add the Index attribute to the new entry
         Index_attribute=self.document.createAttribute('Index')
         new_entry.setAttributeNode(Index_attribute)
@@ -354,7 +784,7 @@ class XMLLog(XMLBase):
             new_entry.setAttribute('Date',str(date))
         # Now append the new Child        
         root.appendChild(new_entry)
-        self.update_Index_node_dictionary()
+        self.add_to_Index_node_dictionary(new_entry)
         
         try:
             value=new_entry.childNodes[0].data
@@ -377,8 +807,12 @@ class XMLLog(XMLBase):
             
         elif not new_Index is None:
             node.setAttribute('Index',new_Index)
+            del self.Index_node_dictionary[str(old_Index)]
+            self.Index_node_dictionary[str(new_Index)]=node
+            self.max_Index=get_max_Index(self.Index_node_dictionary.keys())
         elif not new_Date is None:
             node.setAttribute('Date',new_Date)
+        self.mark_entry_changed(node)
         self.current_entry={'Tag':'Entry','Value':node.childNodes[0].data,'Index':node.getAttribute('Index'),
         'Date':node.getAttribute('Date')}    
                 
@@ -398,8 +832,14 @@ class XMLLog(XMLBase):
     def remove_entry(self,Index):
         """ Removes the entry using the Index attribute"""
         root=self.document.documentElement
-        root.removeChild(self.Index_node_dictionary[Index])
-        self.update_Index_node_dictionary()
+        node=self.Index_node_dictionary.pop(str(Index))
+        root.removeChild(node)
+        if node in self.unsaved_entries:
+            self.unsaved_entries.remove(node)
+        else:
+            self.journal_path=None
+        if self.max_Index==get_max_Index([Index]):
+            self.max_Index=get_max_Index(self.Index_node_dictionary.keys())
         
     def add_description(self,description=None):
         """ Adds an entry with Index='-1' which holds data about the log itself"""
@@ -419,7 +859,7 @@ class XMLLog(XMLBase):
         new_entry.setAttribute('Date',str(date))
         # Now append the new Child        
         root.appendChild(new_entry)
-        self.update_Index_node_dictionary()
+        self.add_to_Index_node_dictionary(new_entry)
             
     def update_Index_node_dictionary(self):
         """ Re-creates the attribute self.Index_node_dictionary, using the current
@@ -427,14 +867,42 @@ class XMLLog(XMLBase):
         self.Index_node_dictionary=dict([(str(node.getAttribute('Index')),
         node) for node in \
         self.document.getElementsByTagName('Entry')])
+        self.max_Index=get_max_Index(self.Index_node_dictionary.keys())
+
+    def add_to_Index_node_dictionary(self,entry):
+        """Adds an entry that was appended to the document to self.Index_node_dictionary and to the entries
+        for the next journal save"""
+        Index=str(entry.getAttribute('Index'))
+        self.Index_node_dictionary[Index]=entry
+        self.max_Index=get_max_Index([Index,self.max_Index])
+        self.unsaved_entries.append(entry)
+
+    def mark_entry_changed(self,entry):
+        """Records that entry was changed, if it is already in the file the log can no longer be appended to it
+        and the next save writes the whole log. Code that changes an entry node directly should call this"""
+        if entry not in self.unsaved_entries:
+            self.journal_path=None
+
+    def save(self,path=None):
+        """Saves the log as an XML file. With save_mode 'journal' only the entries added since the last save
+        are written, before the closing tag of the file, if the file holds the rest of the log"""
+        if path is None:
+            path=self.path
+        if self.options["save_mode"]=='journal' and path==self.journal_path and os.path.isfile(path):
+            if self.unsaved_entries:
+                append_to_root(path,"".join(['\t'+entry.toxml().encode('utf-8')+'\n'
+                                             for entry in self.unsaved_entries]))
+        else:
+            XMLBase.save(self,path)
+        self.unsaved_entries=[]
+        self.journal_path=path
     # if the XSLT engine loaded then define a transformation to HTML    
     if XSLT_CAPABLE:
         def current_entry_to_HTML(self,XSLT=None):
             """ Returns HTML string by applying a XSL to the XML document"""
             if XSLT is None:
                 XSLT=self.options['entry_style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
+            XSL_transform=get_XSLT_transform(XSLT)
             current_entry_XML=self.Index_node_dictionary[self.current_entry['Index']]
             HTML=XSL_transform(etree.XML(current_entry_XML.toxml())) 
             return HTML         
@@ -564,6 +1032,7 @@ class EndOfDayXMLLog(XMLLog):
             new_text=self.document.createTextNode(str(value))
             new_element.appendChild(new_text)
             node.appendChild(new_element)
+        self.mark_entry_changed(node)
     def add_EndOfDayXMLLog_description(self,program_name=None):
         """ Adds a description of the log as element Index=-1"""
         description="""This is a End of day log. It consists of entries with
@@ -585,7 +1054,9 @@ class DataTable(XMLBase):
     def __init__(self,file_path=None,**options):
         """ Intializes the DataTable Class. Passing **{'data_table':[mylist]} creates a
         table with x1 and x2 as column names. Passing **{'data_dictionary':{'Data_Description':{'Tag':'Text',etc},
-        'Data':[{'x':1,'y':2},{'x':2,'y':3}]
+        'Data':[{'x':1,'y':2},{'x':2,'y':3}]. With the option data_encoding='columnar' the data is
+        stored as <Data encoding="columnar"><Column name="x" type="<f8" encoding="base64" rows="2">..
+        </Column></Data>, one element per column, column_encoding='delimited' writes numbers as text
          """
         # the general idea is <Data_Description/><Data><Tuple i=''/></Data>
 
@@ -596,7 +1067,9 @@ class DataTable(XMLBase):
                   "specific_descriptor":'Data',
                   "general_descriptor":'Table',
                   "directory":None,
-                  "extension":'xml'
+                  "extension":'xml',
+                  "data_encoding":'tuple',
+                  "column_encoding":'base64'
                   }
         self.options={}
         for key,value in defaults.iteritems():
@@ -642,6 +1115,8 @@ class DataTable(XMLBase):
 
     def list_to_XML(self,data_list):
         """ Converts a list to XML document"""
+        if self.options["data_encoding"]=='columnar':
+            return self.list_to_columnar_XML(data_list)
         data_node=self.document.createElement('Data')
         #self.document.documentElement.appendChild(data_node)
         for row in data_list:
@@ -661,9 +1136,72 @@ class DataTable(XMLBase):
                 data_node.appendChild(new_entry)
         return data_node
 
+    def list_to_columnar_XML(self,data_list):
+        """ Converts a list of rows (lists or dictionaries) to a Data element with a Column
+        element per column"""
+        if not NUMPY_AVAILABLE:
+            raise ImportError("The columnar DataTable encoding needs numpy")
+        column_names=[]
+        for row in data_list:
+            if type(row) is DictionaryType:
+                for key in row.keys():
+                    if key not in column_names:
+                        column_names.append(key)
+            elif len(row)>len(column_names):
+                column_names=column_names+['X%s'%j for j in range(len(column_names),len(row))]
+        columns=dict([(column_name,[]) for column_name in column_names])
+        for row in data_list:
+            if type(row) is DictionaryType:
+                for column_name in column_names:
+                    columns[column_name].append(row.get(column_name,''))
+            else:
+                for j,column_name in enumerate(column_names):
+                    if j<len(row):
+                        columns[column_name].append(row[j])
+                    else:
+                        columns[column_name].append('')
+        data_node=self.document.createElement('Data')
+        data_node.setAttribute('encoding','columnar')
+        for column_name in column_names:
+            attributes,text=encode_column(columns[column_name],self.options["column_encoding"])
+            column_node=self.document.createElement('Column')
+            column_node.setAttribute('name',column_name)
+            for key,value in attributes.iteritems():
+                column_node.setAttribute(key,value)
+            column_node.appendChild(self.document.createTextNode(text))
+            data_node.appendChild(column_node)
+        return data_node
+
+    def get_column_nodes(self):
+        """ Returns {column name:Column element} of a columnar table, {} for a Tuple table"""
+        return dict([(str(node.getAttribute('name')),node) for node in self.document.getElementsByTagName('Column')
+                     if node.parentNode.getAttribute('encoding')=='columnar'])
+
+    def to_array(self,attribute_name):
+        """ Returns a data column as a numpy array, read directly from a columnar table
+        and converted to numbers if it can be from a Tuple table"""
+        column_nodes=self.get_column_nodes()
+        if column_nodes:
+            return decode_column(column_nodes[attribute_name])
+        values=self.to_list(attribute_name)
+        try:
+            return np.array(values,dtype=float)
+        except ValueError:
+            return np.array(values)
+
+    def to_arrays(self,attribute_names=None):
+        """ Returns {name:numpy array} for attribute_names or every column"""
+        if attribute_names is None:
+            attribute_names=self.get_attribute_names()
+        return dict([(attribute_name,self.to_array(attribute_name)) for attribute_name in attribute_names])
+
     def get_attribute_names(self):
         """ Returns the attribute names in the first tuple element in the 'data' element """
         attribute_names=[]
+        column_names=[str(node.getAttribute('name')) for node in self.document.getElementsByTagName('Column')
+                      if node.parentNode.getAttribute('encoding')=='columnar']
+        if column_names:
+            return column_names
         data_nodes=self.document.getElementsByTagName('Data')
         first_tuple_node=data_nodes[0].childNodes[1]
         text=first_tuple_node.toprettyxml()
@@ -682,6 +1220,9 @@ class DataTable(XMLBase):
     def to_list(self,attribute_name):
         """ Outputs the data as a list given a data column (attribute) name"""
         try:
+            column_nodes=self.get_column_nodes()
+            if column_nodes:
+                return [unicode(value) for value in decode_column(column_nodes[attribute_name]).tolist()]
             node_list=self.document.getElementsByTagName('Tuple')
             data_list=[node.getAttribute(attribute_name) for node in node_list]
             return data_list
@@ -691,6 +1232,8 @@ class DataTable(XMLBase):
     def to_tuple_list(self,attribute_names):
         """ Returns a list of tuples for the specified list of attribute names"""
         try:
+            if self.get_column_nodes():
+                return zip(*[self.to_list(attribute_name) for attribute_name in attribute_names])
             node_list=self.document.getElementsByTagName('Tuple')
             data_list=[tuple([node.getAttribute(attribute_name) for
             attribute_name in attribute_names]) for node in node_list]
@@ -715,6 +1258,54 @@ class DataTable(XMLBase):
                 return out
         except:
             raise
+class FileIdTrie():
+    """ The Ids of a FileRegister as a trie keyed on host IP address and then path
+    components. A File Id is the IP address followed by a node for each part of the
+    path, a type digit (1 directory, 2 ordinary, 3 driver) and a number one more than
+    the largest number among its siblings. Each trie node keeps that largest number
+    so a new Id takes one step per part of the path"""
+    def __init__(self,Id_dictionary=None):
+        self.hosts={}
+        if Id_dictionary is not None:
+            for URL,Id in Id_dictionary.iteritems():
+                self.add(URL,Id)
+
+    def add(self,URL,Id):
+        """ Adds a registered URL and its Id"""
+        Id_parts=str(Id).split('.')
+        node=self.hosts.setdefault('.'.join(Id_parts[:4]),{'Id_part':None,'max_number':0,'children':{}})
+        for part,Id_part in zip(URL_to_path(URL,form='list'),Id_parts[4:]):
+            try:
+                node['max_number']=max(node['max_number'],int(Id_part[1:]))
+            except ValueError:
+                pass
+            if not node['children'].has_key(part):
+                node['children'][part]={'Id_part':Id_part,'max_number':0,'children':{}}
+            node=node['children'][part]
+
+    def create_Id(self,IP_address,path_list,node_type):
+        """ Returns a new Id for path_list on IP_address, the last node is of node_type and
+        the others are directories, existing directories keep their node"""
+        node=self.hosts.get(IP_address)
+        Id=IP_address
+        for index,part in enumerate(path_list):
+            if index<len(path_list)-1 and node is not None and node['children'].has_key(part):
+                node=node['children'][part]
+                Id=Id+'.'+node['Id_part']
+                continue
+            if index<len(path_list)-1:
+                new_node_type='1'
+            else:
+                new_node_type=node_type
+            if node is None:
+                new_node_number=1
+            else:
+                new_node_number=node['max_number']+1
+            Id=Id+'.'+new_node_type+str(new_node_number)
+            # nothing is registered below a new node
+            node=None
+        return Id
+
 class FileRegister(XMLBase):
     """ The base class for arbitrary database, which processes the
     File Register XML File."""
@@ -738,116 +1329,45 @@ class FileRegister(XMLBase):
             self.options[key]=value
         XMLBase.__init__(self,file_path,**self.options)
 
-        self.Id_dictionary=dict([(str(node.getAttribute('URL')),
-            str(node.getAttribute('Id'))) for node in
-            self.document.getElementsByTagName('File')])
+        # an unparsed file is streamed, the document is only parsed if it is used
+        self.Id_dictionary=dict([(str(URL),str(Id)) for URL,Id in self.get_attribute_rows('File',['URL','Id'])])
+        # built from self.Id_dictionary by the first create_Id
+        self.Id_trie=None
 
-    def create_Id(self,URL):
-        """ Creates or returns the existing Id element of a URL"""
+    def create_Id(self,URL,is_directory=None):
+        """ Creates or returns the existing Id element of a URL, is_directory saves looking at the file system
+        if it is already known"""
         parsed_URL=urlparse.urlparse(condition_URL(URL))
-        try: # Look in self.Id_dictionary, if it is not there catch
-             # the exception KeyError and generate an Id.
-            return self.Id_dictionary[URL.replace('///','')]
-        except KeyError:
-            # The Id is not in the existing list so start buliding Id.
-            # Determine the IP Address of the host in the URL
-            if parsed_URL[1] in ['',u'']: #if it is empty assume local host
-                IP_address=socket.gethostbyaddr(socket.gethostname())[2][0]
+        # Look in self.Id_dictionary, if it is not there generate an Id.
+        Id=self.Id_dictionary.get(URL.replace('///',''))
+        if Id is not None:
+            return Id
+        path_list=parsed_URL[2].split('/')
+        file_extension=path_list[-1].split('.')[-1]
+        if file_extension in DRIVER_FILE_EXTENSIONS:
+            node_type='3'
+        else:
+            if is_directory is None:
+                is_directory=os.path.isdir(parsed_URL[2])
+            if is_directory:
+                node_type='1'
             else:
-                IP_address= socket.gethostbyaddr(parsed_URL[1])[2][0]
-            Id_cache={}
-            # We begin with all the entries with the same IP address
-            for (key,value) in self.Id_dictionary.iteritems():
-                if value.startswith(IP_address):
-                        Id_cache[key]=value
-            # If the Id_cache is empty then we just assign the number
-            temp_Id=IP_address
-            path_list=parsed_URL[2].split('/')
-            file_extension=path_list[-1].split('.')[-1]
-            if len(Id_cache) is 0:
-                for index,part in enumerate(path_list):
-                    if index<len(path_list)-1:
-                        temp_Id=temp_Id+'.'+'11'
-                    elif index==len(path_list)-1:
-                        if (file_extension in DRIVER_FILE_EXTENSIONS):
-                            temp_Id=temp_Id+'.'+'31'
-                        elif os.path.isdir(parsed_URL[2]):
-                            temp_Id=temp_Id+'.'+'11'
-                        else:
-                            temp_Id=temp_Id+'.'+'21'
-                return temp_Id
-            # if it is not empty we have to a little work
-            # remove the information about IP address
-            place=0
-            #print path_list
-            while place<=len(path_list):
-              # If the Id_cache is empty assign the rest of the Id.
-               if len(Id_cache) is 0:
-                    for index,part in enumerate(path_list[place:]):
-                        if index<len(path_list[place:])-1:
-                            temp_Id=temp_Id+'.'+'11'
-                        elif index==len(path_list[place:])-1:
-                            if (file_extension in DRIVER_FILE_EXTENSIONS):
-                                temp_Id=temp_Id+'.'+'31'
-                            elif os.path.isdir(parsed_URL[2]):
-                                temp_Id=temp_Id+'.'+'11'
-                            else:
-                                temp_Id=temp_Id+'.'+'21'
-                    return temp_Id
-
-                # If the Id_cache is not empty
-               else:
-                    path_cache=dict([(URL,URL_to_path(URL,form='list'))
-                        for URL in Id_cache.keys()])
-                    print Id_cache
-                    part_cache=dict([(URL,[path_cache[URL][place],
-                        Id_cache[URL].split('.')[place+4]])
-                        for URL in Id_cache.keys()])
-                    parts_list=[part_cache[URL][0]for URL in Id_cache.keys()]
-                    node_number=max([int(Id_cache[URL].split('.')[place+4][1:])
-                        for URL in Id_cache.keys()])
-                # If it is the last place
-                    if place==len(path_list)-1:
-                        new_node_number=node_number+1
-                        if (file_extension in DRIVER_FILE_EXTENSIONS):
-                            new_node_type='3'
-                        elif os.path.isdir(parsed_URL[2]):
-                            new_node_type='1'
-                        else:
-                            new_node_type='2'
-                        temp_Id=temp_Id+'.'+new_node_type+str(new_node_number)
-                        return temp_Id
-                # If it is not the last place assume it is a directory
-                    else:
-                        new_node_type='1'
-                        # Check to see if it is already in the FR
-                        if path_list[place] in parts_list:
-                            for URL in Id_cache.keys():
-                                if part_cache[URL][0]==path_list[place]:
-                                    new_node=part_cache[URL][1]
-
-                        # If not add one to node
-                        else:
-                            new_node_number=node_number+1
-                            new_node=new_node_type+str(new_node_number)
-                        temp_Id=temp_Id+'.'+new_node
-                        # Update the Id_cache for the next round, and the place
-                        for URL in Id_cache.keys():
-                            try:
-                                if not part_cache[URL][0]==path_list[place]:
-                                    del(Id_cache[URL])
-                                Id_cache[URL].split('.')[place+5]
-                            except KeyError:
-                                pass
-                            except IndexError:
-                                #print Id_cache,URL
-                                del(Id_cache[URL])
-                        place=place+1
-
-    def add_entry(self,URL):
-        """ Adds an entry to the current File Register """
+                node_type='2'
+        # Determine the IP Address of the host in the URL, if it is empty assume local host
+        IP_address=get_host_address(parsed_URL[1])[2][0]
+        return self.get_Id_trie().create_Id(IP_address,path_list,node_type)
+
+    def get_Id_trie(self):
+        """ Returns the FileIdTrie of the registered Ids, building it if needed"""
+        if self.Id_trie is None:
+            self.Id_trie=FileIdTrie(self.Id_dictionary)
+        return self.Id_trie
+
+    def add_entry(self,URL,is_directory=None):
+        """ Adds an entry to the current File Register and returns the new File node, is_directory saves
+        looking at the file system if it is already known"""
         URL=condition_URL(URL)
-        if URL in self.Id_dictionary.keys():
+        if self.Id_dictionary.has_key(URL):
             print 'Already there'
             return
         # the xml entry is <File Date="" Host="" Type="" Id="" URL=""/>
@@ -864,7 +1384,7 @@ class FileRegister(XMLBase):
         # Now assign the values
         attribute_values={}
         attribute_values['URL']=URL
-        attribute_values['Id']=self.create_Id(URL)
+        attribute_values['Id']=self.create_Id(URL,is_directory)
         attribute_values['Date']=datetime.datetime.utcnow().isoformat()
         type_code=attribute_values['Id'].split('.')[-1][0]
         if type_code in ['1',u'1']:
@@ -877,7 +1397,7 @@ class FileRegister(XMLBase):
             attribute_values['Type']="Other"
         parsed_URL=urlparse.urlparse(condition_URL(URL))
         if parsed_URL[1] in ['',u'']: #if it is empty assume local host
-            attribute_values['Host']= socket.gethostbyaddr(socket.gethostname())[0]
+            attribute_values['Host']= get_host_address()[0]
         else:
             attribute_values['Host']= parsed_URL[1]
 
@@ -886,75 +1406,79 @@ class FileRegister(XMLBase):
             new_entry.setAttribute(key,value)
         File_Registry.appendChild(new_entry)
         # Finally update the self.Id_dictionary
-        # Added boolean switch to speed up adding a lot of entries
-
-        self.Id_dictionary=dict([(str(node.getAttribute('URL')),
-            str(node.getAttribute('Id'))) for node in
-            self.document.getElementsByTagName('File')])
+        self.Id_dictionary[str(URL)]=str(attribute_values['Id'])
+        if self.Id_trie is not None:
+            self.Id_trie.add(URL,attribute_values['Id'])
+        return new_entry
     # TODO : Add an input filter that guesses at what you inputed
 
+    def add_entries(self,URLs):
+        """ Adds a list of URLs, or (URL,is_directory) tuples, as one transaction. If adding any of them fails
+        the ones already added are removed and the exception is raised. Returns the new File nodes"""
+        Id_dictionary=self.Id_dictionary.copy()
+        new_entries=[]
+        try:
+            for URL in URLs:
+                if isinstance(URL,tuple):
+                    URL,is_directory=URL
+                else:
+                    is_directory=None
+                new_entry=self.add_entry(URL,is_directory)
+                if new_entry is not None:
+                    new_entries.append(new_entry)
+        except:
+            File_Registry=self.document.documentElement
+            for new_entry in new_entries:
+                File_Registry.removeChild(new_entry)
+            self.Id_dictionary=Id_dictionary
+            self.Id_trie=None
+            raise
+        return new_entries
+
     def add_tree(self,root,**options):
         """ Adds a directory and all sub folders and sub directories, **options
-        provides a way to {'ignore','.pyc|etc'} or {'only','.png|.bmp'}"""
+        provides a way to {'ignore','.pyc|etc'} or {'only','.png|.bmp'}. The tree is
+        walked first and then added with add_entries, so if one entry fails none are
+        added, and the register is saved once at the end if the option save is True
+        and something was added"""
 
         # Deal with the optional parameters, these tend to make life easier
         default_options={'ignore':None,'only':None,'print_ignored_files':True,
-        'directories_only':False,'files_only':False}
-        tree_options=default_options
+        'directories_only':False,'files_only':False,'save':True}
+        tree_options={}
+        for option,value in default_options.iteritems():
+            tree_options[option]=value
         for option,value in options.iteritems():
             tree_options[option]=value
-        #print tree_options
+        def is_included(name):
+            if tree_options['ignore'] is not None and re.search(tree_options['ignore'],name):
+                if tree_options['print_ignored_files']:
+                    print "ignoring %s because it matches the ignore option"%name
+                return False
+            elif tree_options['only'] is not None and not re.search(tree_options['only'],name):
+                if tree_options['print_ignored_files']:
+                    print "ignoring %s because it does not match the only option"%name
+                return False
+            return True
         #condition the URL
         root_URL=condition_URL(root)
         path=URL_to_path(root_URL)
-        # now we add the files and directories that jive with the options
-        try:
-
-            for (home,directories,files) in os.walk(path):
-                #print (home,directories,files)
-                for directory in directories:# had to change this, used to be first element in list
-                    try:
-                        if tree_options['files_only']:
-                            if tree_options['print_ignored_files']:
-                                print "ignoring %s because it is not a file"%file
-                            raise
-                        if tree_options['ignore'] is not None and re.search(tree_options['ignore'],directory):
-                            if tree_options['print_ignored_files']:
-                                print "ignoring %s because it does not match the only option"%directory
-                            raise
-                        elif tree_options['only'] is not None and not re.search(tree_options['only'],directory):
-                            if tree_options['print_ignored_files']:
-                                print "ignoring %s because it does not match the only option"%directory
-                            raise
-                        else:
-                            self.add_entry(condition_URL(os.path.join(home,directory)))
-                            self.save()
-                    except:pass
-                for file in files: # had to change this 12/2012, used to be Second element in list
-                    try:
-                        if tree_options['directories_only']:
-                            if tree_options['print_ignored_files']:
-                                print "ignoring %s because it is not a directory"%file
-                            raise
-                        if tree_options['ignore'] is not None and re.search(tree_options['ignore'],file):
-                            if tree_options['print_ignored_files']:
-                                print "ignoring %s because it matches the ignore option"%file
-                            raise
-                        elif tree_options['only'] is not None and not re.search(tree_options['only'],file):
-                            if tree_options['print_ignored_files']:
-                                print "ignoring %s because it does not match the only option"%file
-                            raise
-                        else:
-                            #print (home,file)
-                            self.add_entry(condition_URL(os.path.join(home,file)))
-                            self.save()
-                    except:raise
-        except:
-            raise
-        #After all the files are added update the Id_dictionary
-        self.Id_dictionary=dict([(str(node.getAttribute('URL')),
-            str(node.getAttribute('Id'))) for node in
-            self.document.getElementsByTagName('File')])
+        # now we find the files and directories that jive with the options, os.walk
+        # already tells which are directories so nothing else is looked up on disk
+        new_URLs=[]
+        for (home,directories,files) in os.walk(path):
+            if not tree_options['files_only']:
+                for directory in directories:
+                    if is_included(directory):
+                        new_URLs.append((condition_URL(os.path.join(home,directory)),True))
+            if not tree_options['directories_only']:
+                for file in files:
+                    if is_included(file):
+                        new_URLs.append((condition_URL(os.path.join(home,file)),False))
+        new_entries=self.add_entries(new_URLs)
+        if tree_options['save'] and new_entries:
+            self.save()
+        return new_entries
 
     def remove_entry(self,URL=None,Id=None):
         """ Removes an entry in the current File Register """
@@ -972,6 +1496,144 @@ class FileRegister(XMLBase):
         self.Id_dictionary=dict([(str(node.getAttribute('URL')),
         str(node.getAttribute('Id'))) for node in \
         self.document.getElementsByTagName('File')])
+        self.Id_trie=None
+
+class MetadataIndex():
+    """ An inverted index of the File nodes of a Metadata document, kept up to date by
+    Metadata. Each file is indexed by the tokens of its name, its metadata tags and
+    their values, and every field (see get_file_node_fields) is kept sorted for range
+    searches. search, search_prefix and search_range return sets of URLs"""
+    def __init__(self,metadata=None):
+        # {token:set(URL)}
+        self.token_index={}
+        # {field:sorted [(value,URL)]}
+        self.field_index={}
+        # {URL:(tokens,{field:value})} so a file can be re-indexed
+        self.URL_entries={}
+        self.sorted_tokens=[]
+        self.sorted_tokens_current=True
+        if metadata is not None:
+            # a bulk build appends every (value,URL) and sorts each field once
+            for URL,file_node in metadata.node_dictionary.iteritems():
+                tokens,fields=self.get_entry(URL,file_node)
+                self.add_tokens(URL,tokens)
+                for field,value in fields.iteritems():
+                    self.field_index.setdefault(field,[]).append((value,URL))
+                self.URL_entries[URL]=(tokens,fields)
+            for values in self.field_index.itervalues():
+                values.sort()
+
+    def get_entry(self,URL,file_node):
+        """ Returns (tokens,{field:value}) indexed for a File node"""
+        fields={}
+        tokens=set(tokenize(os.path.split(URL)[1]))
+        for field,value in get_file_node_fields(file_node).iteritems():
+            fields[field]=index_value(value)
+            tag=field.split('.')[0]
+            tokens.update(tokenize(tag))
+            tokens.add(tag.lower())
+            if not field.startswith('File.'):
+                tokens.update(tokenize(value))
+        return tokens,fields
+
+    def add_tokens(self,URL,tokens):
+        """ Adds URL to the token_index entry of each token"""
+        for token in tokens:
+            if not self.token_index.has_key(token):
+                self.token_index[token]=set()
+                self.sorted_tokens_current=False
+            self.token_index[token].add(URL)
+
+    def add_file_node(self,URL,file_node):
+        """ Indexes a File node, replacing what was indexed for URL before"""
+        self.remove_URL(URL)
+        tokens,fields=self.get_entry(URL,file_node)
+        self.add_tokens(URL,tokens)
+        for field,value in fields.iteritems():
+            bisect.insort(self.field_index.setdefault(field,[]),(value,URL))
+        self.URL_entries[URL]=(tokens,fields)
+
+    def remove_URL(self,URL):
+        """ Removes a file from the index"""
+        if not self.URL_entries.has_key(URL):
+            return
+        tokens,fields=self.URL_entries.pop(URL)
+        for token in tokens:
+            self.token_index[token].discard(URL)
+            if not self.token_index[token]:
+                del self.token_index[token]
+                self.sorted_tokens_current=False
+        for field,value in fields.iteritems():
+            values=self.field_index[field]
+            position=bisect.bisect_left(values,(value,URL))
+            if position<len(values) and values[position]==(value,URL):
+                del values[position]
+
+    def search(self,text):
+        """ Returns the URLs of the files that have every token in text"""
+        URLs=None
+        for token in tokenize(text):
+            token_URLs=self.token_index.get(token,set())
+            if URLs is None:
+                URLs=set(token_URLs)
+            else:
+                URLs.intersection_update(token_URLs)
+        if URLs is None:
+            return set()
+        return URLs
+
+    def search_prefix(self,prefix):
+        """ Returns the URLs of the files that have a token starting with prefix"""
+        if not self.sorted_tokens_current:
+            self.sorted_tokens=sorted(self.token_index.keys())
+            self.sorted_tokens_current=True
+        prefix=prefix.lower()
+        URLs=set()
+        position=bisect.bisect_left(self.sorted_tokens,prefix)
+        while position<len(self.sorted_tokens) and self.sorted_tokens[position].startswith(prefix):
+            URLs.update(self.token_index[self.sorted_tokens[position]])
+            position+=1
+        return URLs
+
+    def search_range(self,field,low=None,high=None):
+        """ Returns the URLs of the files whose field is between low and high, inclusive,
+        for instance search_range('System_Metadata.size',low=1e6)"""
+        values=self.field_index.get(field,[])
+        if low is None:
+            start=0
+        else:
+            start=bisect.bisect_left(values,(index_value(low),))
+        URLs=set()
+        high=index_value(high) if high is not None else None
+        for value,URL in values[start:]:
+            if high is not None and value>high:
+                break
+            URLs.add(URL)
+        return URLs
+
+    def get_fields(self):
+        """ Returns the sorted list of indexed fields"""
+        return sorted(self.field_index.keys())
+
+    def save(self,path,modification_time=None):
+        """ Pickles the index to path, modification_time is that of the metadata file it
+        was built from"""
+        out_file=open(path,'wb')
+        pickle.dump({"modification_time":modification_time,"index":self},out_file,pickle.HIGHEST_PROTOCOL)
+        out_file.close()
+
+def load_metadata_index(path,modification_time=None):
+    """ Returns the MetadataIndex saved at path if it was saved for modification_time,
+    otherwise None"""
+    try:
+        in_file=open(path,'rb')
+        cache=pickle.load(in_file)
+        in_file.close()
+    except:
+        return None
+    if cache.get("modification_time")!=modification_time:
+        return None
+    return cache.get("index")
 
 class Metadata(XMLBase):
     """ Metadata holds the metadata tags for a FileRegistry, If it already exists
@@ -997,19 +1659,14 @@ class Metadata(XMLBase):
         FileRegistry=file_path
         Metadata_File=self.options['metadata_file']
         # Process the file register
-        if type(FileRegistry) is InstanceType:
+        if isinstance(FileRegistry,FileRegister) or type(FileRegistry) is InstanceType:
             self.FileRegister=FileRegistry
         elif type(FileRegistry) in StringTypes:
             self.FileRegister=FileRegister(FileRegistry)
         # Process or create the Metadata File
         if Metadata_File is None:
             # Make the metadata file based on the file register
-            FileRegister_path=self.FileRegister.path.replace('\\','/')
-            FileRegister_name=FileRegister_path.split('/')[-1]
-            FileRegister_ext=FileRegister_name.split('.')[-1]
-            Metadata_name=FileRegister_name.replace('.'+FileRegister_ext,
-            '_Metadata.'+FileRegister_ext)
-            self.path=FileRegister_path.replace(FileRegister_name,Metadata_name)
+            self.path=get_metadata_path(self.FileRegister.path)
             self.document=self.FileRegister.document
             # delete old processing instructions
             for node in self.document.childNodes:
@@ -1029,25 +1686,48 @@ class Metadata(XMLBase):
             self.document.insertBefore(new_node,self.document.documentElement)
         else:
             # The metadata file exists as a saved file or an instance
-            if type(Metadata_File) is InstanceType:
+            if isinstance(Metadata_File,XMLBase) or type(Metadata_File) is InstanceType:
                 self.document=Metadata_File.document
                 self.path=Metadata_File.path
             elif type(Metadata_File) in StringTypes:
-                XMLBase.__init__(self,file_path,**self.options)
+                XMLBase.__init__(self,Metadata_File,**self.options)
 
-        # TODO: This dictionary of nodes worries me-- it may not scale well
-        self.node_dictionary=dict([(str(node.getAttribute('URL')),
-            node) for node in
-            self.document.getElementsByTagName('File')])
+        # {URL:File node} and the current File node, looked up in the minidom document the first time they are used
+        self._node_dictionary=None
+        self._current_node=None
 
-        self.URL_dictionary=dict([(str(node.getAttribute('Id')),
-            str(node.getAttribute('URL'))) for node in
-            self.document.getElementsByTagName('File')])
+        self.URL_dictionary=dict([(str(Id),str(URL)) for Id,URL in self.get_attribute_rows('File',['Id','URL'])])
 
         self.name_dictionary=dict([(Id,os.path.split(self.URL_dictionary[Id])[1])
             for Id in self.URL_dictionary.keys()])
 
-        self.current_node=self.node_dictionary.values()[0]
+        # the MetadataIndex, made by the first search
+        self.index=None
+
+    def get_node_dictionary(self):
+        """Returns the {URL:File node} dictionary, built from the minidom document the first time it is used"""
+        if self._node_dictionary is None:
+            self._node_dictionary=dict([(str(node.getAttribute('URL')),
+                node) for node in
+                self.document.getElementsByTagName('File')])
+        return self._node_dictionary
+
+    def set_node_dictionary(self,node_dictionary):
+        """Sets the {URL:File node} dictionary"""
+        self._node_dictionary=node_dictionary
+
+    node_dictionary=property(lambda self:self.get_node_dictionary(),
+                             lambda self,node_dictionary:self.set_node_dictionary(node_dictionary))
+
+    def get_current_file_node(self):
+        """Returns the current File node, any File node of the document until one is chosen with
+        set_current_node"""
+        if self._current_node is None:
+            self._current_node=self.node_dictionary.values()[0]
+        return self._current_node
+
+    current_node=property(lambda self:self.get_current_file_node(),
+                          lambda self,current_node:setattr(self,'_current_node',current_node))
 
     def search_name(self,name=None,re_flags=re.IGNORECASE):
         """ Returns a list of URL's that have an element matching name"""
@@ -1069,9 +1749,8 @@ class Metadata(XMLBase):
             if XSLT is None:
                 # For some reason an absolute path tends to break here, maybe a spaces in file names problem
                 XSLT=self.options['style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
-            HTML=XSL_transform(etree.XML(self.document.toxml()))
+            XSL_transform=get_XSLT_transform(XSLT)
+            HTML=XSL_transform(self.get_etree())
             return HTML
 
     def get_file_node(self,URL=None,Id=None):
@@ -1124,8 +1803,7 @@ class Metadata(XMLBase):
             if XSLT is None:
                 # For some reason an absolute path tends to break here, maybe a spaces in file names problem
                 XSLT=self.options['style_sheet']
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
+            XSL_transform=get_XSLT_transform(XSLT)
             HTML=XSL_transform(etree.XML(self.current_node.toxml()))
             return HTML
 
@@ -1133,6 +1811,94 @@ class Metadata(XMLBase):
         """ Prints the current node """
         print self.current_node.toxml()
 
+    def get_index_path(self):
+        """ Returns the path the MetadataIndex is saved to, next to the metadata file"""
+        return os.path.splitext(self.path)[0]+'.'+METADATA_INDEX_EXTENSION
+
+    def get_index(self,rebuild=False):
+        """ Returns the MetadataIndex of the files, loading the saved index if it was
+        made from the metadata file as it is on disk, otherwise building it"""
+        if self.index is None or rebuild:
+            index=None
+            if not rebuild and os.path.isfile(self.path):
+                index=load_metadata_index(self.get_index_path(),os.path.getmtime(self.path))
+            if index is None:
+                index=MetadataIndex(self)
+            self.index=index
+        return self.index
+
+    def search(self,text=None,prefix=None,field=None,low=None,high=None):
+        """ Returns a sorted list of the URLs that match all of text (every token), prefix
+        (any token starting with it) and field between low and high"""
+        index=self.get_index()
+        URLs=None
+        for query,arguments in [(index.search,[text]),(index.search_prefix,[prefix]),
+                                (index.search_range,[field,low,high])]:
+            if arguments[0] is None:
+                continue
+            query_URLs=query(*arguments)
+            if URLs is None:
+                URLs=query_URLs
+            else:
+                URLs=URLs&query_URLs
+        if URLs is None:
+            return []
+        return sorted(URLs)
+
+    def save(self,path=None):
+        """ Saves the metadata file and its index if there is one"""
+        if path is None:
+            path=self.path
+        XMLBase.save(self,path)
+        if self.index is not None and path==self.path:
+            try:
+                self.index.save(self.get_index_path(),os.path.getmtime(self.path))
+            except (IOError,OSError):
+                pass
+
+    def add_file_node(self,file_node):
+        """ Adds a copy of a File node of the FileRegister, for a file registered after
+        the metadata file was made, and makes it the current node"""
+        new_node=self.document.importNode(file_node,True)
+        self.document.documentElement.appendChild(new_node)
+        URL=str(new_node.getAttribute('URL'))
+        Id=str(new_node.getAttribute('Id'))
+        self.node_dictionary[URL]=new_node
+        self.URL_dictionary[Id]=URL
+        self.name_dictionary[Id]=os.path.split(URL)[1]
+        self.current_node=new_node
+        if self.index is not None:
+            self.index.add_file_node(URL,new_node)
+
+    def get_system_metadata(self,URL):
+        """ Returns the attributes of the System_Metadata element of the file URL as a
+        dictionary, or None if there is not one"""
+        nodes=self.node_dictionary[condition_URL(URL)].getElementsByTagName('System_Metadata')
+        if not nodes:
+            return None
+        return dict([(str(name),str(value)) for name,value in nodes[0].attributes.items()])
+
+    def set_harvested_metadata(self,URL,metadata):
+        """ Replaces the metadata elements of the file URL with metadata, {tag:metadata}
+        as returned by harvest_metadata"""
+        self.get_file_node(URL)
+        for tag,value in metadata.iteritems():
+            self.remove_element_in_current_node(tag)
+            if tag=='System_Metadata':
+                self.add_element_to_current_node(XML_tag=tag,**value)
+            elif tag=='Python_Docstring':
+                self.add_element_to_current_node(XML_tag=tag,value=value)
+            else:
+                new_info_node=self.document.createElement(tag)
+                for key,key_value in value.iteritems():
+                    new_node=self.document.createElement(key)
+                    new_text=self.document.createTextNode(str(key_value).replace(chr(30),''))
+                    new_node.appendChild(new_text)
+                    new_info_node.appendChild(new_node)
+                self.add_element_to_current_node(node=new_info_node)
+        if self.index is not None:
+            self.index.add_file_node(condition_URL(URL),self.current_node)
+
 class InstrumentSheet(XMLBase):
     """ Class that handles the xml instrument sheet"""
     def __init__(self,file_path=None,**options): #instrument_name=None):
@@ -1154,26 +1920,38 @@ class InstrumentSheet(XMLBase):
 
 
         XMLBase.__init__(self,file_path,**self.options)
-        self.root=self.document.documentElement
-        # Now use the xml to declare some attributes
-        specific_description=self.document.getElementsByTagName('Specific_Information')
-        for information_node in specific_description:
-            if information_node.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
-                for node in information_node.childNodes:
-                    if node.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
-                        if node.childNodes:
-                            tag_name=node.tagName
-                            text_value=node.childNodes[0].data
-                            if not text_value in [None,'']:
-                                string='self.%s="%s"'%(tag_name.lower(),text_value)
-                                #print string
-                                exec('%s'%string)
-         #Commands
+        # Now use the xml to declare some attributes, with the lxml backend they are read from the lxml tree so
+        # that only editing the sheet builds a minidom document
         self.commands=[]
-        commands=self.document.getElementsByTagName('Commands')[0]
-        for command in commands.childNodes:
-            if command.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
-                self.commands.append(command.getAttribute('Command'))
+        if self.options["xml_backend"]=='lxml':
+            tree=self.get_etree()
+            for information_node in tree.iter('Specific_Information'):
+                for node in information_node.iterchildren(tag=etree.Element):
+                    text_value=node.text
+                    if not text_value in [None,'']:
+                        string='self.%s="%s"'%(node.tag.lower(),text_value)
+                        exec('%s'%string)
+            commands=list(tree.iter('Commands'))[0]
+            for command in commands.iterchildren(tag=etree.Element):
+                self.commands.append(command.get('Command',''))
+        else:
+            specific_description=self.document.getElementsByTagName('Specific_Information')
+            for information_node in specific_description:
+                if information_node.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
+                    for node in information_node.childNodes:
+                        if node.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
+                            if node.childNodes:
+                                tag_name=node.tagName
+                                text_value=node.childNodes[0].data
+                                if not text_value in [None,'']:
+                                    string='self.%s="%s"'%(tag_name.lower(),text_value)
+                                    #print string
+                                    exec('%s'%string)
+             #Commands
+            commands=self.document.getElementsByTagName('Commands')[0]
+            for command in commands.childNodes:
+                if command.nodeType is NODE_TYPE_DICTIONARY['ELEMENT_NODE']:
+                    self.commands.append(command.getAttribute('Command'))
         # Define Method Aliases if they are available
         if METHOD_ALIASES:
             #print 'True'
@@ -1184,6 +1962,9 @@ class InstrumentSheet(XMLBase):
         except:
             pass
 
+    # the root element of the minidom document
+    root=property(lambda self:self.document.documentElement)
+
     ##TODO: Add a edit entry method
     def add_entry(self,tag_name,text=None,description='Specific',**attribute_dictionary):
         """ Adds an entry to the instrument sheet."""
@@ -1219,8 +2000,7 @@ class InstrumentSheet(XMLBase):
         """Tries to return the image path, requires image to be in
         <Image href="http://132.163.53.152:8080/home_media/img/Fischione_1040.jpg"/> format"""
         # Take the first thing called Image
-        image_node=self.document.getElementsByTagName('Image')[0]
-        image_path=image_node.getAttribute('href')
+        image_path=self.get_attribute_rows('Image',['href'])[0][0]
         return image_path
 
 class InstrumentState(XMLBase):
@@ -1338,6 +2118,141 @@ def test_XMLModel(test_new=True,test_existing=False):
         print("The new_xml has been saved")
         new_xml.save()
 
+def test_lxml_backend(number_entries=100):
+    """Tests that opening, transforming and saving documents with the lxml backend does not build a minidom
+    document, and that the minidom document is the same as with the minidom backend"""
+    import tempfile
+    import shutil
+    directory=tempfile.mkdtemp()
+    try:
+        style_sheet=os.path.join(directory,'Test_Style.xsl')
+        out_file=open(style_sheet,'w')
+        out_file.write("""<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+<xsl:template match="/"><html><body><xsl:value-of select="count(//Entry)"/></body></html></xsl:template>
+</xsl:stylesheet>""")
+        out_file.close()
+        log_path=os.path.join(directory,'Log.xml')
+        out_file=open(log_path,'w')
+        out_file.write('<?xml version="1.0"?>\n<Log>\n')
+        for index in range(1,number_entries+1):
+            out_file.write('\t<Entry Date="2016-01-01" Index="%s">Entry number %s</Entry>\n'%(index,index))
+        out_file.write('</Log>\n')
+        out_file.close()
+        log=XMLLog(log_path,style_sheet=style_sheet,xml_backend='lxml')
+        assert '<body>%s</body>'%number_entries in log.to_HTML()
+        log.save(os.path.join(directory,'Saved_Log.xml'))
+        assert log._dom_document is None and log.max_Index==number_entries
+        minidom_log=XMLLog(log_path,xml_backend='minidom')
+        assert log.get_entry(10).toxml()==minidom_log.get_entry(10).toxml()
+        log.add_entry('A new entry')
+        assert log.max_Index==number_entries+1
+        register_path=os.path.join(directory,'Register.xml')
+        out_file=open(register_path,'w')
+        out_file.write('<File_Registry><File URL="file://c:/a.txt" Id="1.1.1.1.21"/></File_Registry>')
+        out_file.close()
+        register=FileRegister(register_path,xml_backend='lxml')
+        register.get_etree()
+        assert register._dom_document is None
+        assert register.Id_dictionary=={'file://c:/a.txt':'1.1.1.1.21'}
+        metadata=Metadata(None,metadata_file=register_path,xml_backend='lxml')
+        assert metadata._dom_document is None and metadata.URL_dictionary=={'1.1.1.1.21':'file://c:/a.txt'}
+        assert metadata.current_node.getAttribute('URL')=='file://c:/a.txt'
+        sheet_path=os.path.join(directory,'Instrument_Sheet.xml')
+        out_file=open(sheet_path,'w')
+        out_file.write('<Instrument_Sheet><Specific_Information><Name>Test</Name><Image href="test.jpg"/>'
+                       '</Specific_Information><Commands><Tuple Command="READ?"/><Tuple Command="*RST"/>'
+                       '</Commands></Instrument_Sheet>')
+        out_file.close()
+        sheets=[InstrumentSheet(sheet_path,xml_backend=xml_backend) for xml_backend in XML_BACKENDS]
+        print 'The instrument sheet commands are %s'%sheets[0].commands
+        assert sheets[XML_BACKENDS.index('lxml')]._dom_document is None
+        for sheet in sheets:
+            assert sheet.name=='Test' and sheet.image=='test.jpg' and sheet.commands==['READ?','*RST']
+        assert sheets[0].root.tagName=='Instrument_Sheet'
+    finally:
+        shutil.rmtree(directory)
+
+def test_streamed_XMLLog(number_entries=1000):
+    """Tests loading only the index of a log and then the whole log"""
+    import tempfile
+    directory=tempfile.mkdtemp()
+    path=os.path.join(directory,'Streamed_Log.xml')
+    out_file=open(path,'w')
+    out_file.write('<?xml version="1.0"?>\n<Log>\n')
+    for index in range(1,number_entries+1):
+        out_file.write('\t<Entry Date="2016-01-01" Index="%s">Entry number %s</Entry>\n'%(index,index))
+    # an entry whose last child is an empty element, an entry without content and an empty entry
+    out_file.write('\t<Entry Date="2016-01-01" Index="%s">Ends with an empty element<b/></Entry>\n'%
+                   (number_entries+1))
+    out_file.write('\t<Entry Date="2016-01-01" Index="%s"></Entry>\n'%(number_entries+2))
+    out_file.write('\t<Entry Date="2016-01-01" Index="%s"/>\n</Log>\n'%(number_entries+3))
+    out_file.close()
+    try:
+        log=XMLLog(path,load_entries=False,xml_backend='lxml')
+        print 'The log has %s entries, entry 10 is %s'%(len(log.Index_node_dictionary),
+                                                      log.get_entry(10).toxml())
+        assert log.get_entry(10).childNodes[0].data=='Entry number 10'
+        assert log.get_entry(number_entries+1).toxml()==\
+               '<Entry Date="2016-01-01" Index="%s">Ends with an empty element<b/></Entry>'%(number_entries+1)
+        assert not log.get_entry(number_entries+2).hasChildNodes()
+        assert log.get_entry(number_entries+3).getAttribute('Index')==str(number_entries+3)
+        log.add_entry('A new entry')
+        print 'After adding an entry the log has %s entries'%len(log.Index_node_dictionary)
+        assert len(log.Index_node_dictionary)==number_entries+4
+        register_path=os.path.join(directory,'Streamed_Register.xml')
+        out_file=open(register_path,'w')
+        out_file.write('<File_Registry><File URL="file://c:/a.txt" Id="1.1.1.1.21"/></File_Registry>')
+        out_file.close()
+        register=FileRegister(register_path,xml_backend='lxml')
+        print 'The streamed register Id_dictionary is %s'%register.Id_dictionary
+        assert register.Id_dictionary=={'file://c:/a.txt':'1.1.1.1.21'}
+    finally:
+        import shutil
+        shutil.rmtree(directory)
+
+def test_journal_XMLLog(number_entries=1000):
+    """Tests that adding entries and saving a journal log takes time proportional to the new entries"""
+    import tempfile
+    import shutil
+    import time
+    directory=tempfile.mkdtemp()
+    try:
+        path=os.path.join(directory,'Journal_Log.xml')
+        log=XMLLog(None,save_mode='journal')
+        log.path=path
+        log.add_description('A journal log')
+        start=time.time()
+        for index in range(number_entries):
+            log.add_entry('Entry %s'%index)
+            if index%100==0:
+                log.save()
+        log.save()
+        print 'Adding and saving %s entries took %s seconds'%(number_entries,time.time()-start)
+        # the first entry after the description has Index 0
+        assert log.max_Index==number_entries-1
+        log.remove_entry(number_entries-1)
+        log.add_entry('The last entry')
+        assert log.current_entry['Index']==str(number_entries-1)
+        log.save()
+        saved_log=XMLLog(path)
+        assert sorted(saved_log.Index_node_dictionary.keys())==sorted(log.Index_node_dictionary.keys())
+        assert saved_log.get_entry(number_entries-1).childNodes[0].data=='The last entry'
+        assert saved_log.get_entry(-1).childNodes[0].data=='A journal log'
+        # changing an entry that is already saved makes the next save write the whole log
+        end_of_day_path=os.path.join(directory,'Journal_End_Of_Day_Log.xml')
+        end_of_day_log=EndOfDayXMLLog(None,save_mode='journal')
+        end_of_day_log.path=end_of_day_path
+        end_of_day_log.add_entry('first')
+        end_of_day_log.save()
+        end_of_day_log.add_entry_information(Index=0,Why='because')
+        end_of_day_log.add_entry('later')
+        end_of_day_log.save()
+        saved_log=XMLLog(end_of_day_path)
+        assert saved_log.get_entry(0).getElementsByTagName('Why')[0].childNodes[0].data=='because'
+        assert saved_log.get_entry(1).childNodes[0].data=='later'
+    finally:
+        shutil.rmtree(directory)
+
 def test_XMLLog():
     print('Creating New Log..\n')
     os.chdir(TESTS_DIRECTORY)
@@ -1450,6 +2365,68 @@ def test_DataTable():
     new_table_3.get_header()
     print new_table_4
 
+def test_columnar_DataTable(number_rows=10000):
+    """Tests that a columnar table reads back the same data as a Tuple table"""
+    import tempfile
+    import shutil
+    import time
+    rows=[[index*.001,index,'point %s'%index,index%3==0] for index in range(number_rows)]
+    directory=tempfile.mkdtemp()
+    try:
+        for data_encoding in DATA_TABLE_ENCODINGS:
+            start=time.time()
+            table=DataTable(None,data_table=rows,data_encoding=data_encoding,directory=directory)
+            path=os.path.join(directory,'%s_table.xml'%data_encoding)
+            table.save(path)
+            saved_table=DataTable(path)
+            frequency=saved_table.to_array('X0')
+            labels=saved_table.to_list('X2')
+            print 'Writing and reading a %s table of %s rows took %s seconds, %s bytes'%(data_encoding,number_rows,
+                time.time()-start,os.path.getsize(path))
+            assert saved_table.get_attribute_names()==['X0','X1','X2','X3']
+            assert np.allclose(frequency,[row[0] for row in rows])
+            assert labels[7]=='point 7'
+            assert saved_table.to_tuple_list(['X1','X2'])[3]==('3','point 3')
+        delimited_table=DataTable(None,data_table=rows[:5],data_encoding='columnar',column_encoding='delimited')
+        print delimited_table
+        assert delimited_table.to_array('X1').tolist()==[0,1,2,3,4]
+        assert delimited_table.to_array('X3').tolist()==[True,False,False,True,False]
+        path=os.path.join(directory,'delimited_table.xml')
+        delimited_table.save(path)
+        assert DataTable(path).to_array('X3').tolist()==[True,False,False,True,False]
+    finally:
+        shutil.rmtree(directory)
+
+def test_XSLT_cache():
+    """Tests that a style sheet is compiled once and recompiled when it changes"""
+    import tempfile
+    import shutil
+    import time
+    directory=tempfile.mkdtemp()
+    try:
+        style_sheet=os.path.join(directory,'Test_Style.xsl')
+        template="""<xsl:stylesheet version="1.0" xmlns:xsl="http://www.w3.org/1999/XSL/Transform">
+<xsl:template match="/"><html><body>%s<xsl:value-of select="count(//Entry)"/></body></html></xsl:template>
+</xsl:stylesheet>"""
+        out_file=open(style_sheet,'w')
+        out_file.write(template%'Entries: ')
+        out_file.close()
+        log=XMLLog(None,style_sheet=style_sheet)
+        log.add_entry('An entry')
+        start=time.time()
+        for index in range(100):
+            HTML=log.to_HTML()
+        print 'Rendering 100 times took %s seconds: %s'%(time.time()-start,HTML.strip())
+        assert 'Entries: 1' in HTML
+        assert get_XSLT_transform(style_sheet) is get_XSLT_transform(style_sheet)
+        out_file=open(style_sheet,'w')
+        out_file.write(template%'Number of entries: ')
+        out_file.close()
+        os.utime(style_sheet,(time.time()+10,time.time()+10))
+        assert 'Number of entries: 1' in log.to_HTML()
+    finally:
+        shutil.rmtree(directory)
+
 def test_get_header():
     """ Test of the get header function of the DataTable Class """
     test_dictionary={'Data_Description':{'x':'X Distance in microns.',
@@ -1488,6 +2465,57 @@ def test_FileRegister():
     new_file_register.add_tree(os.getcwd())
     print new_file_register
 
+def test_FileRegister_add_tree(number_files=200):
+    """Tests adding a tree of number_files files and that a failed add_tree adds nothing"""
+    import tempfile
+    import shutil
+    import time
+    directory=tempfile.mkdtemp()
+    current_directory=os.getcwd()
+    try:
+        # condition_URL drops the leading / of absolute posix paths so the tree is added as .
+        os.chdir(directory)
+        for index in range(number_files):
+            sub_directory=os.path.join(directory,'Folder_%s'%(index%10))
+            if not os.path.isdir(sub_directory):
+                os.mkdir(sub_directory)
+            open(os.path.join(sub_directory,'File_%s.txt'%index),'w').close()
+        register=FileRegister(None,directory=directory)
+        start=time.time()
+        new_entries=register.add_tree('.',ignore='\.xml$',print_ignored_files=False)
+        print 'Adding %s files took %s seconds'%(len(new_entries),time.time()-start)
+        assert len(new_entries)==number_files+10
+        assert len(register.Id_dictionary)==number_files+10
+        assert len(set(register.Id_dictionary.values()))==number_files+10
+        # a tree that fails part of the way through leaves the register as it was
+        def failing_create_Id(URL,is_directory=None):
+            if URL.endswith('File_7.txt'):
+                raise IOError('Failed to create an Id')
+            return original_create_Id(URL,is_directory)
+        new_register=FileRegister(None,directory=directory)
+        original_create_Id=new_register.create_Id
+        new_register.create_Id=failing_create_Id
+        try:
+            new_register.add_tree('.',save=False,print_ignored_files=False)
+        except IOError:
+            pass
+        assert new_register.Id_dictionary=={}
+        assert new_register.document.getElementsByTagName('File')==[]
+    finally:
+        os.chdir(current_directory)
+        shutil.rmtree(directory)
+
+def test_FileIdTrie():
+    """Tests that new Ids reuse the nodes of registered directories and number new nodes after their siblings"""
+    trie=FileIdTrie({'file:./Data':'1.1.1.1.11.11','file:./Data/a.txt':'1.1.1.1.11.11.21',
+                     'file:./Data/b.txt':'1.1.1.1.11.11.22','file:./Code':'1.1.1.1.11.12'})
+    print trie.create_Id('1.1.1.1',['.','Data','c.txt'],'2')
+    assert trie.create_Id('1.1.1.1',['.','Data','c.txt'],'2')=='1.1.1.1.11.11.23'
+    assert trie.create_Id('1.1.1.1',['.','Notes','a.sys'],'3')=='1.1.1.1.11.13.31'
+    assert trie.create_Id('2.2.2.2',['.','Data'],'1')=='2.2.2.2.11.11'
+    trie.add('file:./Data/c.txt','1.1.1.1.11.11.23')
+    assert trie.create_Id('1.1.1.1',['.','Data','d.txt'],'2')=='1.1.1.1.11.11.24'
+
 def test_Metadata(File_Registry=None,Metadata_File=None):
     os.chdir(TESTS_DIRECTORY)
     if File_Registry is None:
@@ -1497,72 +2525,131 @@ def test_Metadata(File_Registry=None,Metadata_File=None):
     print new_Metadata.current_node_to_HTML()
     #new_Metadata.save()
 
-def metadata_robot(file_registry=None,metadata=None):
+def metadata_robot(file_registry=None,metadata=None,**options):
     """ This robot checks for system metadata for the files in file_register
     and adds them to metadata without repeats (first removes old data with the
-    same tagname). If no metadata file is given it just writes them to a file in
-     the same folder as file_register"""
+    same tagname). If no metadata file is given it uses the one in the same folder
+    as file_register, or makes it. Files whose size and modification time have not
+    changed since the last run are skipped (option incremental), the others are read
+    by number_workers threads and written to the metadata in one batch. Returns the
+    Metadata"""
+    defaults={"incremental":True,"number_workers":METADATA_ROBOT_WORKERS,"save":True}
+    robot_options={}
+    for key,value in defaults.iteritems():
+        robot_options[key]=value
+    for key,value in options.iteritems():
+        robot_options[key]=value
     if file_registry is None:
         os.chdir(TESTS_DIRECTORY)
         file_registry=r'Resource_Registry_20160518_001.xml'
-    file_register=FileRegister(file_registry)
-    if metadata is None:
-        metadata_file=Metadata(file_register,**{"metadata_file":metadata})
+    if isinstance(file_registry,FileRegister):
+        file_register=file_registry
     else:
-        metadata_file=Metadata(file_register,**{"metadata_file":metadata})
-
+        file_register=FileRegister(file_registry)
+    if metadata is None and os.path.isfile(get_metadata_path(file_register.path)):
+        metadata=get_metadata_path(file_register.path)
+    metadata_file=Metadata(file_register,**{"metadata_file":metadata})
+    # files registered since the metadata file was made
+    for file_node in file_register.document.getElementsByTagName('File'):
+        if not metadata_file.node_dictionary.has_key(str(file_node.getAttribute('URL'))):
+            metadata_file.add_file_node(file_node)
+    jobs=[]
     for URL in metadata_file.FileRegister.Id_dictionary.keys():
-        try:
-            system_metadata=get_system_metadata(URL_to_path(URL))
-            metadata_file.get_file_node(URL)
-            metadata_file.remove_element_in_current_node('System_Metadata')
-            metadata_file.add_element_to_current_node(XML_tag='System_Metadata',**system_metadata)
-        except:
-            print 'No system metadata for %s'%URL
-            pass
-        try:
-            file_metadata=get_file_metadata(URL_to_path(URL))
-
-
-            new_file_info_node=metadata_file.document.createElement('File_Metadata')
-            for key,value in file_metadata.iteritems():
-                new_node=metadata_file.document.createElement(key)
-                new_text=metadata_file.document.createTextNode(str(value))
-                new_node.appendChild(new_text)
-                new_file_info_node.appendChild(new_node)
-            metadata_file.remove_element_in_current_node('File_Metadata')
-            metadata_file.add_element_to_current_node(node=new_file_info_node)
-
-        except:
-            print 'no file data for %s'%URL
-            pass
-        try:
-            image_metadata=get_image_metadata(URL_to_path(URL))
-            if not image_metadata is None:
-                new_image_info_node=metadata_file.document.createElement('Image_Metadata')
-                for key,value in image_metadata.iteritems():
-                    new_node=metadata_file.document.createElement(key)
-                    print key,str(value)
-                    print str(value) in ['','&#30;',chr(30)]
-                    new_text=metadata_file.document.createTextNode(str(value).replace(chr(30),''))
-                    new_node.appendChild(new_text)
-                    new_image_info_node.appendChild(new_node)
-                metadata_file.remove_element_in_current_node('Image_Metadata')
-                metadata_file.add_element_to_current_node(node=new_image_info_node)
-                print ' Image data'
-        except:
-            print 'no image metadata for %s'%URL
-
-            pass
-        try:
-            python_metadata=get_python_metadata(URL_to_path(URL))
-            #print python_metadata
-            metadata_file.get_file_node(URL)
-            metadata_file.remove_element_in_current_node('Python_Docstring')
-            metadata_file.add_element_to_current_node(XML_tag='Python_Docstring',
-            value=str(python_metadata['Python_Docstring']))
-        except:pass
-    metadata_file.save()
+        if robot_options["incremental"]:
+            system_metadata=metadata_file.get_system_metadata(URL)
+        else:
+            system_metadata=None
+        jobs.append((URL,system_metadata))
+    pool=ThreadPool(max(1,robot_options["number_workers"]))
+    try:
+        results=pool.map(lambda job:harvest_metadata(URL_to_path(job[0]),job[1]),jobs)
+    finally:
+        pool.close()
+        pool.join()
+    number_harvested=0
+    for (URL,system_metadata),result in zip(jobs,results):
+        if result is None:
+            continue
+        metadata_file.set_harvested_metadata(URL,result)
+        number_harvested+=1
+    metadata_file.number_harvested=number_harvested
+    if robot_options["save"]:
+        metadata_file.save()
+    return metadata_file
+
+def test_metadata_robot(number_files=50):
+    """Tests that a second run of the metadata_robot only reads the files that changed"""
+    import tempfile
+    import shutil
+    import time
+    directory=tempfile.mkdtemp()
+    current_directory=os.getcwd()
+    try:
+        # condition_URL drops the leading / of absolute posix paths so the tree is added as .
+        os.chdir(directory)
+        os.mkdir('Data')
+        for index in range(number_files):
+            out_file=open(os.path.join('Data','File_%s.txt'%index),'w')
+            out_file.write('Some data')
+            out_file.close()
+        register=FileRegister(None,directory=directory)
+        register.add_tree('.',files_only=True,print_ignored_files=False)
+        start=time.time()
+        metadata=metadata_robot(register)
+        print 'The first run read %s files in %s seconds'%(metadata.number_harvested,time.time()-start)
+        assert metadata.number_harvested==number_files
+        out_file=open(os.path.join('Data','File_0.txt'),'a')
+        out_file.write(' and some more data')
+        out_file.close()
+        start=time.time()
+        metadata=metadata_robot(register)
+        print 'The second run read %s files in %s seconds'%(metadata.number_harvested,time.time()-start)
+        assert metadata.number_harvested==1
+        assert metadata.get_system_metadata('./Data/File_0.txt')['size']==str(len('Some data and some more data'))
+    finally:
+        os.chdir(current_directory)
+        shutil.rmtree(directory)
+
+def test_Metadata_search(number_files=1000):
+    """Tests searching the metadata index and reloading it from the saved pickle"""
+    import tempfile
+    import shutil
+    import time
+    directory=tempfile.mkdtemp()
+    current_directory=os.getcwd()
+    try:
+        os.chdir(directory)
+        os.mkdir('Data')
+        for index in range(number_files):
+            out_file=open(os.path.join('Data','Measurement_%s.txt'%index),'w')
+            out_file.write('x'*index)
+            out_file.close()
+        register=FileRegister(None,directory=directory)
+        register.add_tree('.',files_only=True,print_ignored_files=False)
+        metadata=metadata_robot(register,save=False)
+        start=time.time()
+        metadata.get_index()
+        metadata.save()
+        print 'Indexing %s files took %s seconds'%(number_files,time.time()-start)
+        start=time.time()
+        URLs=metadata.search('measurement 12')
+        print 'Searching took %s seconds and found %s'%(time.time()-start,URLs)
+        assert URLs==['file:./Data/Measurement_12.txt']
+        assert len(metadata.search(prefix='measure'))==number_files
+        assert len(metadata.search(field='System_Metadata.size',low=10,high=19))==10
+        assert metadata.search(text='measurement',field='System_Metadata.size',high=1)==\
+            ['file:./Data/Measurement_0.txt','file:./Data/Measurement_1.txt']
+        saved_metadata=Metadata(register,metadata_file=metadata.path)
+        start=time.time()
+        saved_index=saved_metadata.get_index()
+        print 'Loading the index took %s seconds'%(time.time()-start)
+        assert saved_index.search_range('System_Metadata.size',low=number_files-1)==\
+            set(['file:./Data/Measurement_%s.txt'%(number_files-1)])
+        saved_metadata.set_harvested_metadata('./Data/Measurement_3.txt',{'Python_Docstring':'A new docstring'})
+        assert saved_metadata.search('new docstring')==['file:./Data/Measurement_3.txt']
+    finally:
+        os.chdir(current_directory)
+        shutil.rmtree(directory)
 
 def test_InstrumentSheet():
     """ A test of the InstrumentSheet class"""
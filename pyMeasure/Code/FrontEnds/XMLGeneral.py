@@ -41,6 +41,13 @@ except:
     XSLT_CAPABLE=0
     pass
 
+# For compiling each style sheet once
+try:
+    from pyMeasure.Code.DataHandlers.XMLModels import get_XSLT_transform
+except:
+    print("The function get_XSLT_transform in pyMeasure.Code.DataHandlers.XMLModels was not found")
+    get_XSLT_transform=lambda XSLT:etree.XSLT(etree.parse(XSLT))
+    pass
 # For auto generation of common method aliases
 try:
     from pyMeasure.Code.Utils.Alias import *
@@ -77,10 +84,12 @@ class EtreeXML():
         self.info=[]
         self.root=self.document.getroot()
         self.processing_instructions=map(lambda x:str(x),self.get_processing_instructions())
-        # Try to load the XSL from the sheet itself
+        # Try to load the XSL from the sheet itself, xsl_path is the style sheet file if there is one
+        self.xsl_path=None
         for instruction in self.get_processing_instructions():
             try:
                 self.xsl=instruction.parseXSL()
+                self.xsl_path=self.get_XSL_path(instruction)
             except:
                 pass
         self.create_node_dictionary()
@@ -101,17 +110,32 @@ class EtreeXML():
                 output.append(preamble)
             preamble=preamble.getprevious()
         return output
+    def get_XSL_path(self,instruction):
+        """ Returns the path of the style sheet file of an xml-stylesheet processing instruction, relative
+        hrefs are relative to self.path. Returns None if it is not a file"""
+        href=instruction.get('href')
+        if not href:
+            return None
+        if not os.path.isabs(href):
+            href=os.path.join(os.path.dirname(self.path),href)
+        if os.path.isfile(href):
+            return href
+        return None
     def to_HTML(self,XSLT=None):
         """ Returns HTML string by applying a XSL to the XML document"""
         if XSLT is not None:
-            XSL_data=etree.parse(XSLT)
-            XSL_transform=etree.XSLT(XSL_data)
-            HTML=XSL_transform(etree.XML(self.document.toxml()))
+            XSL_transform=get_XSLT_transform(XSLT)
+            HTML=XSL_transform(self.document)
+            return HTML
         else:
             try:
-                XSL_data=self.xsl
-                XSL_transform=etree.XSLT(XSL_data)
-                HTML=XSL_transform(self.document)
+                # a style sheet file is compiled once for every document that uses it, one that is not a file
+                # is compiled the first time this document uses it
+                if self.xsl_path is not None:
+                    return get_XSLT_transform(self.xsl_path)(self.document)
+                if getattr(self,'xsl_transform',None) is None:
+                    self.xsl_transform=etree.XSLT(self.xsl)
+                HTML=self.xsl_transform(self.document)
                 return HTML
             except:
                 raise
@@ -158,6 +182,16 @@ def test_EtreeXML():
                 attribute_text=attribute_text+"%s = %s, "%(key,value)
             print attribute_text
     print("The path is %s"%new_xml.path)
+
+def test_EtreeXML_to_HTML():
+    """ Tests that documents with the same style sheet file share its compiled transform"""
+    os.chdir(TESTS_DIRECTORY)
+    first_xml=EtreeXML('SRS830_Lockin1.xml')
+    second_xml=EtreeXML('SRS830_Lockin1_2.xml')
+    print("The style sheet is %s"%first_xml.xsl_path)
+    assert os.path.samefile(first_xml.xsl_path,os.path.join(TESTS_DIRECTORY,'DEFAULT_INSTRUMENT_STYLE.xsl'))
+    assert get_XSLT_transform(first_xml.xsl_path) is get_XSLT_transform(second_xml.xsl_path)
+    assert str(first_xml.to_HTML())==str(etree.XSLT(first_xml.xsl)(first_xml.document))
     
 #-------------------------------------------------------------------------------
 # Module Runner
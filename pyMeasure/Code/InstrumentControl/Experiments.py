@@ -25,11 +25,20 @@ except:
 
 try:
     import pyMeasure.Code.InstrumentControl.Instruments
+    import pyMeasure.Code.InstrumentControl.Orchestration
+    import pyMeasure.Code.InstrumentControl.MeasurementSinks
+    import pyMeasure.Code.InstrumentControl.IOTrace
     import pyMeasure.Code.DataHandlers.XMLModels
 except:
     print "This module requires pyMeasure.Code to be on sys.path"
     raise
 
+try:
+    import numpy as np
+except:
+    print "This module requires numpy"
+    raise
+
 try: 
     from scipy import linspace,stats
 except:
@@ -42,7 +51,59 @@ except:
 PYMEASURE_ROOT=os.path.dirname(os.path.realpath(pyMeasure.__file__))
 KEITHLEY_INSTRUMENT_SHEET=os.path.join(PYMEASURE_ROOT,
 'Instruments','KEITHLEY6487_NSOM.xml').replace('\\','/')
+# The resistance in Ohms seen by a simulated Keithley
+SIMULATED_RESISTANCE=12000.1
+# A buffered sweep runs a linear voltage sweep in the Keithley and reads the buffer with one TRAC:DATA?,
+# {0} to {4} are start, stop, step, delay and number of points
+KEITHLEY_BUFFERED_SWEEP_COMMANDS=["CURR:RANG:AUTO ON","FORM:ELEM ALL","SOUR:VOLT:SWE:STAR {0}",
+                                  "SOUR:VOLT:SWE:STOP {1}","SOUR:VOLT:SWE:STEP {2}","SOUR:VOLT:SWE:DEL {3}",
+                                  "TRIG:COUN {4}","TRAC:CLE","TRAC:POIN {4}","TRAC:FEED SENS",
+                                  "TRAC:FEED:CONT NEXT","SOUR:VOLT:SWE:INIT","INIT"]
+# A buffered sweep is run in sweeps of at most KEITHLEY_BUFFERED_SWEEP_POINTS points, each one is read and given to
+# the sink before the next starts so a sweep that fails keeps the points that were read
+KEITHLEY_BUFFERED_SWEEP_POINTS=100
+# Readings the Keithley 6487 buffer holds and elements per reading with FORM:ELEM ALL (current,time,status,voltage)
+KEITHLEY_BUFFER_SIZE=3000
+KEITHLEY_READING_ELEMENTS=4
+
+#-------------------------------------------------------------------------------
+# Module Functions
 
+def simulated_keithley_read(resource,query):
+    """Scripted SimulatedVisa response to READ? for a Keithley measuring a resistor of
+    resource.options['resistance'] Ohms, in the 'currentA,time,status,voltage' format of FORM:ELEM ALL"""
+    voltage=float(resource.state.get('SOUR:VOLT',0))
+    current=voltage/resource.options.get('resistance',SIMULATED_RESISTANCE)
+    return '%+.6EA,%+.6E,%+.6E,%+.6E'%(current,time.time(),0,voltage)
+
+def simulated_keithley_trace(resource,query):
+    """Scripted SimulatedVisa response to TRAC:DATA? after a buffered sweep, the readings of every point of
+    the SOUR:VOLT:SWE settings joined with commas"""
+    start=float(resource.state.get('SOUR:VOLT:SWE:STAR',0))
+    step=float(resource.state.get('SOUR:VOLT:SWE:STEP',1))
+    number_points=int(resource.state.get('TRAC:POIN',1))
+    readings=[]
+    for index in range(number_points):
+        resource.state['SOUR:VOLT']=start+index*step
+        readings.append(simulated_keithley_read(resource,'READ?'))
+    return ','.join(readings)
+
+def linear_sweep_parameters(voltage_list,relative_tolerance=1e-6):
+    """Returns (start,stop,step) if voltage_list is evenly spaced with at least two points, otherwise None"""
+    if len(voltage_list)<2:
+        return None
+    voltages=np.array(voltage_list,dtype=float)
+    steps=np.diff(voltages)
+    step=steps[0]
+    if step==0 or not np.allclose(steps,step,rtol=relative_tolerance,atol=abs(step)*relative_tolerance):
+        return None
+    return voltages[0],voltages[-1],step
+
+def parse_buffered_readings(response,elements=KEITHLEY_READING_ELEMENTS):
+    """Parses a comma separated buffer of readings, each of elements values, into an array with one row per
+    reading. Units such as the A of the current are stripped"""
+    values=[value.strip().rstrip('AVs') for value in response.strip().split(',') if value.strip()]
+    return np.array(values,dtype=float).reshape(-1,elements)
 
 #-------------------------------------------------------------------------------
 # Module Classes
@@ -51,10 +112,31 @@ class KeithleyIV():
     """ This class is for an experiment consisting of the Keithley piccoammeter 
     taking a two point measurement using its internal voltage source written 02/2011"""
     
-    def __init__(self):
-        """ Intializes the KeithleyIV experiment class"""
+    def __init__(self,**options):
+        """ Intializes the KeithleyIV experiment class, the options are resource_name, backend ('visa' or
+        'simulated', see Instruments.VISA_BACKEND), the latency and resistance of a simulated Keithley,
+        buffered_sweep (True, False or None to use <Buffered_Sweep> in the instrument sheet) and
+        buffered_sweep_points (the points of each sweep in the Keithley buffer)"""
+        defaults={"resource_name":'Keithley',
+                  "backend":pyMeasure.Code.InstrumentControl.Instruments.VISA_BACKEND,
+                  "latency":0.,
+                  "resistance":SIMULATED_RESISTANCE,
+                  "buffered_sweep":None,
+                  "buffered_sweep_points":KEITHLEY_BUFFERED_SWEEP_POINTS}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        if self.options["backend"]=='simulated':
+            resource_options={"latency":self.options["latency"],"resistance":self.options["resistance"],
+                              "responses":{'READ?':simulated_keithley_read,
+                                           'TRAC:DATA?':simulated_keithley_trace,'*OPC?':'1'}}
+        else:
+            resource_options={}
         try:
-            self.instrument=pyMeasure.Code.BackEnds.Instruments.VisaInstrument('Keithley')
+            self.instrument=pyMeasure.Code.InstrumentControl.Instruments.VisaInstrument(
+                self.options["resource_name"],backend=self.options["backend"],**resource_options)
         except:
             print 'Entering Fake Mode'
             pass
@@ -62,7 +144,25 @@ class KeithleyIV():
         self.name=''
         self.data_list=[]
         self.data_dictionary={}
+        self.sink=None
         pass
+    def open_sink(self,file_path=None,**options):
+        """Opens an AsciiMeasurementSink that take_IV appends every point to as it is measured, options are
+        passed to AsciiMeasurementSink. Returns the sink, sink.get_view() is a live view for plotting"""
+        self.sink=pyMeasure.Code.InstrumentControl.MeasurementSinks.AsciiMeasurementSink(file_path,
+                                                                      ['Index','Voltage','Current'],**options)
+        return self.sink
+    def close_sink(self):
+        """Closes the sink opened by open_sink"""
+        if self.sink is not None:
+            self.sink.close()
+            self.sink=None
+    def close(self):
+        """Closes the sink and gives the Keithley's session back to the instrument session pool"""
+        self.close_sink()
+        if getattr(self,'instrument',None) is not None:
+            self.instrument.close()
+            self.instrument=None
     def intialize_keithley(self):
         """Sends intialization string to Keithley picoammeter"""
         try:
@@ -116,21 +216,83 @@ class KeithleyIV():
             except:
                 raise
                 print "make_voltage_list failed"    
+    def supports_buffered_sweep(self):
+        """Returns True if the buffered_sweep option, or if it is None the instrument sheet, allows a
+        buffered sweep"""
+        if self.options["buffered_sweep"] is not None:
+            return bool(self.options["buffered_sweep"])
+        true_strings=pyMeasure.Code.InstrumentControl.Instruments.TRUE_STRINGS
+        return str(getattr(self.instrument,'buffered_sweep','False')).lower() in true_strings
+
     def take_IV(self,voltage_list,auto_range=True,settle_time=.02):
-        """ Method for taking an IV"""
+        """ Method for taking an IV. If the Keithley supports buffered sweeps and voltage_list is evenly spaced
+        the sweep runs in the instrument, otherwise it is taken point by point"""
+        if auto_range and self.supports_buffered_sweep() and len(voltage_list)<=KEITHLEY_BUFFER_SIZE:
+            sweep_parameters=linear_sweep_parameters(voltage_list)
+            if sweep_parameters is not None:
+                return self.take_buffered_IV(voltage_list,settle_time)
         self.data_list=[]
         if auto_range:
             for index,v in enumerate(voltage_list):
                 self.write_voltage(v)
                 
-                time.sleep(settle_time)
+                with pyMeasure.Code.InstrumentControl.IOTrace.trace_step('KeithleyIV','settle'):
+                    time.sleep(settle_time)
                 self.current_reading=self.instrument.ask('READ?') 
-                current=self.current_reading.split(',')[0]
-                current=current.replace('A','')   
-                self.data_list.append({'Index':index,
-                'Voltage':self.current_reading.split(',')[-1],
-                'Current':current})
+                with pyMeasure.Code.InstrumentControl.IOTrace.trace_step('KeithleyIV','parse'):
+                    self.data_list.append(self.parse_reading(index,self.current_reading))
+                if self.sink is not None:
+                    self.sink.add_point(self.data_list[-1])
                 self.instrument.write("CURR:RANG:AUTO ON")
+
+    def take_buffered_IV(self,voltage_list,settle_time=.02):
+        """Takes an IV of the evenly spaced voltage_list as sweeps in the Keithley of at most the
+        buffered_sweep_points option points. The readings of each sweep are fetched with one TRAC:DATA? and
+        added to self.data_list and the sink before the next sweep starts, so if the IV fails the points
+        already read are kept, like a point by point IV. The readings are kept as the arrays
+        self.voltage_array and self.current_array"""
+        start,stop,step=linear_sweep_parameters(voltage_list)
+        self.data_list=[]
+        voltage_arrays=[]
+        current_arrays=[]
+        sweep_points=max(int(self.options["buffered_sweep_points"]),1)
+        for sweep_start in range(0,len(voltage_list),sweep_points):
+            sweep_voltages=voltage_list[sweep_start:sweep_start+sweep_points]
+            for command in KEITHLEY_BUFFERED_SWEEP_COMMANDS:
+                self.instrument.write(command.format(sweep_voltages[0],sweep_voltages[-1],step,settle_time,
+                                                     len(sweep_voltages)))
+            # wait for the sweep to finish before reading the buffer
+            self.instrument.ask('*OPC?')
+            response=self.instrument.ask('TRAC:DATA?')
+            with pyMeasure.Code.InstrumentControl.IOTrace.trace_step('KeithleyIV','parse'):
+                readings=parse_buffered_readings(response)
+            current_arrays.append(readings[:,0])
+            voltage_arrays.append(readings[:,-1])
+            sweep_data=[{'Index':sweep_start+index,'Voltage':repr(voltage),'Current':repr(current)}
+                        for index,(voltage,current) in enumerate(zip(voltage_arrays[-1].tolist(),
+                                                                     current_arrays[-1].tolist()))]
+            self.data_list.extend(sweep_data)
+            if self.sink is not None:
+                self.sink.add_points(sweep_data)
+        self.current_array=np.concatenate(current_arrays)
+        self.voltage_array=np.concatenate(voltage_arrays)
+
+    def parse_reading(self,index,reading):
+        """Returns the data dictionary for the reading of point index, a 'current,...,voltage' string"""
+        current=reading.split(',')[0]
+        current=current.replace('A','')
+        return {'Index':index,'Voltage':reading.split(',')[-1],'Current':current}
+
+    def IV_pipeline(self,voltage_list,settle_time=.02):
+        """Returns take_IV as a list of Orchestration steps, so the IV can run on an Orchestrator at the same
+        time as other instruments. Pass the results to set_pipeline_results"""
+        return pyMeasure.Code.InstrumentControl.Orchestration.sweep_pipeline("SOUR:VOLT",voltage_list,'READ?',
+                                                                           settle_time,["CURR:RANG:AUTO ON"])
+
+    def set_pipeline_results(self,steps,results):
+        """Sets self.data_list from the results of the steps returned by IV_pipeline"""
+        readings=pyMeasure.Code.InstrumentControl.Orchestration.pipeline_answers(steps,results)
+        self.data_list=[self.parse_reading(index,reading) for index,reading in enumerate(readings)]
     def save_data(self):
         """ Saves the data in xml format"""
 ##        self.current_state=pyMeasure.Code.DataHandlers.States.InstruemntState(**self.instrument.get_state())
@@ -143,8 +305,9 @@ class KeithleyIV():
         'Date':datetime.datetime.utcnow().isoformat(),
         'Notes':self.notes,'Name':self.name,'Resistance':str(self.resistance)}
         self.data_dictionary['Data']=self.data_list
-        self.measurement_data=pyMeasure.Code.DataHandlers.XMLModels.DataTable(**self.data_dictionary)
-        self.measurement_data.save()   
+        with pyMeasure.Code.InstrumentControl.IOTrace.trace_step('KeithleyIV','save'):
+            self.measurement_data=pyMeasure.Code.DataHandlers.XMLModels.DataTable(**self.data_dictionary)
+            self.measurement_data.save()
         
     def plot_data(self):
         voltage_list=[]
@@ -187,6 +350,97 @@ def test_KeithleyIV():
     experiment.notes='This is fake Data'
     #experiment.save_data()
     experiment.plot_data()
+def test_simulated_KeithleyIV(number_points=20,latency=.001):
+    """ Tests and times an IV on a simulated Keithley"""
+    experiment=KeithleyIV(backend='simulated',latency=latency)
+    experiment.intialize_keithley()
+    voltage_list=experiment.make_voltage_list(-1,1,number_points)
+    start=time.time()
+    experiment.take_IV(voltage_list,settle_time=0)
+    elapsed=time.time()-start
+    print 'An IV of %s points took %s seconds, %s seconds per point'%(number_points,elapsed,
+                                                                   elapsed/number_points)
+    experiment.calculate_resistance()
+    print 'The resistance is %s Ohms'%experiment.resistance
+    assert abs(experiment.resistance-SIMULATED_RESISTANCE)<1e-3*SIMULATED_RESISTANCE
+    experiment.close()
+
+def test_traced_KeithleyIV(number_points=10,latency=.001):
+    """ Prints where the time of a simulated IV goes"""
+    tracer=pyMeasure.Code.InstrumentControl.IOTrace.enable_tracing()
+    try:
+        experiment=KeithleyIV(backend='simulated',latency=latency,buffered_sweep=False)
+        experiment.take_IV(experiment.make_voltage_list(-1,1,number_points),settle_time=.001)
+        print tracer.report()
+        experiment.close()
+    finally:
+        pyMeasure.Code.InstrumentControl.IOTrace.disable_tracing()
+
+def test_KeithleyIV_sink(number_points=10):
+    """ Tests streaming a simulated IV to a measurement sink"""
+    import tempfile
+    import shutil
+    directory=tempfile.mkdtemp()
+    try:
+        experiment=KeithleyIV(backend='simulated',buffered_sweep=False)
+        sink=experiment.open_sink(os.path.join(directory,'IV.txt'),checkpoint_points=1)
+        view=sink.get_view()
+        experiment.take_IV(experiment.make_voltage_list(-1,1,number_points),settle_time=0)
+        view.update()
+        print 'The sink has %s points before it is closed'%len(view)
+        assert len(view)==number_points
+        experiment.close()
+    finally:
+        shutil.rmtree(directory)
+
+def test_buffered_KeithleyIV(number_points=20,latency=.001):
+    """ Compares a buffered IV to a point by point IV on a simulated Keithley"""
+    experiment=KeithleyIV(backend='simulated',latency=latency,buffered_sweep=True)
+    voltage_list=experiment.make_voltage_list(-1,1,number_points)
+    start=time.time()
+    experiment.take_IV(voltage_list,settle_time=0)
+    elapsed=time.time()-start
+    print 'A buffered IV of %s points took %s seconds'%(number_points,elapsed)
+    experiment.calculate_resistance()
+    print 'The resistance is %s Ohms'%experiment.resistance
+    assert len(experiment.data_list)==number_points
+    assert np.allclose(experiment.voltage_array,voltage_list)
+    assert abs(experiment.resistance-SIMULATED_RESISTANCE)<1e-3*SIMULATED_RESISTANCE
+    # a bowtie is not evenly spaced so it falls back to point by point
+    bowtie_list=experiment.make_voltage_list(-1,1,5,True)
+    experiment.take_IV(bowtie_list,settle_time=0)
+    assert len(experiment.data_list)==len(bowtie_list)
+    experiment.close()
+
+def test_failed_buffered_KeithleyIV(number_points=25,buffered_sweep_points=10):
+    """ Tests that a buffered IV that fails keeps the sweeps it read in the sink"""
+    import tempfile
+    import shutil
+    directory=tempfile.mkdtemp()
+    experiment=KeithleyIV(backend='simulated',buffered_sweep=True,buffered_sweep_points=buffered_sweep_points)
+    responses=experiment.instrument.resource.responses
+    number_reads=[0]
+    def failing_trace(resource,query):
+        number_reads[0]+=1
+        if number_reads[0]>1:
+            raise IOError("The simulated Keithley stopped answering")
+        return simulated_keithley_trace(resource,query)
+    responses['TRAC:DATA?']=failing_trace
+    try:
+        sink=experiment.open_sink(os.path.join(directory,'IV.txt'))
+        try:
+            experiment.take_IV(experiment.make_voltage_list(-1,1,number_points),settle_time=0)
+            assert False, "The IV should have failed"
+        except IOError:
+            pass
+        view=sink.get_view()
+        print 'The sink has %s points after the failed IV'%len(view)
+        assert len(view)==buffered_sweep_points
+        assert len(experiment.data_list)==buffered_sweep_points
+    finally:
+        responses['TRAC:DATA?']=simulated_keithley_trace
+        experiment.close()
+        shutil.rmtree(directory)
 #-------------------------------------------------------------------------------
 # Module Runner
 
@@ -0,0 +1,196 @@
+#-----------------------------------------------------------------------------
+# Name:        IOTrace.py
+# Purpose:     To measure where the time of a measurement goes
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" IOTrace is an opt-in record of instrument I/O and experiment steps. With tracing on, VisaInstrument.write and
+ask, and the settle, parse and save steps of the Experiments, are timed. Each is counted by (instrument,
+operation, command header) with its bytes and a histogram of its latency. Tracing is off unless enable_tracing is
+called, and then it costs one time.time() pair per call. After a run, IOTracer.report prints per instrument
+throughput, to_AsciiDataTable returns the statistics as a table, and add_to_XMLLog writes the report as a log
+entry, for example
+
+    tracer=enable_tracing()
+    experiment.take_IV(voltage_list)
+    print(tracer.report())
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import time
+import math
+import threading
+import contextlib
+import xml.sax.saxutils
+#-----------------------------------------------------------------------------
+# Third Party Imports
+
+#-----------------------------------------------------------------------------
+# Module Constants
+# Latency histogram bin edges in seconds, LATENCY_BINS_PER_DECADE log spaced bins per decade from 1 us to 100 s
+LATENCY_BINS_PER_DECADE=4
+LATENCY_BIN_EDGES=[10**(-6+index/float(LATENCY_BINS_PER_DECADE)) for index in range(8*LATENCY_BINS_PER_DECADE+1)]
+TRACE_COLUMN_NAMES=["Instrument","Operation","Command","Count","Total_Time","Mean_Time","Min_Time","Max_Time",
+                    "Bytes_Sent","Bytes_Received"]
+# The tracer that is recording, None when tracing is off
+IO_TRACER=None
+#-----------------------------------------------------------------------------
+# Module Functions
+def enable_tracing(tracer=None):
+    """Turns tracing on with tracer, or a new IOTracer, and returns it"""
+    global IO_TRACER
+    if tracer is None:
+        tracer=IOTracer()
+    IO_TRACER=tracer
+    return tracer
+
+def disable_tracing():
+    """Turns tracing off and returns the tracer that was recording"""
+    global IO_TRACER
+    tracer=IO_TRACER
+    IO_TRACER=None
+    return tracer
+
+def get_tracer():
+    """Returns the tracer that is recording or None"""
+    return IO_TRACER
+
+def command_header(command):
+    """Returns the part of a command before its arguments, so all the writes of a sweep are counted together"""
+    command=str(command).strip()
+    if not command:
+        return command
+    return command.split(None,1)[0]
+
+def latency_bin(latency):
+    """Returns the index of the LATENCY_BIN_EDGES bin of latency, values outside are put in the end bins"""
+    if latency<=LATENCY_BIN_EDGES[0]:
+        return 0
+    index=int(math.floor((math.log10(latency)+6)*LATENCY_BINS_PER_DECADE))
+    return min(index,len(LATENCY_BIN_EDGES)-2)
+
+@contextlib.contextmanager
+def trace_step(instrument,operation,command='',bytes_sent=0):
+    """Times the body of a with statement as operation on instrument if tracing is on"""
+    tracer=IO_TRACER
+    if tracer is None:
+        yield
+        return
+    start=time.time()
+    try:
+        yield
+    finally:
+        tracer.record(instrument,operation,command,time.time()-start,bytes_sent=bytes_sent)
+#-----------------------------------------------------------------------------
+# Module Classes
+class IOTracer():
+    """Counts, times and histograms instrument operations by (instrument,operation,command header)"""
+    def __init__(self):
+        self.statistics={}
+        self.lock=threading.Lock()
+        self.start_time=time.time()
+
+    def record(self,instrument,operation,command,latency,bytes_sent=0,bytes_received=0):
+        """Records one operation that took latency seconds"""
+        key=(str(instrument),str(operation),command_header(command))
+        with self.lock:
+            statistic=self.statistics.get(key)
+            if statistic is None:
+                statistic={"Count":0,"Total_Time":0.,"Min_Time":latency,"Max_Time":latency,"Bytes_Sent":0,
+                           "Bytes_Received":0,"Histogram":[0]*(len(LATENCY_BIN_EDGES)-1)}
+                self.statistics[key]=statistic
+            statistic["Count"]+=1
+            statistic["Total_Time"]+=latency
+            statistic["Min_Time"]=min(statistic["Min_Time"],latency)
+            statistic["Max_Time"]=max(statistic["Max_Time"],latency)
+            statistic["Bytes_Sent"]+=bytes_sent
+            statistic["Bytes_Received"]+=bytes_received
+            statistic["Histogram"][latency_bin(latency)]+=1
+
+    def get_rows(self):
+        """Returns the statistics as rows in the order of TRACE_COLUMN_NAMES"""
+        rows=[]
+        with self.lock:
+            for key in sorted(self.statistics.keys()):
+                statistic=self.statistics[key]
+                rows.append(list(key)+[statistic["Count"],statistic["Total_Time"],
+                                       statistic["Total_Time"]/statistic["Count"],statistic["Min_Time"],
+                                       statistic["Max_Time"],statistic["Bytes_Sent"],statistic["Bytes_Received"]])
+        return rows
+
+    def get_histogram(self,instrument=None,operation=None):
+        """Returns [(bin start,bin stop,count)] of the latencies of the matching operations"""
+        counts=[0]*(len(LATENCY_BIN_EDGES)-1)
+        with self.lock:
+            for key,statistic in self.statistics.iteritems():
+                if instrument is not None and key[0]!=str(instrument):
+                    continue
+                if operation is not None and key[1]!=str(operation):
+                    continue
+                counts=[count+new_count for count,new_count in zip(counts,statistic["Histogram"])]
+        return [(LATENCY_BIN_EDGES[index],LATENCY_BIN_EDGES[index+1],count) for index,count in enumerate(counts)
+                if count]
+
+    def report(self):
+        """Returns a per instrument report of the time, calls and throughput of each operation"""
+        elapsed=time.time()-self.start_time
+        lines=["I/O trace of {0:.3f} seconds".format(elapsed)]
+        instruments={}
+        for row in self.get_rows():
+            instruments.setdefault(row[0],[]).append(row)
+        for instrument in sorted(instruments.keys()):
+            rows=instruments[instrument]
+            total_time=sum([row[4] for row in rows])
+            total_count=sum([row[3] for row in rows])
+            total_bytes=sum([row[8]+row[9] for row in rows])
+            lines.append("{0}: {1} calls in {2:.4f} s, {3:.1f} calls/s, {4} bytes".format(
+                instrument,total_count,total_time,total_count/max(total_time,1e-12),total_bytes))
+            for row in sorted(rows,key=lambda row:-row[4]):
+                lines.append("    {1:<8} {2:<24} {3:>8} calls {4:>10.4f} s total {5:>10.6f} s mean "
+                             "{7:>10.6f} s max".format(*row))
+        return "\n".join(lines)
+
+    def to_AsciiDataTable(self,**options):
+        """Returns the statistics as an AsciiDataTable, options are passed to AsciiDataTable"""
+        from pyMeasure.Code.DataHandlers.GeneralModels import AsciiDataTable
+        table_options={"column_names":TRACE_COLUMN_NAMES,"data":self.get_rows(),"data_delimiter":',',
+                       "column_names_delimiter":',',"header":["I/O trace"],"comment_begin":'#',
+                       "comment_end":'\n',"specific_descriptor":'IO',"general_descriptor":'Trace'}
+        table_options.update(options)
+        return AsciiDataTable(None,**table_options)
+
+    def add_to_XMLLog(self,log):
+        """Adds the report as an entry of the XMLLog log"""
+        log.add_entry(xml.sax.saxutils.escape(self.report()))
+
+    def clear(self):
+        """Forgets everything recorded"""
+        with self.lock:
+            self.statistics={}
+            self.start_time=time.time()
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_IOTracer():
+    """Tests tracing steps and the report"""
+    tracer=enable_tracing()
+    try:
+        for index in range(5):
+            with trace_step('Fake','write','SOUR:VOLT {0}'.format(index),bytes_sent=12):
+                time.sleep(.001)
+        with trace_step('Fake','settle'):
+            time.sleep(.01)
+        print(tracer.report())
+        print(tracer.get_histogram('Fake','write'))
+        rows=tracer.get_rows()
+        assert rows[1][:4]==['Fake','write','SOUR:VOLT',5]
+        assert rows[1][8]==60
+        print(tracer.to_AsciiDataTable())
+    finally:
+        disable_tracing()
+    assert get_tracer() is None
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_IOTracer()
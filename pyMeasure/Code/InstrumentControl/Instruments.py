@@ -15,6 +15,8 @@ import re
 from types import *
 from ctypes import *
 import datetime,time
+import collections
+import threading
 
 
 #-------------------------------------------------------------------------------
@@ -27,10 +29,12 @@ except:
     PIL_AVAILABLE=0
 try:
     import visa
+    VISA_AVAILABLE=1
 except:
     print "To control comm and gpib instruments this module requires the package PyVisa"
     print " Please download it at  http://pyvisa.sourceforge.net/ "
     print " Or add it to the Python Path"
+    VISA_AVAILABLE=0
     pass 
 try:
     #raise
@@ -46,6 +50,9 @@ except:
     print "Can't Find MySelf"
     pass
 
+import pyMeasure.Code.DataHandlers.InstrumentRegistry as InstrumentRegistry
+import pyMeasure.Code.InstrumentControl.SimulatedVisa as SimulatedVisa
+import pyMeasure.Code.InstrumentControl.IOTrace as IOTrace
 try:
     from pyMeasure.Code.Utils.Alias import *
     METHOD_ALIASES=1
@@ -60,6 +67,26 @@ INSTRUMENT_TYPES=['GPIB','COMM','OCEAN_OPTICS','MIGHTEX','LABJACK']
 INSTRUMENTS_DEFINED=[]
 #TODO Make PYMEASURE_ROOT be read from the settings folder
 PYMEASURE_ROOT=r'C:\Users\sandersa\PyCharm Projects\pyMeasure'
+# State queries are joined with STATE_QUERY_SEPARATOR into messages of at most STATE_QUERY_BATCH_SIZE queries
+# for instruments whose sheet has <Batch_State_Queries>True</Batch_State_Queries> in Specific_Information,
+# <State_Query_Batch_Size> and <State_Query_Separator> in the sheet override the batch size and separator.
+# The : of ';:' makes every SCPI header after the first absolute, after a bare ; a header is relative to the
+# subsystem of the command before it. Instruments that are not SCPI can use ; in their sheet
+STATE_QUERY_SEPARATOR=';:'
+# The answers to joined queries are separated by STATE_RESPONSE_SEPARATOR
+STATE_RESPONSE_SEPARATOR=';'
+STATE_QUERY_BATCH_SIZE=20
+TRUE_STRINGS=['true','yes','1','on']
+# The instrument layer, 'visa' for real instruments or 'simulated' for SimulatedVisa
+VISA_BACKENDS=['visa','simulated']
+VISA_BACKEND=os.environ.get('PYMEASURE_VISA_BACKEND','visa')
+# {backend:resource manager}, one resource manager is shared by all the instruments of a backend
+RESOURCE_MANAGERS={}
+# Sessions nobody is using are closed after SESSION_IDLE_TIMEOUT seconds, a session that has been idle for
+# more than SESSION_HEALTH_CHECK_INTERVAL seconds is checked with SESSION_HEALTH_CHECK_QUERY before it is reused
+SESSION_IDLE_TIMEOUT=300.
+SESSION_HEALTH_CHECK_INTERVAL=30.
+SESSION_HEALTH_CHECK_QUERY='*IDN?'
 
 #-------------------------------------------------------------------------------
 # Module Functions
@@ -68,30 +95,9 @@ PYMEASURE_ROOT=r'C:\Users\sandersa\PyCharm Projects\pyMeasure'
 
 def determine_instrument_type_from_string(string):
     """ Given a string returns the instrument type"""
+    return InstrumentRegistry.determine_instrument_type_from_string(string,
+                                                                    os.path.join(PYMEASURE_ROOT,'Instruments'))
 
-    if type(string) in StringTypes:
-         # Start with the easy ones
-         for instrument_type in INSTRUMENT_TYPES:
-            match= re.compile(instrument_type,re.IGNORECASE)
-            if re.search(match,string):
-                return instrument_type
-         # Now read in all the Instrument sheets and look for a match
-         # Returning the Name in the Instrument_Type Tag
-         instrument_folder=os.path.join(PYMEASURE_ROOT,'Instruments')
-         for instrument_sheet in os.listdir(instrument_folder):
-             path=os.path.join(PYMEASURE_ROOT,'Instruments',instrument_sheet)
-             if os.path.isfile(path):
-                f=open(path,'r')
-                text=f.read()
-                if re.search(string,text):
-                    tag_match=re.search(
-                    '<Instrument_Type>(?P<instrument_type>\w+)</Instrument_Type>',
-                    text)
-                    try:
-                        return tag_match.group('instrument_type')
-                    except:pass
-    else:
-        return None
 def determine_instrument_type(object):
     """Tries to return an instrument type given an address, name, serial #
      or class instance"""
@@ -117,39 +123,198 @@ def determine_instrument_type(object):
                     return determine_instrument_type_from_string(string)
                 except: pass 
                 
+def split_into_batches(item_list,batch_size):
+    """Returns item_list split into lists of at most batch_size items"""
+    batch_size=max(int(batch_size),1)
+    return [item_list[index:index+batch_size] for index in range(0,len(item_list),batch_size)]
+
+def join_commands(commands,separator=STATE_QUERY_SEPARATOR):
+    """Joins commands into one message with separator. If separator ends with : (absolute SCPI headers),
+    commands that start with * or : are joined without it, for instance ['SOUR:VOLT 1','*OPC?','SENS:CURR?']
+    gives 'SOUR:VOLT 1;*OPC?;:SENS:CURR?'"""
+    message=''
+    for index,command in enumerate([str(command) for command in commands]):
+        if index==0:
+            message=command
+        elif separator.endswith(':') and command[:1] in ['*',':']:
+            message=message+separator[:-1]+command
+        else:
+            message=message+separator+command
+    return message
+
+def split_batched_response(response,number_queries,separator=STATE_RESPONSE_SEPARATOR):
+    """Splits the response to number_queries joined queries into a list of stripped answers, returns None if
+    the response does not have number_queries answers"""
+    answers=[answer.strip() for answer in str(response).strip().split(separator)]
+    if len(answers)!=number_queries:
+        return None
+    return answers
+
+def get_resource_manager(backend=None):
+    """Returns the shared resource manager for backend, 'visa' or 'simulated', defaults to VISA_BACKEND"""
+    if backend is None:
+        backend=VISA_BACKEND
+    if backend not in VISA_BACKENDS:
+        raise VisaInstrumentError("The backend {0} is not one of {1}".format(backend,VISA_BACKENDS))
+    if not RESOURCE_MANAGERS.has_key(backend):
+        if backend=='simulated':
+            RESOURCE_MANAGERS[backend]=SimulatedVisa.SimulatedResourceManager(
+                os.path.join(PYMEASURE_ROOT,'Instruments'))
+        elif VISA_AVAILABLE:
+            RESOURCE_MANAGERS[backend]=visa.ResourceManager()
+        else:
+            raise VisaInstrumentError("PyVisa is not available, use backend='simulated' to simulate instruments")
+    return RESOURCE_MANAGERS[backend]
+
+def state_values_equal(value_1,value_2):
+    """Returns True if two state values are the same, numerically if both are numbers so that 1 and
+    +1.000E+00 are equal"""
+    try:
+        return float(value_1)==float(value_2)
+    except (TypeError,ValueError):
+        return str(value_1).strip()==str(value_2).strip()
+
+def state_difference(current_state,target_state):
+    """Returns the {command:value} pairs of target_state that are not already in current_state"""
+    return dict([(state_command,value) for state_command,value in target_state.iteritems()
+                 if not current_state.has_key(state_command) or
+                 not state_values_equal(current_state[state_command],value)])
+
 def find_description(identifier,output='path'):
     """ Finds an instrument description in pyMeasure/Instruments given an identifier, 
-    outputs a path or the file."""
+    outputs a path or the file. The sheets are looked up in the cached InstrumentSheetIndex"""
     if type(identifier) in StringTypes:
-        # Now read in all the Instrument sheets and look for a match
-        instrument_folder=os.path.join(PYMEASURE_ROOT,'Instruments')
-        for instrument_sheet in os.listdir(instrument_folder):
-            path=os.path.join(PYMEASURE_ROOT,'Instruments',instrument_sheet)
-            if os.path.isfile(path):
-                f=open(path,'r')
-                text=f.read()
-                if re.search(identifier,text):
-                    path_out=re.compile('name|path',re.IGNORECASE)
-                    file_contents=re.compile('file|xml|node|contents',re.IGNORECASE)
-                    if re.search(path_out,output):
-                        return path
-                    elif re.search(file_contents,output):
-                        return text
+        index=InstrumentRegistry.get_instrument_sheet_index(os.path.join(PYMEASURE_ROOT,'Instruments'))
+        entry=index.find(identifier)
+        if entry is None:
+            return None
+        path_out=re.compile('name|path',re.IGNORECASE)
+        file_contents=re.compile('file|xml|node|contents',re.IGNORECASE)
+        if re.search(path_out,output):
+            return entry["Path"]
+        elif re.search(file_contents,output):
+            return entry["Text"]
     else:
         return None       
 #-------------------------------------------------------------------------------
 # Class Definitions
 
+class SessionPool():
+    """A process wide pool of open instrument sessions keyed by (backend,resource name,open_resource options), an
+    instrument opened with different options gets its own session. Sessions are reference counted, an instrument that is opened again reuses the open session and a session that is no longer used is
+    closed after idle_timeout seconds"""
+    def __init__(self,**options):
+        defaults={"idle_timeout":SESSION_IDLE_TIMEOUT,
+                  "health_check_interval":SESSION_HEALTH_CHECK_INTERVAL,
+                  "health_check_query":SESSION_HEALTH_CHECK_QUERY}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        # {(backend,resource_name,options):{"session":session,"references":int,"last_used":time}}
+        self.sessions={}
+        self.lock=threading.RLock()
+
+    def get_key(self,resource_name,backend=None,**key_word_arguments):
+        """Returns the key of the session for resource_name opened with the open_resource key word arguments"""
+        if backend is None:
+            backend=VISA_BACKEND
+        # the values can be unhashable (dictionaries of responses), their repr stands in for them
+        options=[]
+        for key,value in key_word_arguments.iteritems():
+            if isinstance(value,dict):
+                value=sorted(value.items())
+            options.append((key,repr(value)))
+        options=tuple(sorted(options))
+        return (backend,resource_name,options)
+
+    def acquire(self,resource_name,backend=None,**key_word_arguments):
+        """Returns an open session for resource_name, the key word arguments are passed to open_resource
+        when a new session is opened. A session is only reused for the same key word arguments"""
+        if backend is None:
+            backend=VISA_BACKEND
+        key=self.get_key(resource_name,backend,**key_word_arguments)
+        with self.lock:
+            self.close_idle_sessions()
+            pooled=self.sessions.get(key)
+            if pooled is not None and not self.is_healthy(pooled):
+                self.close_session(key)
+                pooled=None
+            if pooled is None:
+                session=get_resource_manager(backend).open_resource(resource_name,**key_word_arguments)
+                pooled={"session":session,"references":0,"last_used":time.time()}
+                self.sessions[key]=pooled
+            pooled["references"]+=1
+            pooled["last_used"]=time.time()
+            return pooled["session"]
+
+    def release(self,resource_name,backend=None,**key_word_arguments):
+        """Gives back a session acquired for resource_name with the same key word arguments, it stays open for
+        reuse until it is idle"""
+        with self.lock:
+            pooled=self.sessions.get(self.get_key(resource_name,backend,**key_word_arguments))
+            if pooled is not None and pooled["references"]>0:
+                pooled["references"]-=1
+                pooled["last_used"]=time.time()
+            self.close_idle_sessions()
+
+    def is_healthy(self,pooled):
+        """Returns False if a session that has been idle too long does not answer the health check query"""
+        if self.options["health_check_query"] is None or pooled["references"]>0:
+            return True
+        if time.time()-pooled["last_used"]<self.options["health_check_interval"]:
+            return True
+        session=pooled["session"]
+        try:
+            if hasattr(session,'query'):
+                session.query(self.options["health_check_query"])
+            else:
+                session.ask(self.options["health_check_query"])
+            return True
+        except:
+            return False
+
+    def close_idle_sessions(self):
+        """Closes the unused sessions that have been idle for more than idle_timeout seconds"""
+        with self.lock:
+            now=time.time()
+            for key,pooled in self.sessions.items():
+                if pooled["references"]==0 and now-pooled["last_used"]>=self.options["idle_timeout"]:
+                    self.close_session(key)
+
+    def close_session(self,key):
+        """Closes and forgets the session for key"""
+        with self.lock:
+            pooled=self.sessions.pop(key,None)
+            if pooled is not None:
+                try:
+                    pooled["session"].close()
+                except:
+                    pass
+
+    def close(self):
+        """Closes every session in the pool"""
+        with self.lock:
+            for key in self.sessions.keys():
+                self.close_session(key)
+
+# The pool every VisaInstrument gets its session from
+SESSION_POOL=SessionPool()
+
 class VisaInstrumentError(Exception):
     def __init__(self,*args):
         Exception.__init__(self,*args)
 
 
         
-class VisaInstrument(visa.ResourceManager,InstrumentSheet):
-    """ General Class to communicate with COMM and GPIB instruments"""
+class VisaInstrument(InstrumentSheet):
+    """ General Class to communicate with COMM and GPIB instruments. The key word argument backend selects
+    the instrument layer, 'visa' or 'simulated' (defaults to VISA_BACKEND), the other key word arguments are
+    passed to the resource manager's open_resource"""
     def __init__(self,resource_name=None,**key_word_arguments):
         """ Intializes the VisaInstrument Class"""
+        self.backend=key_word_arguments.pop('backend',VISA_BACKEND)
         # First we try to look up the description and get info from it
         if DATA_SHEETS:
             try: 
@@ -174,12 +339,24 @@ class VisaInstrument(visa.ResourceManager,InstrumentSheet):
         else:
             self.description={'State_Description':{'Instrument_Description':self.instrument_address}}
         
-        self.state_buffer=[]
+        # The instrument sheet says if queries can be joined into one message
+        if self.info_found:
+            self.batch_state_queries=str(getattr(self,'batch_state_queries','False')).lower() in TRUE_STRINGS
+            self.state_query_batch_size=int(getattr(self,'state_query_batch_size',STATE_QUERY_BATCH_SIZE))
+            self.state_query_separator=str(getattr(self,'state_query_separator',STATE_QUERY_SEPARATOR))
+        else:
+            self.batch_state_queries=False
+            self.state_query_batch_size=STATE_QUERY_BATCH_SIZE
+            self.state_query_separator=STATE_QUERY_SEPARATOR
+        # The states before the last STATE_BUFFER_MAX_LENGTH changes, the oldest is dropped when it is full
         self.STATE_BUFFER_MAX_LENGTH=10
+        self.state_buffer=collections.deque(maxlen=self.STATE_BUFFER_MAX_LENGTH)
         
         
-        # Call the visa instrument class-- this gives ask,write,read
-        visa.ResourceManager.open_resource.__init__(self,self.instrument_address,**key_word_arguments)
+        # Get a session from the pool-- this gives ask,write,read
+        self.resource_manager=get_resource_manager(self.backend)
+        self.resource_options=key_word_arguments
+        self.resource=SESSION_POOL.acquire(self.instrument_address,self.backend,**self.resource_options)
         self.current_state=self.get_state()
         
         if METHOD_ALIASES and not self.info_found :
@@ -187,24 +364,125 @@ class VisaInstrument(visa.ResourceManager,InstrumentSheet):
                 exec(command)
         
     def set_state(self,**state_dictionary):
-        """ Sets the instrument to the state specified by Command:Value pairs"""
-        if len(self.state_buffer)+1<self.STATE_BUFFER_MAX_LENGTH:
-            self.state_buffer.append(self.get_state())
+        """ Sets the instrument to the state specified by Command:Value pairs. The state before the change is
+        self.current_state so it is buffered without a query, afterwards only the commands that were set are
+        queried again"""
+        self.state_buffer.append(self.current_state.copy())
+        self.write_state(**state_dictionary)
+
+    def write_state(self,**state_dictionary):
+        """ Writes Command:Value pairs and updates self.current_state without buffering the old state"""
+        commands=[state_command+' '+str(value) for state_command,value in state_dictionary.iteritems()]
+        if self.batch_state_queries:
+            for batch in split_into_batches(commands,self.state_query_batch_size):
+                self.write(join_commands(batch,self.state_query_separator))
         else:
-            self.state_buffer.pop(1)
-            self.state_buffer.insert(-1,self.get_state())         
+            for command in commands:
+                self.write(command)
+        changed_queries=dict([(state_command,query) for state_command,query
+                              in self.DEFAULT_STATE_QUERY_DICTIONARY.iteritems()
+                              if state_dictionary.has_key(state_command)])
         for state_command,value in state_dictionary.iteritems():
-            self.write(state_command+' '+str(value))
-        self.current_state=self.get_state()
-            
+            if not changed_queries.has_key(state_command):
+                self.current_state[state_command]=str(value)
+        if changed_queries:
+            self.current_state.update(self.get_state(**changed_queries))
+
+    def restore_state(self,state_dictionary=None,**options):
+        """ Restores a state, only the commands whose values differ from self.current_state are written.
+        With no state_dictionary the last buffered state is restored and removed from the buffer, like an
+        undo. state_dictionary can also be the path of a saved InstrumentState. Set the option
+        update_current_state=True to query the instrument first if it may have been changed by hand.
+        Returns the dictionary of commands that were written"""
+        defaults={"update_current_state":False}
+        restore_options={}
+        for key,value in defaults.iteritems():
+            restore_options[key]=value
+        for key,value in options.iteritems():
+            restore_options[key]=value
+        if restore_options["update_current_state"]:
+            self.update_current_state()
+        if state_dictionary is None:
+            if not self.state_buffer:
+                raise VisaInstrumentError("There is no buffered state to restore")
+            state_dictionary=self.state_buffer.pop()
+            buffer_state=False
+        else:
+            buffer_state=True
+        if type(state_dictionary) in StringTypes:
+            state_dictionary=InstrumentState(state_dictionary).state_dictionary
+        difference=state_difference(self.current_state,state_dictionary)
+        if difference:
+            if buffer_state:
+                self.set_state(**difference)
+            else:
+                self.write_state(**difference)
+        return difference
+
     def get_state(self,**state_query_dictionary):
-        """ Gets the current state of the instrument """
+        """ Gets the current state of the instrument, if the instrument sheet allows it the queries are sent
+        as joined messages and the joined responses are split, otherwise there is one ask per query """
         if len(state_query_dictionary)==0:
             state_query_dictionary=self.DEFAULT_STATE_QUERY_DICTIONARY
-        state=dict([(state_command,self.ask(str(query))) for state_command,query 
-        in state_query_dictionary.iteritems()])
+        if not self.batch_state_queries or len(state_query_dictionary)<2:
+            state=dict([(state_command,self.ask(str(query))) for state_command,query
+            in state_query_dictionary.iteritems()])
+            return state
+        state={}
+        for batch in split_into_batches(state_query_dictionary.items(),self.state_query_batch_size):
+            message=join_commands([query for state_command,query in batch],self.state_query_separator)
+            answers=split_batched_response(self.ask(message),len(batch))
+            if answers is None:
+                # an answer contained the separator or a query failed, ask this batch one query at a time
+                answers=[self.ask(str(query)) for state_command,query in batch]
+            for (state_command,query),answer in zip(batch,answers):
+                state[state_command]=answer
         return state
-    
+
+    def close(self):
+        """ Gives the session back to SESSION_POOL, it is closed once no instrument has used it for
+        SESSION_POOL.options['idle_timeout'] seconds"""
+        if self.resource is not None:
+            SESSION_POOL.release(self.instrument_address,self.backend,**self.resource_options)
+            self.resource=None
+
+    def write(self,command):
+        """ Writes command to the instrument, timed if IOTrace tracing is on"""
+        tracer=IOTrace.IO_TRACER
+        if tracer is None:
+            return self.resource.write(command)
+        start=time.time()
+        result=self.resource.write(command)
+        tracer.record(self.instrument_address,'write',command,time.time()-start,bytes_sent=len(command))
+        return result
+
+    def read(self):
+        """ Reads the instrument's response, timed if IOTrace tracing is on"""
+        tracer=IOTrace.IO_TRACER
+        if tracer is None:
+            return self.resource.read()
+        start=time.time()
+        response=self.resource.read()
+        tracer.record(self.instrument_address,'read','',time.time()-start,bytes_received=len(response))
+        return response
+
+    def ask(self,command):
+        """ Writes command and returns the instrument's response, timed if IOTrace tracing is on"""
+        tracer=IOTrace.IO_TRACER
+        if tracer is None:
+            return self.query_resource(command)
+        start=time.time()
+        response=self.query_resource(command)
+        tracer.record(self.instrument_address,'ask',command,time.time()-start,bytes_sent=len(command),
+                      bytes_received=len(response))
+        return response
+
+    def query_resource(self,command):
+        """ Queries the session, new pyvisa sessions call it query and old ones ask"""
+        if hasattr(self.resource,'query'):
+            return self.resource.query(command)
+        return self.resource.ask(command)
+
     def update_current_state(self):
         self.current_state=self.get_state()
    
@@ -254,6 +532,106 @@ def test_find_description():
     print "The File Contents are:"
     print find_description('Lockin2','file')
      
+def test_split_batched_response():
+    """Tests splitting a joined response into answers"""
+    queries=['AUXV? %s'%index for index in range(1,6)]
+    print split_into_batches(queries,2)
+    answers=split_batched_response('0.000;1.000;2.500;-1.000;0.010\n',len(queries))
+    print answers
+    assert answers==['0.000','1.000','2.500','-1.000','0.010']
+    assert split_batched_response('"a;b";1',2) is None
+    print join_commands(['SOUR:VOLT 1','*OPC?','SENS:CURR:RANG 1e-3'])
+    assert join_commands(['SOUR:VOLT 1','*OPC?','SENS:CURR:RANG 1e-3'])=='SOUR:VOLT 1;*OPC?;:SENS:CURR:RANG 1e-3'
+    assert join_commands(['AUXV? 1','AUXV? 2'],';')=='AUXV? 1;AUXV? 2'
+
+def test_batched_state():
+    """ Tests the joined messages of write_state and get_state and the fall back to one query at a time"""
+    instrument=VisaInstrument('GPIB::25',backend='simulated',responses={'*IDN?':'Simulated;Instrument'})
+    instrument.batch_state_queries=True
+    instrument.state_query_batch_size=2
+    messages=[]
+    resource_write=instrument.resource.write
+    def recorded_write(message):
+        messages.append(message)
+        return resource_write(message)
+    instrument.resource.write=recorded_write
+    instrument.DEFAULT_STATE_QUERY_DICTIONARY={'SOUR:VOLT':'SOUR:VOLT?','SENS:CURR:RANG':'SENS:CURR:RANG?'}
+    instrument.write_state(**{'SOUR:VOLT':1,'SENS:CURR:RANG':.001})
+    print 'write_state sent %s'%messages
+    assert messages[0] in ['SOUR:VOLT 1;:SENS:CURR:RANG 0.001','SENS:CURR:RANG 0.001;:SOUR:VOLT 1']
+    assert messages[1] in ['SOUR:VOLT?;:SENS:CURR:RANG?','SENS:CURR:RANG?;:SOUR:VOLT?']
+    assert instrument.current_state=={'SOUR:VOLT':'1','SENS:CURR:RANG':'0.001'}
+    # an answer with the separator in it can not be split, the batch is asked one query at a time
+    messages[:]=[]
+    state=instrument.get_state(IDN='*IDN?',VOLT='SOUR:VOLT?')
+    print 'get_state sent %s'%messages
+    assert messages[0] in ['*IDN?;:SOUR:VOLT?','SOUR:VOLT?;*IDN?']
+    assert sorted(messages[1:])==['*IDN?','SOUR:VOLT?']
+    assert state=={'IDN':'Simulated;Instrument','VOLT':'1'}
+    instrument.close()
+
+def test_simulated_VisaInstrument():
+    """ Tests the VisaInstrument class with the simulated backend"""
+    instrument=VisaInstrument('GPIB::22',backend='simulated')
+    print instrument.ask('*IDN?')
+    instrument.write('SOUR:VOLT 1.5')
+    print 'SOUR:VOLT? returns %s'%instrument.ask('SOUR:VOLT?')
+    assert instrument.ask('SOUR:VOLT?')=='1.5'
+
+def test_restore_state():
+    """ Tests that restore_state only writes the commands that changed"""
+    instrument=VisaInstrument('GPIB::22',backend='simulated')
+    instrument.DEFAULT_STATE_QUERY_DICTIONARY=dict([('VOLT%s'%index,'VOLT%s?'%index) for index in range(50)])
+    instrument.update_current_state()
+    instrument.set_state(**dict([('VOLT%s'%index,1) for index in range(50)]))
+    instrument.set_state(VOLT3=2.5)
+    number_messages=instrument.resource.number_messages
+    written=instrument.restore_state()
+    print 'Restoring the state wrote %s'%written
+    assert written=={'VOLT3':'1'}
+    assert instrument.ask('VOLT3?')=='1'
+    # one write and one query of the changed command
+    assert instrument.resource.number_messages-number_messages==3
+    assert len(instrument.state_buffer)==1
+
+def test_SessionPool():
+    """ Tests that instruments opened one after the other share a pooled session"""
+    first=VisaInstrument('GPIB::23',backend='simulated')
+    session=first.resource
+    first.close()
+    second=VisaInstrument('GPIB::23',backend='simulated')
+    print 'The session was reused: %s'%(second.resource is session)
+    assert second.resource is session
+    key=SESSION_POOL.get_key('GPIB::23','simulated')
+    assert SESSION_POOL.sessions[key]["references"]==1
+    second.close()
+    SESSION_POOL.close_session(key)
+    # an instrument opened with other options gets a session opened with them
+    fast=VisaInstrument('GPIB::23',backend='simulated',latency=0)
+    slow=VisaInstrument('GPIB::23',backend='simulated',latency=.5)
+    print 'The latencies are %s and %s'%(fast.resource.options["latency"],slow.resource.options["latency"])
+    assert fast.resource is not slow.resource
+    assert slow.resource.options["latency"]==.5
+    for instrument in [fast,slow]:
+        instrument.close()
+        SESSION_POOL.close_session(SESSION_POOL.get_key('GPIB::23','simulated',**instrument.resource_options))
+
+def test_traced_VisaInstrument():
+    """ Tests tracing the I/O of a simulated instrument"""
+    tracer=IOTrace.enable_tracing()
+    try:
+        instrument=VisaInstrument('GPIB::24',backend='simulated')
+        for index in range(10):
+            instrument.write('SOUR:VOLT %s'%index)
+            instrument.ask('SOUR:VOLT?')
+        print tracer.report()
+        counts=dict([((row[1],row[2]),row[3]) for row in tracer.get_rows()])
+        assert counts[('write','SOUR:VOLT')]==10
+        assert counts[('ask','SOUR:VOLT?')]==10
+        instrument.close()
+    finally:
+        IOTrace.disable_tracing()
+
 def test_VisaInstrument():
     """ Simple test of the VisaInstrument class"""
     srs810=VisaInstrument('GPIB::2')
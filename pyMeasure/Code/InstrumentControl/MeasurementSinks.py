@@ -0,0 +1,283 @@
+#-----------------------------------------------------------------------------
+# Name:        MeasurementSinks.py
+# Purpose:     To write measurement data to disk as it is taken
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" MeasurementSinks writes measured points to disk as they arrive, so a crash loses at most the points since
+the last checkpoint instead of the whole measurement. An AsciiMeasurementSink writes a delimited text file with a
+commented header and a column names line. Each point is one line, and the file is flushed and fsynced every
+checkpoint_points points or checkpoint_interval seconds. Opening a sink on an existing file keeps appending to it,
+after dropping a partly written last line. A MeasurementView reads the complete lines of a sink file
+incrementally, so it can be used to plot a measurement that is still running, even from another process, and
+to_AsciiDataTable turns the finished file into an AsciiDataTable"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import os
+import time
+#-----------------------------------------------------------------------------
+# Third Party Imports
+try:
+    from pyMeasure.Code.Utils.Names import auto_name
+    DEFAULT_FILE_NAME=None
+except:
+    print("The function auto_name in pyMeasure.Code.Utils.Names was not found")
+    print("Setting Default file name to New_Measurement.txt")
+    DEFAULT_FILE_NAME='New_Measurement.txt'
+    pass
+#-----------------------------------------------------------------------------
+# Module Constants
+SINK_DATA_DELIMITER=','
+SINK_COMMENT_BEGIN='#'
+SINK_COLUMN_NAMES_BEGIN_TOKEN='!'
+#-----------------------------------------------------------------------------
+# Module Functions
+def convert_value(value):
+    """Returns value as an int or float if it is a number, otherwise the string"""
+    for value_type in [int,float]:
+        try:
+            return value_type(value)
+        except ValueError:
+            pass
+    return value
+
+def format_value(value):
+    """Returns value as it is written to a sink file, floats with repr so that they read back exactly (str
+    rounds them to 12 significant digits)"""
+    if isinstance(value,float):
+        return repr(value)
+    return str(value)
+
+def read_sink_header(file_path):
+    """Returns (header lines,column names,data delimiter position) of a sink file, where the position is the
+    byte offset of the first data line"""
+    header=[]
+    column_names=None
+    in_file=open(file_path,'rb')
+    try:
+        while True:
+            line=in_file.readline()
+            if not line.endswith('\n'):
+                break
+            if line.startswith(SINK_COMMENT_BEGIN):
+                header.append(line[len(SINK_COMMENT_BEGIN):].rstrip('\r\n'))
+            elif line.startswith(SINK_COLUMN_NAMES_BEGIN_TOKEN):
+                column_names=line[len(SINK_COLUMN_NAMES_BEGIN_TOKEN):].rstrip('\r\n')
+                return header,column_names,in_file.tell()
+            else:
+                break
+    finally:
+        in_file.close()
+    return header,column_names,None
+#-----------------------------------------------------------------------------
+# Module Classes
+class AsciiMeasurementSink():
+    """Appends measured points to the text file file_path as they arrive. column_names are required for a new
+    file and are read from an existing one. Options are directory, data_delimiter, header (a list of lines),
+    checkpoint_points and checkpoint_interval (seconds)"""
+    def __init__(self,file_path=None,column_names=None,**options):
+        defaults={"directory":None,
+                  "specific_descriptor":'Measurement',
+                  "general_descriptor":'Data',
+                  "extension":'txt',
+                  "data_delimiter":SINK_DATA_DELIMITER,
+                  "header":None,
+                  "checkpoint_points":10,
+                  "checkpoint_interval":5.}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        if file_path is None:
+            if DEFAULT_FILE_NAME is None:
+                file_path=auto_name(self.options["specific_descriptor"],self.options["general_descriptor"],
+                                    self.options["directory"],self.options["extension"])
+            else:
+                file_path=DEFAULT_FILE_NAME
+            if self.options["directory"] is not None:
+                file_path=os.path.join(self.options["directory"],file_path)
+        self.path=file_path
+        self.number_points=0
+        if os.path.isfile(self.path) and os.path.getsize(self.path)>0:
+            self.header,column_names_string,data_position=read_sink_header(self.path)
+            if column_names_string is None:
+                raise IOError("{0} is not a measurement sink file".format(self.path))
+            self.column_names=column_names_string.split(self.options["data_delimiter"])
+            self.number_points=self.recover()
+            self.file=open(self.path,'ab')
+        else:
+            if not column_names:
+                raise ValueError("A new measurement sink needs column_names")
+            self.column_names=list(column_names)
+            self.header=list(self.options["header"] or [])
+            self.file=open(self.path,'wb')
+            for line in self.header:
+                self.file.write(SINK_COMMENT_BEGIN+str(line).rstrip('\r\n')+'\n')
+            self.file.write(SINK_COLUMN_NAMES_BEGIN_TOKEN+self.options["data_delimiter"].join(self.column_names)
+                            +'\n')
+            self.checkpoint()
+        self.points_since_checkpoint=0
+        self.last_checkpoint=time.time()
+
+    def recover(self):
+        """Drops a partly written last line of an existing file and returns the number of complete points"""
+        header,column_names_string,data_position=read_sink_header(self.path)
+        in_file=open(self.path,'rb+')
+        in_file.seek(data_position)
+        number_points=0
+        end_position=data_position
+        for line in iter(in_file.readline,''):
+            if not line.endswith('\n'):
+                break
+            number_points+=1
+            end_position+=len(line)
+        in_file.truncate(end_position)
+        in_file.close()
+        return number_points
+
+    def add_point(self,point):
+        """Appends a point, a dictionary {column name:value} or a list of values in column order"""
+        if isinstance(point,dict):
+            values=[point.get(column_name,'') for column_name in self.column_names]
+        else:
+            values=list(point)
+        if len(values)!=len(self.column_names):
+            raise ValueError("A point needs {0} values, {1} were given".format(len(self.column_names),
+                                                                               len(values)))
+        self.file.write(self.options["data_delimiter"].join([format_value(value) for value in values])+'\n')
+        self.number_points+=1
+        self.points_since_checkpoint+=1
+        if self.points_since_checkpoint>=self.options["checkpoint_points"] or \
+                time.time()-self.last_checkpoint>=self.options["checkpoint_interval"]:
+            self.checkpoint()
+
+    def add_points(self,points):
+        """Appends a list of points and checkpoints"""
+        for point in points:
+            self.add_point(point)
+        self.checkpoint()
+
+    def checkpoint(self):
+        """Flushes the points written so far to disk"""
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.points_since_checkpoint=0
+        self.last_checkpoint=time.time()
+
+    def close(self):
+        """Checkpoints and closes the file"""
+        if not self.file.closed:
+            self.checkpoint()
+            self.file.close()
+
+    def get_view(self):
+        """Returns a MeasurementView of the points on disk"""
+        if not self.file.closed:
+            self.checkpoint()
+        return MeasurementView(self.path,data_delimiter=self.options["data_delimiter"])
+
+    def to_AsciiDataTable(self,**options):
+        """Returns the measurement as a pyMeasure AsciiDataTable, options are passed to AsciiDataTable"""
+        from pyMeasure.Code.DataHandlers.GeneralModels import AsciiDataTable
+        view=self.get_view()
+        table_options={"column_names":list(self.column_names),"data":view.get_data(),
+                       "header":list(self.header),"data_delimiter":self.options["data_delimiter"],
+                       "column_names_delimiter":self.options["data_delimiter"],
+                       "column_names_begin_token":SINK_COLUMN_NAMES_BEGIN_TOKEN,
+                       "comment_begin":SINK_COMMENT_BEGIN,"comment_end":'\n',
+                       "directory":self.options["directory"]}
+        table_options.update(options)
+        return AsciiDataTable(None,**table_options)
+
+class MeasurementView():
+    """A read-only view of the complete points in a sink file, update reads only the lines added since the
+    last update so polling it while the measurement runs is cheap"""
+    def __init__(self,file_path,**options):
+        defaults={"data_delimiter":SINK_DATA_DELIMITER}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        self.path=file_path
+        self.header,column_names_string,self.position=read_sink_header(self.path)
+        if column_names_string is None:
+            raise IOError("{0} is not a measurement sink file".format(self.path))
+        self.column_names=column_names_string.split(self.options["data_delimiter"])
+        self.data=[]
+        self.update()
+
+    def update(self):
+        """Reads the points added to the file since the last update and returns how many there were"""
+        in_file=open(self.path,'rb')
+        in_file.seek(self.position)
+        number_new=0
+        for line in iter(in_file.readline,''):
+            if not line.endswith('\n'):
+                # a point that is still being written
+                break
+            self.position+=len(line)
+            self.data.append([convert_value(value) for value in
+                              line.rstrip('\r\n').split(self.options["data_delimiter"])])
+            number_new+=1
+        in_file.close()
+        return number_new
+
+    def __len__(self):
+        return len(self.data)
+
+    def get_data(self):
+        """Returns a copy of the data as a list of rows"""
+        return [row[:] for row in self.data]
+
+    def get_column(self,column_name):
+        """Returns the list of values of column_name"""
+        column_index=self.column_names.index(column_name)
+        return [row[column_index] for row in self.data]
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_AsciiMeasurementSink():
+    """Tests writing, recovering and viewing a measurement sink"""
+    import tempfile
+    import shutil
+    directory=tempfile.mkdtemp()
+    try:
+        path=os.path.join(directory,'Measurement_Data.txt')
+        sink=AsciiMeasurementSink(path,['Index','Voltage','Current'],header=['A test sink'],checkpoint_points=3)
+        view=sink.get_view()
+        for index in range(5):
+            sink.add_point({'Index':index,'Voltage':.1*index,'Current':.1*index/1000.})
+            sink.checkpoint()
+            view.update()
+            print("The view has {0} points".format(len(view)))
+        # simulate a crash in the middle of a line
+        sink.file.write('5,0.5')
+        sink.file.close()
+        view.update()
+        assert len(view)==5
+        sink=AsciiMeasurementSink(path)
+        print("After recovering the sink has {0} points".format(sink.number_points))
+        assert sink.number_points==5
+        sink.add_point([5,.5,.0005])
+        sink.close()
+        view.update()
+        print("The voltages are {0}".format(view.get_column('Voltage')))
+        assert view.get_column('Index')==range(6)
+        table=sink.to_AsciiDataTable()
+        print(table.build_string())
+        # floats read back exactly
+        precise_path=os.path.join(directory,'Precise_Data.txt')
+        sink=AsciiMeasurementSink(precise_path,['Frequency','Current'])
+        values=[1.0000000000001e9,1./3.]
+        sink.add_point(values)
+        sink.close()
+        assert sink.get_view().data==[values]
+    finally:
+        shutil.rmtree(directory)
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_AsciiMeasurementSink()
@@ -0,0 +1,200 @@
+#-----------------------------------------------------------------------------
+# Name:        Orchestration.py
+# Purpose:     To drive several instruments at the same time
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" Orchestration runs instrument I/O on one worker thread per instrument. Calls to the same instrument stay in
+order, and calls to different instruments run concurrently. Submitting a call returns an InstrumentCall that can be
+waited on. A settle delay is queued on the instrument's own worker, so it delays only that instrument and not the
+caller or the rest of the bench. A sweep is written as a pipeline, a list of steps such as
+[("write","SOUR:VOLT 1"),("settle",.02),("ask","READ?")], and Orchestrator.run_pipelines runs one pipeline per
+instrument concurrently, for example
+
+    orchestrator=Orchestrator(keithley=keithley,lockin=lockin)
+    results=orchestrator.run_pipelines({"keithley":keithley_steps,"lockin":lockin_steps})
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import time
+import threading
+import Queue
+#-----------------------------------------------------------------------------
+# Third Party Imports
+
+#-----------------------------------------------------------------------------
+# Module Constants
+# Step names that are not methods of the instrument
+SETTLE_STEP="settle"
+#-----------------------------------------------------------------------------
+# Module Functions
+def sweep_pipeline(set_command,values,query,settle_time=0,after_commands=None):
+    """Returns the steps of a sweep: for each value write set_command value, settle for settle_time, ask query
+    and write each command in after_commands"""
+    if after_commands is None:
+        after_commands=[]
+    steps=[]
+    for value in values:
+        steps.append(("write","{0} {1}".format(set_command,value)))
+        if settle_time:
+            steps.append((SETTLE_STEP,settle_time))
+        steps.append(("ask",query))
+        for command in after_commands:
+            steps.append(("write",command))
+    return steps
+
+def pipeline_answers(steps,results):
+    """Returns the results of the ask steps of a pipeline"""
+    return [result for step,result in zip(steps,results) if step[0]=="ask"]
+#-----------------------------------------------------------------------------
+# Module Classes
+class InstrumentCall():
+    """A call to an instrument that is run on the instrument's worker, result waits for it and returns its
+    value or raises the exception it raised"""
+    def __init__(self,function,*args,**key_word_arguments):
+        self.function=function
+        self.args=args
+        self.key_word_arguments=key_word_arguments
+        self.value=None
+        self.exception=None
+        self.finished=threading.Event()
+
+    def run(self):
+        """Runs the call, this is done by the worker thread"""
+        try:
+            self.value=self.function(*self.args,**self.key_word_arguments)
+        except Exception as exception:
+            self.exception=exception
+        self.finished.set()
+
+    def done(self):
+        """Returns True if the call has finished"""
+        return self.finished.is_set()
+
+    def result(self,timeout=None):
+        """Waits for the call to finish and returns its value"""
+        if not self.finished.wait(timeout):
+            raise RuntimeError("The instrument call did not finish in {0} seconds".format(timeout))
+        if self.exception is not None:
+            raise self.exception
+        return self.value
+
+class InstrumentWorker(threading.Thread):
+    """A daemon thread that runs the InstrumentCalls for one instrument in the order they are submitted"""
+    def __init__(self,instrument,name=None):
+        threading.Thread.__init__(self,name=name)
+        self.daemon=True
+        self.instrument=instrument
+        self.calls=Queue.Queue()
+
+    def submit(self,call):
+        """Queues an InstrumentCall and returns it"""
+        self.calls.put(call)
+        return call
+
+    def run(self):
+        while True:
+            call=self.calls.get()
+            if call is None:
+                break
+            call.run()
+
+    def stop(self):
+        """Stops the worker after the calls already queued"""
+        self.calls.put(None)
+
+class Orchestrator():
+    """Drives the instruments given as name=instrument concurrently, each instrument has its own worker so its
+    calls are never run at the same time"""
+    def __init__(self,**instruments):
+        self.workers={}
+        for name,instrument in instruments.iteritems():
+            self.add_instrument(name,instrument)
+
+    def add_instrument(self,name,instrument):
+        """Adds an instrument and starts its worker"""
+        if self.workers.has_key(name):
+            raise KeyError("An instrument named {0} is already being orchestrated".format(name))
+        worker=InstrumentWorker(instrument,name="Orchestrator-{0}".format(name))
+        worker.start()
+        self.workers[name]=worker
+
+    def submit(self,name,method,*args,**key_word_arguments):
+        """Queues instrument name's method (a method name or a function that takes the instrument as its first
+        argument) and returns an InstrumentCall"""
+        worker=self.workers[name]
+        if method==SETTLE_STEP:
+            function=time.sleep
+        elif callable(method):
+            function=lambda *call_args,**call_key_word_arguments: method(worker.instrument,*call_args,
+                                                                          **call_key_word_arguments)
+        else:
+            function=getattr(worker.instrument,method)
+        return worker.submit(InstrumentCall(function,*args,**key_word_arguments))
+
+    def write(self,name,command):
+        """Queues a write to instrument name"""
+        return self.submit(name,"write",command)
+
+    def ask(self,name,query):
+        """Queues a query to instrument name, the InstrumentCall's result is the answer"""
+        return self.submit(name,"ask",query)
+
+    def settle(self,name,settle_time):
+        """Delays the next calls to instrument name by settle_time seconds without blocking the others"""
+        return self.submit(name,SETTLE_STEP,settle_time)
+
+    def gather(self,calls,timeout=None):
+        """Waits for a list of InstrumentCalls and returns their results in order"""
+        return [call.result(timeout) for call in calls]
+
+    def submit_pipeline(self,name,steps):
+        """Queues a list of (method,argument,...) steps for instrument name, returns the list of InstrumentCalls"""
+        return [self.submit(name,step[0],*step[1:]) for step in steps]
+
+    def run_pipelines(self,pipelines,timeout=None):
+        """Runs {name:steps} with every instrument's pipeline running concurrently, returns {name:results}"""
+        calls=dict([(name,self.submit_pipeline(name,steps)) for name,steps in pipelines.iteritems()])
+        return dict([(name,self.gather(name_calls,timeout)) for name,name_calls in calls.iteritems()])
+
+    def close(self):
+        """Stops the workers once their queued calls have finished"""
+        for worker in self.workers.values():
+            worker.stop()
+        for worker in self.workers.values():
+            worker.join()
+        self.workers={}
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_Orchestrator(latency=.01,number_points=10):
+    """Tests that two instruments with latency seconds per call are swept concurrently"""
+    class FakeInstrument():
+        def __init__(self):
+            self.value=0
+        def write(self,command):
+            time.sleep(latency)
+            self.value=float(command.split(' ')[-1])
+        def ask(self,query):
+            time.sleep(latency)
+            return str(self.value)
+    values=range(number_points)
+    orchestrator=Orchestrator(source_1=FakeInstrument(),source_2=FakeInstrument())
+    steps=sweep_pipeline("SOUR:VOLT",values,"READ?",settle_time=latency)
+    start=time.time()
+    results=orchestrator.run_pipelines({"source_1":steps,"source_2":steps})
+    elapsed=time.time()-start
+    orchestrator.close()
+    serial_time=2*len(steps)*latency
+    print("Two concurrent sweeps took {0} seconds, one after the other takes {1} seconds".format(elapsed,
+                                                                                                serial_time))
+    for name,name_results in results.iteritems():
+        answers=pipeline_answers(steps,name_results)
+        print("{0} read {1}".format(name,answers))
+        assert answers==[str(float(value)) for value in values]
+    assert elapsed<serial_time
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_Orchestrator()
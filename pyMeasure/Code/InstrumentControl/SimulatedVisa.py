@@ -0,0 +1,231 @@
+#-----------------------------------------------------------------------------
+# Name:        SimulatedVisa.py
+# Purpose:     To simulate visa instruments from their instrument sheets
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" SimulatedVisa is a stand-in for the visa resource manager so that VisaInstrument, the Experiments and their
+front ends can be tested and benchmarked without hardware. A SimulatedResource answers the State_Commands of its
+instrument sheet from a state dictionary that its writes update. <Response Query="*IDN?">text</Response>
+elements in the sheet give canned answers, and a responses={query:text or function(resource,query)} option gives
+scripted ones. Every message waits latency seconds, like a bus transaction. Messages joined with ';' are split
+the same way a SCPI instrument splits them, a header after ';' that does not start with ':' or '*' is relative
+to the subsystem of the command before it. Select it with VisaInstrument(address,backend='simulated') or set
+the environment variable PYMEASURE_VISA_BACKEND=simulated."""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import os
+import time
+import xml.dom.minidom
+#-----------------------------------------------------------------------------
+# Third Party Imports
+import pyMeasure.Code.DataHandlers.InstrumentRegistry as InstrumentRegistry
+#-----------------------------------------------------------------------------
+# Module Constants
+SIMULATED_MESSAGE_SEPARATOR=';'
+SIMULATED_DEFAULT_ANSWER='0'
+SIMULATED_LATENCY=0.
+#-----------------------------------------------------------------------------
+# Module Functions
+def read_simulation_description(path):
+    """Returns a tuple ({set command:query},{query:canned answer}) from the instrument sheet at path"""
+    set_queries={}
+    canned_responses={}
+    document=xml.dom.minidom.parse(path)
+    for state_commands in document.getElementsByTagName('State_Commands'):
+        for node in state_commands.childNodes:
+            if node.nodeType==node.ELEMENT_NODE and node.getAttribute('Set'):
+                set_queries[str(node.getAttribute('Set')).strip()]=str(node.getAttribute('Query')).strip()
+    for node in document.getElementsByTagName('Response'):
+        canned_responses[str(node.getAttribute('Query')).strip()]=InstrumentRegistry.get_node_text(node)
+    return set_queries,canned_responses
+
+def split_command(command):
+    """Splits a command into (header,value), for instance 'SOUR:VOLT 1.0' gives ('SOUR:VOLT','1.0')"""
+    parts=command.strip().split(None,1)
+    if not parts:
+        return '',''
+    if len(parts)==1:
+        return parts[0],''
+    return parts[0],parts[1].strip()
+def resolve_header(command,path):
+    """Returns (command,path) for a command of a joined message with its header made absolute. As in SCPI a
+    header that does not start with : or * is relative to path, the subsystem of the command before it, for
+    instance ('CURR?','SENS:') gives ('SENS:CURR?','SENS:')"""
+    if command.startswith('*'):
+        return command,path
+    if command.startswith(':'):
+        command=command[1:]
+    else:
+        command=path+command
+    header=split_command(command)[0]
+    if ':' in header:
+        path=header.rsplit(':',1)[0]+':'
+    else:
+        path=''
+    return command,path
+#-----------------------------------------------------------------------------
+# Module Classes
+class SimulatedResource():
+    """A simulated instrument at resource_name. Options are latency (seconds per message), responses
+    ({query:answer or function(resource,query)}), entry (the InstrumentRegistry entry of its sheet) and
+    default_answer"""
+    def __init__(self,resource_name,**options):
+        defaults={"latency":SIMULATED_LATENCY,"responses":None,"entry":None,
+                  "default_answer":SIMULATED_DEFAULT_ANSWER}
+        self.options={}
+        for key,value in defaults.iteritems():
+            self.options[key]=value
+        for key,value in options.iteritems():
+            self.options[key]=value
+        self.resource_name=resource_name
+        self.state={}
+        self.set_queries={}
+        self.responses={}
+        self.output_buffer=[]
+        self.number_messages=0
+        entry=self.options["entry"]
+        if entry is not None:
+            self.set_queries,self.responses=read_simulation_description(entry["Path"])
+            self.responses.setdefault('*IDN?','Simulated,{0},0,0'.format(entry["Id"]))
+        else:
+            self.responses['*IDN?']='Simulated,{0},0,0'.format(resource_name)
+        if self.options["responses"]:
+            self.responses.update(self.options["responses"])
+        # {query:set command} to answer state queries
+        self.query_sets=dict([(query,set_command) for set_command,query in self.set_queries.iteritems()])
+        self.set_commands=sorted(self.set_queries.keys(),key=len,reverse=True)
+
+    def split_set_command(self,command):
+        """Splits a command into (set command,value) using the longest State_Commands Set that starts it,
+        for instance 'AUXV 1, 0.5' gives ('AUXV 1,','0.5')"""
+        for set_command in self.set_commands:
+            if command.startswith(set_command):
+                return set_command,command[len(set_command):].strip()
+        return split_command(command)
+
+    def answer(self,query):
+        """Returns the simulated answer to one query"""
+        if self.responses.has_key(query):
+            response=self.responses[query]
+            if callable(response):
+                return str(response(self,query))
+            return str(response)
+        header,value=split_command(query)
+        if self.query_sets.has_key(query):
+            set_command=self.query_sets[query]
+        else:
+            set_command=header.rstrip('?')
+        return self.state.get(set_command,self.options["default_answer"])
+
+    def write(self,message):
+        """Writes message, commands update the state and the answers to queries are buffered for read"""
+        time.sleep(self.options["latency"])
+        self.number_messages+=1
+        answers=[]
+        path=''
+        for command in message.strip().split(SIMULATED_MESSAGE_SEPARATOR):
+            command=command.strip()
+            if not command:
+                continue
+            command,path=resolve_header(command,path)
+            if '?' in command:
+                answers.append(self.answer(command))
+            else:
+                header,value=self.split_set_command(command)
+                self.state[header]=value
+        if answers:
+            self.output_buffer.append(SIMULATED_MESSAGE_SEPARATOR.join(answers))
+
+    def read(self):
+        """Returns the oldest buffered answer"""
+        if not self.output_buffer:
+            raise IOError("Simulated read timeout on {0}, nothing was queried".format(self.resource_name))
+        return self.output_buffer.pop(0)
+
+    def query(self,message):
+        """Writes message and reads the answer"""
+        self.write(message)
+        return self.read()
+
+    def ask(self,message):
+        """The old visa name for query"""
+        return self.query(message)
+
+    def close(self):
+        pass
+
+class SimulatedResourceManager():
+    """A stand-in for visa.ResourceManager that opens SimulatedResources, instruments are described by the
+    sheets in instrument_folder. Options given here are the defaults for every resource it opens"""
+    def __init__(self,instrument_folder=None,**options):
+        if instrument_folder is None:
+            instrument_folder=InstrumentRegistry.get_instrument_folder()
+        self.instrument_folder=instrument_folder
+        self.options=options
+        self.resources={}
+
+    def list_resources(self):
+        """Returns the addresses of the instrument sheets and of the resources opened so far"""
+        index=InstrumentRegistry.get_instrument_sheet_index(self.instrument_folder)
+        index.refresh()
+        addresses=[entry["Address"] for entry in index.entries if entry["Address"]]
+        return tuple(sorted(set(addresses+self.resources.keys())))
+
+    def open_resource(self,resource_name,**options):
+        """Returns a SimulatedResource for resource_name, an address or anything that identifies a sheet"""
+        resource_options=self.options.copy()
+        resource_options.update(options)
+        if not resource_options.has_key("entry") and os.path.isdir(self.instrument_folder):
+            resource_options["entry"]=InstrumentRegistry.get_instrument_sheet_index(
+                self.instrument_folder).find(resource_name)
+        resource=SimulatedResource(resource_name,**resource_options)
+        self.resources[resource_name]=resource
+        return resource
+
+    def close(self):
+        self.resources={}
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_SimulatedResourceManager(latency=.001):
+    """Tests a simulated instrument described by an instrument sheet"""
+    import tempfile
+    import shutil
+    sheet="""<?xml version="1.0"?>
+<Instrument_Sheet>
+<Specific_Information><Id>Lockin2</Id><Instrument_Type>GPIB</Instrument_Type>
+<Instrument_Address>GPIB::8</Instrument_Address></Specific_Information>
+<Commands><Tuple Command="AUXV"/></Commands>
+<State_Commands><Tuple Set="AUXV 1," Query="AUXV? 1"/><Tuple Set="FREQ" Query="FREQ?"/></State_Commands>
+<Simulated_Responses><Response Query="*IDN?">Stanford_Research_Systems,SR830,s/n00111,ver1.07</Response>
+</Simulated_Responses>
+</Instrument_Sheet>"""
+    instrument_folder=tempfile.mkdtemp()
+    try:
+        out_file=open(os.path.join(instrument_folder,'Lockin2.xml'),'w')
+        out_file.write(sheet)
+        out_file.close()
+        resource_manager=SimulatedResourceManager(instrument_folder,latency=latency)
+        print("The resources are {0}".format(resource_manager.list_resources()))
+        lockin=resource_manager.open_resource('GPIB::8')
+        print("*IDN? returns {0}".format(lockin.query('*IDN?')))
+        lockin.write('FREQ 1000.0')
+        lockin.write('AUXV 1, 0.5')
+        print("FREQ? returns {0}".format(lockin.query('FREQ?')))
+        print("A joined query returns {0}".format(lockin.query('FREQ?;*IDN?')))
+        assert lockin.query('FREQ?')=='1000.0'
+        assert lockin.query('AUXV? 1')=='0.5'
+        assert lockin.query('AUXV? 2')==SIMULATED_DEFAULT_ANSWER
+        assert lockin.number_messages==8
+        # headers after ; are relative to the subsystem of the command before them unless they start with :
+        lockin.write('SOUR:VOLT 1;CURR 2;:SENS:CURR:RANG 0.001')
+        assert lockin.query('SOUR:CURR?;:SENS:CURR:RANG?;VOLT?')=='2;0.001;0'
+        assert lockin.query('SOUR:VOLT?')=='1'
+    finally:
+        shutil.rmtree(instrument_folder)
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_SimulatedResourceManager()
@@ -30,6 +30,9 @@ def alias(object):
     # Get all the atributes without __ in the begining
     for attribute in dir(object):
         if not re.match('_',attribute):
+            # properties are not methods, reading them can load a whole document
+            if isinstance(getattr(type(object),attribute,None),property):
+                continue
             try:
                 if type(eval('object.%s'%attribute)) is types.MethodType:
                     old_names.append(attribute)
@@ -6,13 +6,18 @@
 # Licence:     MIT License
 #-----------------------------------------------------------------------------
 """ This module gets metadata on files from the filesystem (Windows only) or
-the file itself."""
+the file itself. extract_metadata stats a file once and runs the extractors
+registered for its extension, each returns a dictionary that is stored under its
+tag, for instance {'System_Metadata':{...},'Image_Metadata':{...}}. Add an
+extractor with register_metadata_extractor(['csv'],'Table_Metadata',function),
+where function(path,stat_result) returns a dictionary or None."""
 
 #-------------------------------------------------------------------------------
 # Standard Imports
 import os,sys
 import datetime
 import re
+import struct
 #-------------------------------------------------------------------------------
 # Third party imports
 
@@ -42,11 +47,15 @@ except:
     pass
 #-------------------------------------------------------------------------------
 # Module Constants
-IMAGE_FILE_EXTENSIONS=['jpg','png','tif','bmp','gif']
+IMAGE_FILE_EXTENSIONS=['jpg','jpeg','png','tif','tiff','bmp','gif']
 OS_STAT_FIELDS=['mode','ino','device','number_links','user_id','group_id',
 'size','acess_time','mod_time','creation_time']
 GET_STATS_FIELDS=['author','title','subject','keywords','comments','category']
 TESTS_DIRECTORY=os.path.join(os.path.dirname(os.path.realpath(__file__)),'Tests')
+# The number of bytes read_image_header reads, enough to get past the EXIF block of most jpegs
+IMAGE_HEADER_SIZE=65536
+# {file extension:[(tag,function)]} of the extractors extract_metadata runs, '*' is every file
+METADATA_EXTRACTORS={}
 
 #-------------------------------------------------------------------------------
 # Module Functions
@@ -121,9 +130,12 @@ def get_stats(path):
         enumerate(GET_STATS_FIELDS)])
         return stat_dictionary
     
-def get_system_metadata(path):
-    """ Returns a dictionary of the data found with os.stat """
-    metadata_dictionary=dict([(Field,os.stat(path)[index]) for index,Field in \
+def get_system_metadata(path,stat_result=None):
+    """ Returns a dictionary of the data found with os.stat, stat_result saves
+    calling os.stat again if the file has already been looked at"""
+    if stat_result is None:
+        stat_result=os.stat(path)
+    metadata_dictionary=dict([(Field,stat_result[index]) for index,Field in \
     enumerate(OS_STAT_FIELDS)])
     for key,value in metadata_dictionary.iteritems():
         if 'time' in key:
@@ -136,26 +148,98 @@ def get_file_metadata(path):
     for key,value in get_stats(path).iteritems():
         metadata_dictionary[key]=value
     return metadata_dictionary
+def read_image_header(path):
+    """ Returns {'format','width','height'} of a png, gif, bmp, jpeg or tiff image
+    from its header, without decoding the pixels or needing PIL. Returns None for
+    other files"""
+    f=open(path,'rb')
+    try:
+        header=f.read(IMAGE_HEADER_SIZE)
+    finally:
+        f.close()
+    if header.startswith('\x89PNG\r\n\x1a\n') and header[12:16]=='IHDR':
+        width,height=struct.unpack('>II',header[16:24])
+        return {'format':'PNG','width':width,'height':height}
+    elif header[:6] in ['GIF87a','GIF89a']:
+        width,height=struct.unpack('<HH',header[6:10])
+        return {'format':'GIF','width':width,'height':height}
+    elif header.startswith('BM') and len(header)>=26:
+        if struct.unpack('<I',header[14:18])[0]==12:
+            width,height=struct.unpack('<HH',header[18:22])
+        else:
+            width,height=struct.unpack('<ii',header[18:26])
+        return {'format':'BMP','width':width,'height':abs(height)}
+    elif header.startswith('\xff\xd8'):
+        # walk the jpeg segments to the start of frame that holds the size
+        position=2
+        while position+9<=len(header):
+            if header[position]!='\xff':
+                break
+            marker=ord(header[position+1])
+            if marker==0xff:
+                position=position+1
+                continue
+            segment_length=struct.unpack('>H',header[position+2:position+4])[0]
+            if 0xc0<=marker<=0xcf and marker not in [0xc4,0xc8,0xcc]:
+                height,width=struct.unpack('>HH',header[position+5:position+9])
+                return {'format':'JPEG','width':width,'height':height}
+            position=position+2+segment_length
+        return {'format':'JPEG'}
+    elif header[:4] in ['II*\x00','MM\x00*']:
+        if header[:2]=='II':
+            byte_order='<'
+        else:
+            byte_order='>'
+        image_size={'format':'TIFF'}
+        IFD_offset=struct.unpack(byte_order+'I',header[4:8])[0]
+        if IFD_offset+2>len(header):
+            return image_size
+        number_entries=struct.unpack(byte_order+'H',header[IFD_offset:IFD_offset+2])[0]
+        for index in range(number_entries):
+            entry_offset=IFD_offset+2+12*index
+            entry=header[entry_offset:entry_offset+12]
+            if len(entry)<12:
+                break
+            tag,field_type=struct.unpack(byte_order+'HH',entry[:4])
+            if field_type==3:
+                value=struct.unpack(byte_order+'H',entry[8:10])[0]
+            else:
+                value=struct.unpack(byte_order+'I',entry[8:12])[0]
+            if tag==256:
+                image_size['width']=value
+            elif tag==257:
+                image_size['height']=value
+        return image_size
+    return None
+
 def get_image_metadata(path):
-    """ Returns Image Data Using PIL """
+    """ Returns Image Data Using PIL, opening an image with PIL only reads its
+    header. The EXIF tags are read from the same open file. Without PIL the format
+    and size are read by read_image_header"""
     file_extension=path.split('.')[-1].lower()
     metadata_dictionary={}
-    if file_extension in IMAGE_FILE_EXTENSIONS and PIL_AVAILABLE:
-        im=Image.open(path)
+    if not file_extension in IMAGE_FILE_EXTENSIONS:
+        return None
+    if not PIL_AVAILABLE:
+        return read_image_header(path)
+    f=open(path,'rb')
+    try:
+        im=Image.open(f)
+        metadata_dictionary['format']=im.format
+        metadata_dictionary['width'],metadata_dictionary['height']=im.size
         for key,value in im.info.iteritems():
             metadata_dictionary[key]=value
         del(im)
         if EXIF_AVAILABLE:
             try:
-                f=open(path,'rb')
-                EXIF_dictionary=EXIF.process_file(f)
-                
+                f.seek(0)
+                EXIF_dictionary=EXIF.process_file(f,details=False)
                 for key,value in EXIF_dictionary.iteritems():
-                    metadata_dictionary[key.replace(' ','_')]=value 
-            except: pass              
-        return metadata_dictionary
-    else:
-        return None
+                    metadata_dictionary[key.replace(' ','_')]=value
+            except: pass
+    finally:
+        f.close()
+    return metadata_dictionary
     
 def get_python_metadata(path):
     """ Returns the first Docstring from python file, only .py extensions"""
@@ -177,30 +261,67 @@ def get_python_metadata(path):
                     return {'Python_Docstring':string}
 
     
+def register_metadata_extractor(extensions,tag,function):
+    """ Registers function(path,stat_result), that returns a dictionary or None, as
+    the extractor of tag for files with extensions, a list of lower case extensions
+    or ['*'] for every file. An extractor registered again for the same tag and
+    extension replaces the old one"""
+    for extension in extensions:
+        extractors=METADATA_EXTRACTORS.setdefault(extension.lower(),[])
+        for index,(extractor_tag,extractor) in enumerate(extractors):
+            if extractor_tag==tag:
+                extractors[index]=(tag,function)
+                break
+        else:
+            extractors.append((tag,function))
+
+def get_metadata_extractors(path):
+    """ Returns the [(tag,function)] extractors for the file at path"""
+    file_extension=path.split('.')[-1].lower()
+    return METADATA_EXTRACTORS.get('*',[])+METADATA_EXTRACTORS.get(file_extension,[])
+
+def extract_metadata(path,stat_result=None):
+    """ Returns {tag:metadata dictionary} from the extractors for the file at path,
+    the file is only stat-ed once. An extractor that fails or returns None is left
+    out"""
+    if stat_result is None:
+        stat_result=os.stat(path)
+    metadata={}
+    for tag,function in get_metadata_extractors(path):
+        try:
+            extracted=function(path,stat_result)
+        except:
+            print 'no %s for %s'%(tag,path)
+            continue
+        if extracted is not None:
+            metadata[tag]=extracted
+    return metadata
+
 def get_metadata(path):
     """ Gets system or file metadata """
     # First we get the easy stuff --- Do the formating later
-    metadata_dictionary=dict([(Field,os.stat(path)[index]) for index,Field in \
-    enumerate(OS_STAT_FIELDS)])
-    for key,value in metadata_dictionary.iteritems():
-        if 'time' in key:
-            metadata_dictionary[key]=\
-            datetime.datetime.fromtimestamp(value).isoformat()
+    metadata_dictionary=get_system_metadata(path)
     # Now for the detailed stuff
     try: 
         for key,value in get_stats(path).iteritems():
             metadata_dictionary[key]=value
     except: pass
     # now the image stuff
-    file_extension=path.split('.')[-1].lower()
-    if file_extension in IMAGE_FILE_EXTENSIONS and PIL_AVAILABLE:
-        im=Image.open(path)
-        for key,value in im.info.iteritems():
+    image_metadata=get_image_metadata(path)
+    if image_metadata is not None:
+        for key,value in image_metadata.iteritems():
             metadata_dictionary[key]=value
-        del(im)
                   
     return metadata_dictionary
 
+# The default extractors, the COM summary information only exists on windows
+register_metadata_extractor(['*'],'System_Metadata',get_system_metadata)
+if os.name=='nt':
+    register_metadata_extractor(['*'],'File_Metadata',lambda path,stat_result:get_file_metadata(path))
+register_metadata_extractor(IMAGE_FILE_EXTENSIONS,'Image_Metadata',
+                            lambda path,stat_result:get_image_metadata(path))
+register_metadata_extractor(['py'],'Python_Docstring',lambda path,stat_result:get_python_metadata(path))
+
                 
 #-------------------------------------------------------------------------------
 # Script Functions
@@ -212,6 +333,41 @@ def test_get_metadata(test_file_path='Data_Table_021311_1.xml'):
     for key,value in get_metadata(test_file_path).iteritems():
         print '%s : %s'%(key,value)
         
+def test_extract_metadata():
+    """ Tests reading image sizes from headers and the extractor registry"""
+    import tempfile
+    import shutil
+    import zlib
+    directory=tempfile.mkdtemp()
+    try:
+        png_path=os.path.join(directory,'test.png')
+        f=open(png_path,'wb')
+        IHDR=struct.pack('>IIBBBBB',3,2,8,2,0,0,0)
+        f.write('\x89PNG\r\n\x1a\n'+struct.pack('>I',len(IHDR))+'IHDR'+IHDR+
+                struct.pack('>I',zlib.crc32('IHDR'+IHDR)&0xffffffff))
+        f.close()
+        jpeg_path=os.path.join(directory,'test.jpg')
+        f=open(jpeg_path,'wb')
+        f.write('\xff\xd8'+'\xff\xe0'+struct.pack('>H',16)+'JFIF\x00'+'\x00'*9+
+                '\xff\xc0'+struct.pack('>HBHHB',11,8,480,640,1)+'\x01\x11\x00')
+        f.close()
+        print read_image_header(png_path),read_image_header(jpeg_path)
+        assert read_image_header(png_path)=={'format':'PNG','width':3,'height':2}
+        assert read_image_header(jpeg_path)=={'format':'JPEG','width':640,'height':480}
+        shutil.copy(jpeg_path,os.path.join(directory,'test.jpeg'))
+        assert extract_metadata(os.path.join(directory,'test.jpeg'))['Image_Metadata']['width']==640
+        register_metadata_extractor(['png'],'Test_Metadata',lambda path,stat_result:{'size':stat_result.st_size})
+        try:
+            metadata=extract_metadata(png_path)
+            print metadata
+            assert metadata['Test_Metadata']['size']==metadata['System_Metadata']['size']
+            assert metadata['Image_Metadata']['width']==3
+        finally:
+            METADATA_EXTRACTORS['png']=[extractor for extractor in METADATA_EXTRACTORS['png']
+                                        if extractor[0]!='Test_Metadata']
+    finally:
+        shutil.rmtree(directory)
+
 def test_get_python_metadata():
     os.chdir(TESTS_DIRECTORY)
     MD=get_python_metadata(os.path.join(TESTS_DIRECTORY,'test_metadata.py'))
@@ -225,4 +381,5 @@ def test_get_python_metadata():
 
 if __name__ == '__main__':
     test_get_metadata()
+    test_extract_metadata()
     test_get_python_metadata()
\ No newline at end of file
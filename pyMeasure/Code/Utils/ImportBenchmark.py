@@ -0,0 +1,104 @@
+#-----------------------------------------------------------------------------
+# Name:        ImportBenchmark.py
+# Purpose:     To measure how long it takes to import pyMeasure modules
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" ImportBenchmark measures the import time of modules, each one in a fresh python interpreter so that nothing
+is already in sys.modules, and reports which heavy third party modules the import pulled in. Run it as a script
+to print a report for IMPORT_BENCHMARK_MODULES, check_import_times is a regression guard that fails if a module in
+IMPORT_TIME_LIMITS imports too slowly or pulls in a heavy module at import """
+#-----------------------------------------------------------------------------
+# Standard Imports
+import os
+import sys
+import subprocess
+#-----------------------------------------------------------------------------
+# Third Party Imports
+
+#-----------------------------------------------------------------------------
+# Module Constants
+IMPORT_BENCHMARK_MODULES=["pyMeasure","pyMeasure.Code.Analysis.SParameter"]
+# Modules that are expensive to import and should only be loaded when they are used
+HEAVY_MODULES=["pandas","matplotlib","matplotlib.pyplot","lxml.etree","pyMeasure.Code.DataHandlers.NISTModels",
+               "pyMeasure.Code.DataHandlers.TouchstoneModels","pyMeasure.Code.DataHandlers.XMLModels",
+               "pyMeasure.Code.DataHandlers.GeneralModels"]
+# {module_name:maximum import time in seconds}, these modules must also not load any of HEAVY_MODULES
+IMPORT_TIME_LIMITS={"pyMeasure":.5,"pyMeasure.Code.Analysis.SParameter":.5}
+IMPORT_TIMER_SCRIPT="""import sys,time
+start=time.time()
+import {0}
+elapsed=time.time()-start
+print(elapsed)
+print(','.join([name for name in {1} if name in sys.modules]))
+"""
+#-----------------------------------------------------------------------------
+# Module Functions
+def time_import(module_name,repeat=3,python_executable=None):
+    """Imports module_name in repeat fresh interpreters and returns a tuple (best time in seconds, list of
+    HEAVY_MODULES that were loaded by the import)"""
+    if python_executable is None:
+        python_executable=sys.executable
+    script=IMPORT_TIMER_SCRIPT.format(module_name,repr(HEAVY_MODULES))
+    times=[]
+    loaded_modules=[]
+    for run in range(repeat):
+        process=subprocess.Popen([python_executable,"-c",script],stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE,env=os.environ.copy())
+        output,error=process.communicate()
+        if process.returncode!=0:
+            print("Could not import {0}:\n{1}".format(module_name,error))
+            raise ImportError(module_name)
+        lines=output.decode().splitlines()
+        times.append(float(lines[-2]))
+        loaded_modules=[name for name in lines[-1].split(',') if name]
+    return min(times),loaded_modules
+
+def benchmark_imports(module_names=None,repeat=3):
+    """Prints and returns a dictionary {module_name:(best time,loaded heavy modules)} for module_names"""
+    if module_names is None:
+        module_names=IMPORT_BENCHMARK_MODULES
+    results={}
+    print("{0:<50}{1:>12}  {2}".format("Module","Time (s)","Heavy modules loaded"))
+    print("-"*80)
+    for module_name in module_names:
+        results[module_name]=time_import(module_name,repeat=repeat)
+        print("{0:<50}{1:>12.4f}  {2}".format(module_name,results[module_name][0],
+                                              ",".join(results[module_name][1])))
+    return results
+
+def check_import_times(time_limits=None,repeat=3):
+    """Checks the modules in time_limits ({module_name:maximum time in seconds}, defaults to IMPORT_TIME_LIMITS)
+    and returns a list of failure messages, an empty list means every import is fast and light"""
+    if time_limits is None:
+        time_limits=IMPORT_TIME_LIMITS
+    failures=[]
+    for module_name,time_limit in sorted(time_limits.items()):
+        import_time,loaded_modules=time_import(module_name,repeat=repeat)
+        if import_time>time_limit:
+            failures.append("{0} took {1:.4f} s to import, the limit is {2} s".format(module_name,
+                                                                                      import_time,time_limit))
+        if loaded_modules:
+            failures.append("{0} loaded {1} at import".format(module_name,",".join(loaded_modules)))
+    return failures
+#-----------------------------------------------------------------------------
+# Module Classes
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_time_import(module_name="xml.dom.minidom"):
+    """Tests time_import on a standard library module"""
+    print("Importing {0} takes {1} seconds".format(module_name,time_import(module_name)[0]))
+
+def test_check_import_times():
+    """Tests that the modules in IMPORT_TIME_LIMITS import within their limits"""
+    failures=check_import_times()
+    for failure in failures:
+        print(failure)
+    print("{0} import time failures".format(len(failures)))
+    assert not failures
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    benchmark_imports(sys.argv[1:] or None)
@@ -0,0 +1,85 @@
+#-----------------------------------------------------------------------------
+# Name:        LazyImport.py
+# Purpose:     To defer the import of heavy modules until they are used
+# Author:      Aric Sanders
+# Created:     10/19/2026
+# License:     MIT License
+#-----------------------------------------------------------------------------
+""" LazyImport contains LazyModule, a stand-in for a module that imports the real module the first time one of
+its attributes is used. It is used to keep pandas, matplotlib and the pyMeasure models out of the import time
+of modules that only sometimes need them, for example
+
+    plt=lazy_import('matplotlib.pyplot')
+    plt.plot([1,2,3])  # matplotlib.pyplot is imported here
+"""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import importlib
+import sys
+#-----------------------------------------------------------------------------
+# Third Party Imports
+
+#-----------------------------------------------------------------------------
+# Module Constants
+
+#-----------------------------------------------------------------------------
+# Module Functions
+def lazy_import(module_name,before_import=None):
+    """Returns a LazyModule for module_name, or the module itself if it has already been imported.
+    before_import is an optional function called with no arguments just before the real import"""
+    if module_name in sys.modules and not isinstance(sys.modules[module_name],LazyModule):
+        return sys.modules[module_name]
+    return LazyModule(module_name,before_import)
+
+def is_loaded(module):
+    """Returns True if module is a real module or a LazyModule that has been imported"""
+    if isinstance(module,LazyModule):
+        return module.__dict__["_lazy_module"] is not None
+    return True
+#-----------------------------------------------------------------------------
+# Module Classes
+class LazyModule(object):
+    """A stand-in for the module module_name that imports it on the first attribute access"""
+    def __init__(self,module_name,before_import=None):
+        self.__dict__["_lazy_module_name"]=module_name
+        self.__dict__["_lazy_before_import"]=before_import
+        self.__dict__["_lazy_module"]=None
+
+    def __load__(self):
+        """Imports the module if needed and returns it"""
+        module=self.__dict__["_lazy_module"]
+        if module is None:
+            if self.__dict__["_lazy_before_import"] is not None:
+                self.__dict__["_lazy_before_import"]()
+            module=importlib.import_module(self.__dict__["_lazy_module_name"])
+            self.__dict__["_lazy_module"]=module
+        return module
+
+    def __getattr__(self,name):
+        return getattr(self.__load__(),name)
+
+    def __setattr__(self,name,value):
+        setattr(self.__load__(),name,value)
+
+    def __dir__(self):
+        return dir(self.__load__())
+
+    def __repr__(self):
+        if self.__dict__["_lazy_module"] is None:
+            return "<lazy module '{0}' (not loaded)>".format(self.__dict__["_lazy_module_name"])
+        return repr(self.__dict__["_lazy_module"])
+
+#-----------------------------------------------------------------------------
+# Module Scripts
+def test_lazy_import(module_name='xml.dom.minidom'):
+    """Tests that module_name is only imported when an attribute is used"""
+    if module_name in sys.modules:
+        del sys.modules[module_name]
+    lazy_module=lazy_import(module_name)
+    print("Before use {0} is loaded: {1}".format(module_name,is_loaded(lazy_module)))
+    print("The attribute parseString is {0}".format(lazy_module.parseString))
+    print("After use {0} is loaded: {1}".format(module_name,is_loaded(lazy_module)))
+#-----------------------------------------------------------------------------
+# Module Runner
+if __name__ == '__main__':
+    test_lazy_import()
@@ -1,6 +1,97 @@
-from pyMeasure.Code.DataHandlers.NISTModels import *
-from pyMeasure.Code.DataHandlers.GeneralModels import *
-from pyMeasure.Code.DataHandlers.TouchstoneModels import *
-from pyMeasure.Code.DataHandlers.XMLModels import *
+""" pyMeasure is a package for measurement data handling, analysis and instrument control. Importing the package
+is fast, the modules in LAZY_MODULES are only imported the first time one of their names is used. For example
+pyMeasure.S2PV1 imports pyMeasure.Code.DataHandlers.TouchstoneModels, and from pyMeasure import * imports them
+all as it always has."""
+#-----------------------------------------------------------------------------
+# Standard Imports
+import os
+import re
+import sys
+import types
+import importlib
+#-----------------------------------------------------------------------------
+# Module Constants
+# The modules whose names are available from the package, if two modules define the same name the first one wins
+LAZY_MODULES=["pyMeasure.Code.Utils.Names",
+              "pyMeasure.Code.DataHandlers.XMLModels",
+              "pyMeasure.Code.DataHandlers.TouchstoneModels",
+              "pyMeasure.Code.DataHandlers.GeneralModels",
+              "pyMeasure.Code.DataHandlers.NISTModels"]
+PACKAGE_ROOT=os.path.dirname(os.path.realpath(__file__))
+# Top level functions, classes and constants of a module's source
+DEFINITION_PATTERN=re.compile(r"^(?:def|class)[ \t]+(?P<definition>\w+)|^(?P<assignment>[A-Za-z]\w*)[ \t]*=",
+                              re.MULTILINE)
+#-----------------------------------------------------------------------------
+# Module Functions
+def top_level_names(module_name):
+    """Returns the set of names defined at the top level of module_name by reading its source, without importing"""
+    file_path=os.path.join(PACKAGE_ROOT,*module_name.split('.')[1:])+'.py'
+    try:
+        in_file=open(file_path,'r')
+        source=in_file.read()
+        in_file.close()
+    except IOError:
+        return set()
+    return set([match.group('definition') or match.group('assignment')
+                for match in DEFINITION_PATTERN.finditer(source)])
+#-----------------------------------------------------------------------------
+# Module Classes
+class LazyPackage(types.ModuleType):
+    """The pyMeasure package module, names that are not yet attributes are looked up in LAZY_MODULES and the
+    module that defines them is imported on demand"""
+    def __name_index__(self):
+        """Returns a dictionary {name:module_name} built from the source of LAZY_MODULES, built once"""
+        if self.__dict__.get('_name_index') is None:
+            name_index={}
+            for module_name in reversed(LAZY_MODULES):
+                for name in top_level_names(module_name):
+                    name_index[name]=module_name
+            self.__dict__['_name_index']=name_index
+        return self.__dict__['_name_index']
 
-from pyMeasure.Code.Utils.Names import *
+    def __getattr__(self,name):
+        if name=='__all__':
+            return self.__import_all__()
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if os.path.isdir(os.path.join(PACKAGE_ROOT,name)):
+            return importlib.import_module(self.__name__+'.'+name)
+        module_name=self.__name_index__().get(name)
+        if module_name is not None:
+            module_names=[module_name]
+        else:
+            # names that are only imported by the modules (np, re, ...) are found by importing them in order
+            module_names=LAZY_MODULES
+        for module_name in module_names:
+            module=importlib.import_module(module_name)
+            if hasattr(module,name):
+                value=getattr(module,name)
+                self.__dict__[name]=value
+                return value
+        raise AttributeError("module '{0}' has no attribute '{1}'".format(self.__name__,name))
+
+    def __import_all__(self):
+        """Imports every module in LAZY_MODULES and returns the names from pyMeasure import * exports, the public
+        names of each module as a star import of it gives them, the first module in LAZY_MODULES wins"""
+        names={}
+        for module_name in reversed(LAZY_MODULES):
+            module=importlib.import_module(module_name)
+            module_names=getattr(module,'__all__',None)
+            if module_names is None:
+                module_names=[name for name in dir(module) if not name.startswith('_')]
+            for name in module_names:
+                names[name]=getattr(module,name)
+        for name,value in names.iteritems():
+            self.__dict__[name]=value
+        return sorted(names.keys())
+
+    def __dir__(self):
+        return sorted(set(self.__dict__.keys())|set(self.__name_index__().keys()))
+
+#-----------------------------------------------------------------------------
+# Module Runner
+lazy_package=LazyPackage(__name__,__doc__)
+lazy_package.__dict__.update(sys.modules[__name__].__dict__)
+# The original module has to stay alive, python 2 clears the globals of a module when it is deleted
+lazy_package.__dict__['_original_module']=sys.modules[__name__]
+sys.modules[__name__]=lazy_package